@@ -0,0 +1,33 @@
+"""add users.role_version
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: базы, созданные db/init/00_create_tables.sql,
+    # уже содержат колонку
+    op.execute(
+        "ALTER TABLE users "
+        "ADD COLUMN IF NOT EXISTS role_version INTEGER NOT NULL DEFAULT 1"
+    )
+    op.execute(
+        "COMMENT ON COLUMN users.role_version IS "
+        "'Версия ролей (claim rv в access-токенах)'"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "role_version")
@@ -4,28 +4,44 @@
 
 from typing import Any, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
+from app.api.v1.auth import get_current_principal
+from app.core.config import settings
 from app.core.database import get_db
 from app.dependencies.roles import require_admin, require_moderator_or_admin
 from app.models.order import Order
 from app.models.subscription import Subscription
 from app.models.user import User
 from app.schemas.auth import UserResponse
+from app.services.cache import get_cache_stats, get_redis, invalidate_user_cache
+from app.services.cache_metrics import analyze_memory, cache_metrics
+from app.services.principal import (
+    Principal,
+    RoleVersionUnavailable,
+    TokenClaims,
+    bump_role_version,
+    forget_role_version,
+)
+from app.services.response_cache import get_response_cache_stats
 
 router = APIRouter(prefix="/admin", tags=["Администрирование"])
 
 
 @router.get("/protected-route")
-def protected_admin_route(current_user: User = Depends(require_admin)) -> Any:
+def protected_admin_route(
+    current_user: TokenClaims = Depends(require_admin),
+    principal: Principal = Depends(get_current_principal),
+) -> Any:
     """Защищенный маршрут только для администраторов"""
     return {
         "message": "Добро пожаловать в админ-панель!",
         "user": {
             "id": current_user.id,
             "email": current_user.email,
-            "name": f"{current_user.first_name} {current_user.last_name}",
+            "name": f"{principal.first_name} {principal.last_name}",
         },
         "access_level": "admin",
     }
@@ -36,7 +52,7 @@ def get_all_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Получение списка всех пользователей (только для админов)"""
     users = db.query(User).offset(skip).limit(limit).all()
@@ -47,7 +63,7 @@ def get_all_users(
 def get_user_by_id(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Получение пользователя по ID (только для админов)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -64,7 +80,7 @@ def get_user_by_id(
 def activate_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Активация пользователя (только для админов)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -76,6 +92,7 @@ def activate_user(
 
     user.is_active = True
     db.commit()
+    from_thread.run(invalidate_user_cache, user.id)
 
     return {"message": f"Пользователь {user.email} успешно активирован"}
 
@@ -84,7 +101,7 @@ def activate_user(
 def deactivate_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Деактивация пользователя (только для админов)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -101,15 +118,26 @@ def deactivate_user(
         )
 
     user.is_active = False
+
+    # Выданные пользователю токены с ролями больше не должны приниматься
+    bump_role_version(db, user.id)
+    try:
+        from_thread.run(forget_role_version, user.id)
+    except RoleVersionUnavailable:
+        db.rollback()
+        raise
     db.commit()
 
+    # а закэшированные ответы - отдаваться
+    from_thread.run(invalidate_user_cache, user.id)
+
     return {"message": f"Пользователь {user.email} успешно деактивирован"}
 
 
 @router.get("/statistics")
 def get_admin_statistics(
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_moderator_or_admin),
+    current_user: TokenClaims = Depends(require_moderator_or_admin),
 ) -> Any:
     """Получение статистики для админов и модераторов"""
     total_users = db.query(User).count()
@@ -138,3 +166,23 @@ def get_admin_statistics(
             "pending": total_orders - completed_orders,
         },
     }
+
+
+@router.get("/cache/stats")
+def get_cache_statistics(current_user: TokenClaims = Depends(require_admin)) -> Any:
+    """Метрики кэша текущего воркера по префиксам ключей (только для админов)"""
+    return {
+        "summary": get_cache_stats(),
+        "responses": get_response_cache_stats(),
+        "prefixes": cache_metrics.snapshot(),
+    }
+
+
+@router.get("/cache/memory")
+async def get_cache_memory(
+    sample: int = Query(settings.CACHE_MEMORY_SAMPLE_SIZE, ge=1, le=10000),
+    current_user: TokenClaims = Depends(require_admin),
+) -> Any:
+    """Оценка памяти Redis по префиксам на выборке ключей (только для админов)"""
+    report = await analyze_memory(await get_redis(), sample_size=sample)
+    return report.to_dict()
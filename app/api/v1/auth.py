@@ -7,18 +7,17 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.limiter import get_limiter
 from app.core.logging_config import get_logger, log_auth_event
 from app.core.security import (
     create_access_token,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     verify_token,
 )
-from app.models.role import Role
 from app.models.user import User
-from app.models.user_role import UserRole
 from app.schemas.auth import Token, UserCreate, UserResponse, UserLogin
+from app.services.principal import Principal, TokenClaims, get_principal, role_version
+from app.services.roles import get_user_role_names
 
 logger = get_logger("neuro_store.auth")
 
@@ -34,10 +33,10 @@ router = APIRouter(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-async def get_current_user_from_token(
+async def get_current_principal(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
-    """Получение текущего пользователя из токена"""
+) -> Principal:
+    """Снимок текущего пользователя из токена (из кэша, без баланса)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
@@ -52,10 +51,80 @@ async def get_current_user_from_token(
     except Exception:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    principal = await get_principal(db, email)
+    if principal is None:
+        raise credentials_exception
+
+    return principal
+
+
+async def get_token_claims(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> TokenClaims:
+    """
+    Субъект и роли из токена - для проверки прав без запросов к БД
+
+    Роли из токена принимаются, если их версия совпадает с текущей версией
+    ролей пользователя. Токен без версии (выдан до ее появления) - роли
+    берутся из снимка пользователя.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Не удалось проверить учетные данные",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    try:
+        claims = TokenClaims.from_payload(verify_token(token))
+    except Exception:
+        raise credentials_exception
+
+    if claims.id is not None and claims.role_version:
+        current_version = await role_version(db, claims.id)
+        if current_version is None:
+            raise credentials_exception
+        if current_version == claims.role_version:
+            return claims
+        logger.info("Stale role claims rejected", user_id=claims.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Роли пользователя изменились, войдите повторно",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    principal = await get_principal(db, claims.email)
+    if principal is None:
         raise credentials_exception
 
+    return TokenClaims.from_principal(principal)
+
+
+async def issue_access_token(db: Session, user: User, expires_delta: timedelta) -> str:
+    """Access-токен с ролями пользователя и их текущей версией"""
+    # Версия читается до ролей: изменение между чтениями даст токен со
+    # старой версией, который будет отклонен, а не с устаревшими ролями
+    version = await role_version(db, user.id)
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id},
+        expires_delta=expires_delta,
+        roles=get_user_role_names(db, user.id),
+        role_version=version,
+    )
+
+
+def get_current_user_from_token(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+) -> User:
+    """ORM-запись текущего пользователя - для эндпоинтов, работающих с балансом"""
+    user = db.get(User, principal.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     return user
 
 
@@ -69,7 +138,6 @@ async def get_current_user_from_token(
 async def register(
     user_data: UserCreate,
     db: Session = Depends(get_db),
-    limiter = Depends(get_limiter),
 ) -> Any:
     """Регистрация нового пользователя с rate limiting"""
     try:
@@ -89,7 +157,7 @@ async def register(
         # Создаем пользователя
         user = User(
             email=user_data.email,
-            password_hash=get_password_hash(user_data.password),
+            password_hash=await get_password_hash_async(user_data.password),
             first_name=user_data.first_name,
             last_name=user_data.last_name,
             phone=user_data.phone,
@@ -135,7 +203,6 @@ async def register(
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
-    limiter = Depends(get_limiter),
 ) -> Any:
     """Вход в систему с rate limiting"""
     try:
@@ -144,7 +211,9 @@ async def login(
         # Ищем пользователя по email
         user = db.query(User).filter(User.email == form_data.username).first()
 
-        if not user or not verify_password(form_data.password, user.password_hash):
+        if not user or not await verify_password_async(
+            form_data.password, user.password_hash
+        ):
             log_auth_event(
                 "login", form_data.username, False, {"reason": "invalid_credentials"}
             )
@@ -162,9 +231,7 @@ async def login(
 
         # Создаем токен доступа (1 час)
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
-        )
+        access_token = await issue_access_token(db, user, access_token_expires)
 
         log_auth_event("login", user.email, True, {"user_id": user.id})
         logger.info("User logged in successfully", user_id=user.id, email=user.email)
@@ -190,7 +257,6 @@ async def login(
 async def login_json(
     user_data: UserLogin,
     db: Session = Depends(get_db),
-    limiter = Depends(get_limiter),
 ) -> Any:
     """Вход в систему через JSON (для frontend)"""
     try:
@@ -199,7 +265,9 @@ async def login_json(
         # Ищем пользователя по email
         user = db.query(User).filter(User.email == user_data.email).first()
 
-        if not user or not verify_password(user_data.password, user.password_hash):
+        if not user or not await verify_password_async(
+            user_data.password, user.password_hash
+        ):
             log_auth_event(
                 "login", user_data.email, False, {"reason": "invalid_credentials"}
             )
@@ -220,9 +288,7 @@ async def login_json(
 
         # Создаем токен доступа
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
-        )
+        access_token = await issue_access_token(db, user, access_token_expires)
 
         log_auth_event("login", user_data.email, True, {"user_id": user.id})
         logger.info("User logged in successfully", user_id=user.id, email=user.email)
@@ -240,7 +306,7 @@ async def login_json(
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user(current_user: User = Depends(get_current_user_from_token)) -> Any:
+def get_current_user(current_user: Principal = Depends(get_current_principal)) -> Any:
     """Получение информации о текущем пользователе"""
     return UserResponse(
         id=current_user.id,
@@ -255,17 +321,11 @@ def get_current_user(current_user: User = Depends(get_current_user_from_token))
 
 @router.get("/me/roles")
 def get_current_user_roles(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ) -> Any:
     """Получение ролей текущего пользователя"""
-    user_roles = db.query(UserRole).filter(UserRole.user_id == current_user.id).all()
-    roles = []
-
-    for user_role in user_roles:
-        role = db.query(Role).filter(Role.id == user_role.role_id).first()
-        if role and role.is_active:
-            roles.append(role.name)
+    # Роли уже в снимке: он читается из кэша или собирается одним запросом
+    roles = list(current_user.roles)
 
     return {
         "user_id": current_user.id,
@@ -1,11 +1,12 @@
 from datetime import datetime
 from typing import Any
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.api.v1.auth import get_current_user_from_token
+from app.api.v1.auth import get_current_principal, get_current_user_from_token
 from app.core.database import get_db
 from app.core.logging_config import get_logger
 from app.models.order import Order
@@ -18,6 +19,8 @@ from app.schemas.payment import (
     CardVerificationRequest,
     PaymentStatus,
 )
+from app.services.cache import invalidate_user_cache
+from app.services.principal import Principal
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -26,7 +29,7 @@ router = APIRouter()
 @router.post("/topup-balance", response_model=BalanceTopUpResponse)
 def topup_balance(
     request: BalanceTopUpRequest,
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Пополнение баланса пользователя"""
@@ -151,6 +154,9 @@ def verify_payment(
 
         db.commit()
 
+        # Баланс в кэше ответов устарел (эндпоинт работает в потоке)
+        from_thread.run(invalidate_user_cache, current_user.id)
+
         logger.info(
             f"Баланс пользователя {current_user.email} пополнен на {payment.amount}"
         )
@@ -182,7 +188,7 @@ def get_balance(
 
 @router.get("/topup-statistics", response_model=dict)
 def get_topup_statistics(
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Получение статистики пополнений (только для админов)"""
@@ -1,27 +1,36 @@
-from typing import Any, List
+from typing import Any, Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.limiter import get_limiter
 from app.core.logging_config import get_logger
 from app.dependencies.roles import require_admin
 from app.models.plan import Plan
 from app.models.product import Product
 from app.models.product_plan import ProductPlan
-from app.models.user import User
 from app.schemas.product import (
     PlanResponse,
     ProductCreate,
     ProductResponse,
     ProductUpdate,
 )
-from app.services.cache import cache, invalidate_products_cache
+from app.services.cache import (
+    CATALOG_NAMESPACE,
+    cache,
+    cache_many,
+    invalidate_products_cache,
+)
+from app.services.principal import TokenClaims
 
 logger = get_logger("neuro_store.products")
 
+# Максимум продуктов в одном запросе планов
+MAX_BATCH_PRODUCT_IDS = 100
+
 router = APIRouter(
     prefix="/products",
     tags=["Продукты"],
@@ -38,13 +47,18 @@ router = APIRouter(
     summary="Список продуктов",
     description="Получение списка всех активных нейросетевых продуктов с возможностью фильтрации по категории",
 )
-@cache(ttl=settings.CACHE_TTL_PRODUCTS, key_prefix="products")
-async def get_products(
+@cache(
+    ttl=settings.CACHE_TTL_PRODUCTS,
+    key_prefix="products",
+    namespace=CATALOG_NAMESPACE,
+    stale_ttl=settings.CACHE_STALE_TTL_SECONDS,
+    response_model=List[ProductResponse],
+)
+def get_products(
     skip: int = 0,
     limit: int = 100,
     category: str = None,
     db: Session = Depends(get_db),
-    limiter = Depends(get_limiter),
 ) -> Any:
     """Получение списка всех продуктов с кэшированием"""
     try:
@@ -68,9 +82,70 @@ async def get_products(
         )
 
 
+@cache_many(
+    ttl=settings.CACHE_TTL_PLANS,
+    key_prefix="product_plans",
+    id_param="product_id",
+    namespace=CATALOG_NAMESPACE,
+    tags=["plans", "product:{product_id}"],
+    stale_ttl=settings.CACHE_STALE_TTL_SECONDS,
+    response_model=List[PlanResponse],
+)
+def load_plans_by_product(product_ids: List[int], db: Session) -> Dict[int, List[Plan]]:
+    """Доступные планы нескольких продуктов одним запросом к БД"""
+    rows = (
+        db.query(Product.id, Plan)
+        .outerjoin(
+            ProductPlan,
+            and_(ProductPlan.product_id == Product.id, ProductPlan.is_available),
+        )
+        .outerjoin(Plan, and_(Plan.id == ProductPlan.plan_id, Plan.is_active))
+        .filter(Product.id.in_(product_ids))
+        .order_by(Product.id, ProductPlan.id)
+        .all()
+    )
+
+    # Продукт без доступных планов получает пустой список, несуществующий - ничего
+    plans: Dict[int, List[Plan]] = {}
+    for product_id, plan in rows:
+        plans.setdefault(product_id, [])
+        if plan is not None:
+            plans[product_id].append(plan)
+    return plans
+
+
+@router.get(
+    "/plans",
+    response_model=Dict[int, List[PlanResponse]],
+    summary="Планы нескольких продуктов",
+    description="Получение тарифных планов сразу для нескольких продуктов "
+    "(?product_ids=1&product_ids=2); несуществующие продукты пропускаются",
+)
+async def get_products_plans(
+    product_ids: List[int] = Query(...),
+    db: Session = Depends(get_db),
+) -> Any:
+    """Получение планов для нескольких продуктов с пакетным кэшированием"""
+    if len(product_ids) > MAX_BATCH_PRODUCT_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не более {MAX_BATCH_PRODUCT_IDS} продуктов за запрос",
+        )
+
+    return await load_plans_by_product(product_ids, db=db)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
+@cache(
+    ttl=settings.CACHE_TTL_PRODUCTS,
+    key_prefix="product",
+    namespace=CATALOG_NAMESPACE,
+    tags=["product:{product_id}"],
+    response_model=ProductResponse,
+    negative_ttl=settings.CACHE_NEGATIVE_TTL_SECONDS,
+)
 def get_product(product_id: int, db: Session = Depends(get_db)) -> Any:
-    """Получение продукта по ID"""
+    """Получение продукта по ID с кэшированием, включая ответы 404"""
     product = db.query(Product).filter(Product.id == product_id).first()
 
     if not product:
@@ -87,11 +162,17 @@ def get_product(product_id: int, db: Session = Depends(get_db)) -> Any:
     summary="Планы продукта",
     description="Получение всех доступных тарифных планов для конкретного продукта",
 )
-@cache(ttl=settings.CACHE_TTL_PLANS, key_prefix="product_plans")
-async def get_product_plans(
+@cache(
+    ttl=settings.CACHE_TTL_PLANS,
+    key_prefix="product_plans",
+    namespace=CATALOG_NAMESPACE,
+    tags=["plans", "product:{product_id}"],
+    stale_ttl=settings.CACHE_STALE_TTL_SECONDS,
+    response_model=List[PlanResponse],
+)
+def get_product_plans(
     product_id: int,
     db: Session = Depends(get_db),
-    limiter = Depends(get_limiter),
 ) -> Any:
     """Получение планов для конкретного продукта с кэшированием"""
     try:
@@ -144,10 +225,10 @@ async def get_product_plans(
     summary="Создание продукта",
     description="Создание нового нейросетевого продукта (только для администраторов)",
 )
-async def create_product(
+def create_product(
     product_data: ProductCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Создание нового продукта (только для админов)"""
     try:
@@ -162,8 +243,9 @@ async def create_product(
         db.commit()
         db.refresh(product)
 
-        # Инвалидируем кэш продуктов
-        await invalidate_products_cache()
+        # Эндпоинт синхронный и работает в потоке: инвалидацию выполняем
+        # в event loop до ответа клиенту
+        from_thread.run(invalidate_products_cache)
 
         logger.info(
             "Product created successfully",
@@ -188,7 +270,7 @@ def update_product(
     product_id: int,
     product_data: ProductUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Обновление продукта (только для админов)"""
 
@@ -204,6 +286,9 @@ def update_product(
     db.commit()
     db.refresh(product)
 
+    # Инвалидируем кэш продуктов
+    from_thread.run(invalidate_products_cache)
+
     return product
 
 
@@ -211,7 +296,7 @@ def update_product(
 def delete_product(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ):
     """Удаление продукта (только для админов)"""
 
@@ -224,3 +309,6 @@ def delete_product(
     # Мягкое удаление - просто деактивируем
     product.is_active = False
     db.commit()
+
+    # Инвалидируем кэш продуктов
+    from_thread.run(invalidate_products_cache)
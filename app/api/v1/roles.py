@@ -4,6 +4,7 @@
 
 from typing import Any, List
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
@@ -13,13 +14,21 @@ from app.models.role import Role
 from app.models.user import User
 from app.models.user_role import UserRole
 from app.schemas.user import RoleCreate, RoleResponse, UserRoleAssign
+from app.services import roles as role_service
+from app.services.cache import invalidate_user_cache
+from app.services.principal import (
+    RoleVersionUnavailable,
+    TokenClaims,
+    bump_role_version,
+    forget_role_version,
+)
 
 router = APIRouter(prefix="/roles", tags=["Роли"])
 
 
 @router.get("/", response_model=List[RoleResponse])
 def get_roles(
-    db: Session = Depends(get_db), current_user: User = Depends(require_admin)
+    db: Session = Depends(get_db), current_user: TokenClaims = Depends(require_admin)
 ) -> Any:
     """Получение списка всех ролей (только для админов)"""
     roles = db.query(Role).filter(Role.is_active).all()
@@ -30,7 +39,7 @@ def get_roles(
 def create_role(
     role_data: RoleCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Создание новой роли (только для админов)"""
     # Проверяем, что роль с таким именем не существует
@@ -53,7 +62,7 @@ def create_role(
 def assign_role_to_user(
     assignment: UserRoleAssign,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Назначение роли пользователю (только для админов)"""
     # Проверяем существование пользователя
@@ -90,8 +99,20 @@ def assign_role_to_user(
     user_role = UserRole(user_id=assignment.user_id, role_id=assignment.role_id)
 
     db.add(user_role)
+
+    # Роли входят в выданные токены: версия ролей растет в той же транзакции,
+    # а ее копия в Redis сбрасывается до фиксации
+    bump_role_version(db, assignment.user_id)
+    try:
+        from_thread.run(forget_role_version, assignment.user_id)
+    except RoleVersionUnavailable:
+        db.rollback()
+        raise
     db.commit()
 
+    # и в закэшированный снимок пользователя
+    from_thread.run(invalidate_user_cache, assignment.user_id)
+
     return {
         "message": f"Роль '{role.name}' успешно назначена пользователю {user.email}"
     }
@@ -101,7 +122,7 @@ def assign_role_to_user(
 def revoke_role_from_user(
     assignment: UserRoleAssign,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ):
     """Отзыв роли у пользователя (только для админов)"""
     user_role = (
@@ -119,14 +140,22 @@ def revoke_role_from_user(
         )
 
     db.delete(user_role)
+    bump_role_version(db, assignment.user_id)
+    try:
+        from_thread.run(forget_role_version, assignment.user_id)
+    except RoleVersionUnavailable:
+        db.rollback()
+        raise
     db.commit()
 
+    from_thread.run(invalidate_user_cache, assignment.user_id)
+
 
 @router.get("/user/{user_id}", response_model=List[RoleResponse])
 def get_user_roles(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: TokenClaims = Depends(require_admin),
 ) -> Any:
     """Получение ролей пользователя (только для админов)"""
     user = db.query(User).filter(User.id == user_id).first()
@@ -135,12 +164,4 @@ def get_user_roles(
             status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
         )
 
-    user_roles = db.query(UserRole).filter(UserRole.user_id == user_id).all()
-    roles = []
-
-    for user_role in user_roles:
-        role = db.query(Role).filter(Role.id == user_role.role_id).first()
-        if role and role.is_active:
-            roles.append(role)
-
-    return roles
+    return role_service.get_user_roles(db, user_id)
@@ -1,14 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Any, List
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.api.v1.auth import get_current_user_from_token
+from app.api.v1.auth import get_current_principal, get_current_user_from_token
 from app.core.database import get_db
 from app.models.order import Order
 from app.models.payment import Payment
-from app.models.plan import Plan
 from app.models.product import Product
 from app.models.subscription import Subscription
 from app.models.user import User
@@ -17,13 +17,16 @@ from app.schemas.subscription import (
     SubscriptionResponse,
     SubscriptionStatus,
 )
+from app.services.cache import invalidate_user_cache
+from app.services.principal import Principal
+from app.services.reference_data import reference_data
 
 router = APIRouter(prefix="/subscriptions", tags=["Подписки"])
 
 
 @router.get("/", response_model=List[SubscriptionResponse])
 def get_user_subscriptions(
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Получение подписок текущего пользователя"""
@@ -37,7 +40,7 @@ def get_user_subscriptions(
 @router.get("/{subscription_id}", response_model=SubscriptionResponse)
 def get_subscription(
     subscription_id: int,
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Получение конкретной подписки пользователя"""
@@ -79,11 +82,8 @@ def create_subscription(
             detail="Продукт не найден или неактивен",
         )
 
-    plan = (
-        db.query(Plan)
-        .filter(Plan.id == subscription_data.plan_id, Plan.is_active)
-        .first()
-    )
+    # Активные планы берутся из снимка справочников в памяти
+    plan = reference_data.plan(db, subscription_data.plan_id)
 
     if not plan:
         raise HTTPException(
@@ -141,6 +141,10 @@ def create_subscription(
     db.add(payment)
     db.commit()
 
+    # Изменились подписки и баланс; эндпоинт синхронный и работает в потоке,
+    # поэтому инвалидацию выполняем в event loop до ответа клиенту
+    from_thread.run(invalidate_user_cache, current_user.id)
+
     db.refresh(subscription)
     return subscription
 
@@ -148,7 +152,7 @@ def create_subscription(
 @router.put("/{subscription_id}/cancel", response_model=SubscriptionResponse)
 def cancel_subscription(
     subscription_id: int,
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Отмена подписки"""
@@ -174,6 +178,7 @@ def cancel_subscription(
     subscription.auto_renew = False
 
     db.commit()
+    from_thread.run(invalidate_user_cache, current_user.id)
     db.refresh(subscription)
 
     return subscription
@@ -182,7 +187,7 @@ def cancel_subscription(
 @router.get("/{subscription_id}/status", response_model=SubscriptionStatus)
 def get_subscription_status(
     subscription_id: int,
-    current_user: User = Depends(get_current_user_from_token),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ) -> Any:
     """Получение статуса подписки"""
@@ -203,6 +208,7 @@ def get_subscription_status(
     if subscription.status == "active" and datetime.utcnow() > subscription.end_date:
         subscription.status = "expired"
         db.commit()
+        from_thread.run(invalidate_user_cache, current_user.id)
 
     return SubscriptionStatus(
         id=subscription.id,
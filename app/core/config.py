@@ -39,6 +39,12 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     JWT_EXPIRE_MINUTES: int = 60
 
+    # Процессы для bcrypt и размер очереди к ним: сверх очереди - 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    # Понижение приоритета процессов хеширования (nice), 0 - не понижать
+    PASSWORD_HASH_NICE: int = 10
+
     # Настройки логирования
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "json"
@@ -48,21 +54,99 @@ class Settings(BaseSettings):
 
     # Настройки Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Отдельная база для тестов: они очищают ее перед каждым тестом
+    TEST_REDIS_URL: str = "redis://localhost:6379/1"
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
 
-    # Rate Limiting
+    # Общий пул соединений Redis (кэш, шина инвалидации, rate limiter)
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 0.5
+    # С запасом на Lua-инвалидацию тегов, SCAN+UNLINK и MEMORY USAGE:
+    # таймаут чтения считается отказом Redis и размыкает выключатель
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 2.0
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30
+
+    # Circuit breaker: после N подряд ошибок соединения Redis обходится cool-down
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5
+    REDIS_BREAKER_COOLDOWN_SECONDS: float = 10.0
+
+    # Rate Limiting: политики RATE_LIMIT_<ИМЯ> применяются по таблице маршрутов
+    RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_DEFAULT: str = "20/minute"
     RATE_LIMIT_LOGIN: str = "5/minute"
     RATE_LIMIT_REGISTER: str = "3/minute"
     RATE_LIMIT_PRODUCTS: str = "30/minute"
     RATE_LIMIT_SUBSCRIPTIONS: str = "10/minute"
 
+    # Политики (через запятую, без префикса RATE_LIMIT_), лимитируемые
+    # приблизительно: локальные корзины воркера и сверка с Redis раз в интервал
+    RATE_LIMIT_APPROXIMATE: str = "products"
+    RATE_LIMIT_SYNC_INTERVAL_MS: int = 250
+
+    # Прокси (IP или подсети через запятую), от которых принимаются
+    # X-Forwarded-For и X-Real-IP; для остальных клиент - адрес соединения
+    RATE_LIMIT_TRUSTED_PROXIES: str = ""
+
     # Кэширование
     CACHE_TTL_SECONDS: int = 120
     CACHE_TTL_PRODUCTS: int = 300
     CACHE_TTL_PLANS: int = 600
+    CACHE_TTL_USER: int = 60
+    CACHE_SCAN_BATCH_SIZE: int = 1000
+    CACHE_UNLINK_CHUNK_SIZE: int = 500
+    CACHE_SCAN_PAUSE_MS: int = 0
+
+    # Снимок пользователя для аутентификации (principal): TTL в Redis и в L1
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_L1_TTL_SECONDS: int = 5
+
+    # L1 кэш в памяти воркера: "префикс=TTL" через запятую, пусто - выключен
+    CACHE_L1_PREFIXES: str = "products=30,product_plans=60"
+    CACHE_L1_MAX_ITEMS: int = 10000
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_PROMOTE_AFTER: int = 2
+    CACHE_BUS_CHANNEL: str = "neuro_store:cache:invalidate"
+
+    # Защита от cache stampede: блокировка пересчета ключа между процессами
+    CACHE_LOCK_TTL_MS: int = 5000
+    CACHE_LOCK_WAIT_MS: int = 2000
+    CACHE_LOCK_POLL_MS: int = 50
+
+    # Stale-while-revalidate и разброс TTL
+    CACHE_STALE_TTL_SECONDS: int = 120
+    CACHE_TTL_JITTER: float = 0.1
+
+    # Кэширование ответов 404 для несуществующих объектов
+    CACHE_NEGATIVE_TTL_SECONDS: int = 30
+
+    # Сколько воркер держит в L1 поколение пространства имен кэша
+    CACHE_NAMESPACE_L1_TTL_SECONDS: int = 5
+
+    # Кодек значений кэша: json | orjson | msgpack, сжатие: none | zlib | lz4
+    CACHE_SERIALIZER: str = "orjson"
+    CACHE_COMPRESSION: str = "zlib"
+    CACHE_COMPRESS_THRESHOLD_BYTES: int = 1024
+
+    # Прогрев кэша каталога при старте
+    CACHE_WARMUP_ENABLED: bool = True
+    CACHE_WARMUP_BUDGET_SECONDS: float = 5.0
+    CACHE_WARMUP_LOCK_TTL_SECONDS: int = 60
+
+    # Размер выборки ключей для анализа памяти Redis
+    CACHE_MEMORY_SAMPLE_SIZE: int = 1000
+
+    # Справочник тарифных планов в памяти воркера: загрузка при старте,
+    # период проверки версии в Redis и наибольший возраст снимка
+    REFERENCE_DATA_PRELOAD: bool = True
+    REFERENCE_DATA_CHECK_SECONDS: float = 5.0
+    REFERENCE_DATA_MAX_AGE_SECONDS: float = 60.0
+
+    # Кэш готовых HTTP-ответов; тела больше лимита не сохраняются
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_BODY_BYTES: int = 1024 * 1024
 
     # Внешние API
     OPENAI_API_KEY: str = ""
@@ -1,31 +1,100 @@
 """
 Конфигурация rate limiting для Neuro Store API
+
+Лимит проверяется алгоритмом GCRA (generic cell rate algorithm): для каждого
+ключа Redis хранит одно число - теоретическое время прибытия (TAT) следующего
+запроса. Lua-скрипт за один EVALSHA читает TAT, решает, пропустить ли запрос,
+сдвигает TAT и возвращает остаток квоты и время до ее восстановления. Часы
+берутся из Redis (TIME), поэтому воркеры с расходящимися часами считают одинаково.
+
+В отличие от фиксированного окна fastapi_limiter, GCRA не пропускает двойной
+всплеск на границе окон и сообщает клиенту остаток квоты (X-RateLimit-*).
+
+Для нагруженных публичных маршрутов есть приблизительный режим: воркер
+держит локальные token bucket по идентификаторам и тратит квоту без Redis,
+а раз в RATE_LIMIT_SYNC_INTERVAL_MS одним pipeline сообщает Redis, сколько
+потратил, и получает общий остаток. Превышение лимита в этом режиме
+ограничено расходом всех воркеров за один интервал сверки. Режим выбирается
+для каждой политики настройкой RATE_LIMIT_APPROXIMATE.
+
+Лимиты применяет RateLimitMiddleware по таблице маршрутов (см. main.py), а
+не зависимости эндпоинтов.
 """
 
-import redis.asyncio as redis
-from fastapi import Request
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+import asyncio
+import contextlib
+import functools
+import ipaddress
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.config import settings
 from app.core.logging_config import get_logger
+from app.core.redis_pool import get_redis_client
+from app.core.security import verify_token
 
 logger = get_logger("neuro_store.limiter")
 
+KEY_PREFIX = "ratelimit"
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# KEYS[1] - ключ лимита; ARGV: лимит, период в мс, стоимость запроса и
+# флаг сверки: расход уже случился в воркере и учитывается без отказа.
+# Возвращает {пропущен, остаток, мс до полного восстановления, мс до повтора}
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local interval = period / limit
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + cost * interval
+local allow_at = new_tat - period
+local allowed = 1
+if allow_at > now then
+    if not force then
+        local remaining = math.floor((period - (tat - now)) / interval)
+        return {0, remaining, math.ceil(tat - now), math.ceil(allow_at - now)}
+    end
+    -- Перерасход при сверке: долг не больше одного периода
+    allowed = 0
+    new_tat = now + period
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(math.ceil(new_tat - now), 1))
+local remaining = math.floor((period - (new_tat - now)) / interval)
+return {allowed, remaining, math.ceil(new_tat - now), 0}
+"""
+
 
 async def init_limiter() -> None:
     """Инициализация rate limiter с Redis"""
     try:
-        # Подключаемся к Redis
-        redis_client = redis.from_url(
-            settings.REDIS_URL, encoding="utf-8", decode_responses=True
-        )
+        # Общий с кэшем пул соединений с circuit breaker
+        redis_client = get_redis_client()
 
         # Проверяем подключение
         await redis_client.ping()
 
-        # Инициализируем FastAPILimiter
-        await FastAPILimiter.init(redis_client)
+        # Загружаем скрипт заранее: проверки идут сразу через EVALSHA
+        await rate_limiter.load()
+        await approximate_limiter.start()
 
         logger.info(
             "Rate limiter initialized successfully", redis_url=settings.REDIS_URL
@@ -37,64 +106,428 @@ async def init_limiter() -> None:
 
 
 async def close_limiter() -> None:
-    """Закрытие rate limiter"""
+    """Закрытие rate limiter (пул закрывается close_redis_client)"""
     try:
-        await FastAPILimiter.close()
+        await approximate_limiter.stop()
+        rate_limiter.redis = None
         logger.info("Rate limiter closed successfully")
     except Exception as e:
         logger.error("Failed to close rate limiter", error=str(e))
 
 
-def get_client_ip(request: Request) -> str:
-    """Получение IP адреса клиента для rate limiting"""
-    # Проверяем заголовки прокси
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        return forwarded_for.split(",")[0].strip()
-
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
-
-    # Возвращаем IP из соединения
-    if hasattr(request.client, "host"):
-        return request.client.host
-
-    return "unknown"
-
+@functools.lru_cache(maxsize=8)
+def _proxy_networks(value: str) -> Tuple[IPNetwork, ...]:
+    return tuple(
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in value.split(",")
+        if entry.strip()
+    )
 
-def create_rate_limiter(times: int, seconds: int, identifier_func=None):
-    """Создание rate limiter с кастомными параметрами"""
-    if identifier_func is None:
-        identifier_func = get_client_ip
-
-    return RateLimiter(times=times, seconds=seconds, identifier=identifier_func)
-
-
-# Предустановленные лимитеры для разных эндпоинтов
-def get_default_limiter():
-    """Стандартный лимитер (20 запросов в минуту)"""
-    return create_rate_limiter(times=20, seconds=60)
 
+def is_trusted_proxy(host: str) -> bool:
+    """Адрес входит в RATE_LIMIT_TRUSTED_PROXIES"""
+    networks = _proxy_networks(settings.RATE_LIMIT_TRUSTED_PROXIES)
+    if not networks:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
 
-def get_auth_limiter():
-    """Лимитер для аутентификации (5 запросов в минуту)"""
-    return create_rate_limiter(times=5, seconds=60)
 
+def get_client_ip(request: Request) -> str:
+    """
+    Получение IP адреса клиента для rate limiting
+
+    Заголовки прокси задает клиент, поэтому им верим, только если соединение
+    пришло от доверенного прокси. X-Forwarded-For читается справа налево:
+    клиент - первый адрес, не принадлежащий доверенным прокси.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None:
+        return "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
 
-def get_register_limiter():
-    """Лимитер для регистрации (3 запроса в минуту)"""
-    return create_rate_limiter(times=3, seconds=60)
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not is_trusted_proxy(hop):
+                return hop
+        if hops:
+            return hops[0]
 
+    real_ip = request.headers.get("X-Real-IP")
+    if real_ip:
+        return real_ip.strip()
+
+    return peer
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Лимит: не более times запросов за seconds секунд"""
+
+    times: int
+    seconds: int
+
+    @classmethod
+    def parse(cls, rate_limit_str: str) -> "RateLimit":
+        return cls(*parse_rate_limit(rate_limit_str))
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Результат проверки лимита"""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    # Через сколько секунд квота восстановится полностью
+    reset_after: float
+    # Через сколько секунд можно повторить отклоненный запрос
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        """Заголовки X-RateLimit-* (и Retry-After для отклоненного запроса)"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class GCRARateLimiter:
+    """Проверка лимитов GCRA-скриптом в Redis, один EVALSHA на запрос"""
+
+    def __init__(self, redis_client=None, prefix: str = KEY_PREFIX):
+        self.redis = redis_client
+        self.prefix = prefix
+        self._script = None
+
+    def _get_script(self):
+        if self.redis is None:
+            self.redis = get_redis_client()
+        if self._script is None or self._script.registered_client is not self.redis:
+            # Script сам выполняет EVALSHA и перезагружает скрипт при NOSCRIPT
+            self._script = self.redis.register_script(GCRA_SCRIPT)
+        return self._script
+
+    async def load(self) -> None:
+        """SCRIPT LOAD заранее, чтобы первая проверка не получила NOSCRIPT"""
+        script = self._get_script()
+        await self.redis.script_load(script.script)
+
+    async def hit(self, key: str, limit: RateLimit, cost: int = 1) -> RateLimitResult:
+        """Учесть запрос по ключу; при недоступности Redis запрос пропускается"""
+        try:
+            allowed, remaining, reset_ms, retry_ms = await self._get_script()(
+                keys=[f"{self.prefix}:{key}"],
+                args=[limit.times, limit.seconds * 1000, cost],
+            )
+        except RedisError as e:
+            # В том числе CircuitOpenError: лимит не проверяем, запрос не роняем
+            logger.warning("Rate limit check skipped", key=key, error=str(e))
+            return RateLimitResult(True, limit.times, limit.times, 0.0)
+
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit.times,
+            remaining=int(remaining),
+            reset_after=int(reset_ms) / 1000,
+            retry_after=int(retry_ms) / 1000,
+        )
 
-def get_products_limiter():
-    """Лимитер для продуктов (30 запросов в минуту)"""
-    return create_rate_limiter(times=30, seconds=60)
+    async def reconcile(self, spent: Sequence[Tuple[str, RateLimit, int]]) -> List[int]:
+        """
+        Учесть уже потраченные воркером запросы одним pipeline
+
+        Возвращает общий остаток квоты по каждому ключу. Ошибки Redis
+        пробрасываются: вызывающий сохранит расход до следующей сверки.
+        """
+        script = self._get_script()
+        pipe = self.redis.pipeline(transaction=False)
+        # Pipeline сам загрузит скрипт, если Redis его не знает
+        pipe.scripts.add(script)
+        for key, limit, cost in spent:
+            pipe.evalsha(
+                script.sha,
+                1,
+                f"{self.prefix}:{key}",
+                limit.times,
+                limit.seconds * 1000,
+                cost,
+                1,
+            )
+        results = await pipe.execute()
+        return [int(remaining) for _, remaining, _, _ in results]
+
+    async def reset(self, key: str) -> None:
+        await self.redis.delete(f"{self.prefix}:{key}")
+
+
+@dataclass
+class _LocalBucket:
+    """Локальная корзина: токены и расход, еще не сообщенный Redis"""
+
+    limit: RateLimit
+    tokens: float
+    updated: float
+    pending: int = 0
+
+    def refill(self, now: float) -> None:
+        rate = self.limit.times / self.limit.seconds
+        self.tokens = min(self.limit.times, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class ApproximateRateLimiter:
+    """Локальные token bucket с периодической сверкой расхода с Redis"""
+
+    def __init__(
+        self,
+        exact: Optional[GCRARateLimiter] = None,
+        sync_interval: float = 0.25,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.exact = exact
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.syncs = 0
+        self._buckets: Dict[str, _LocalBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        """Учесть запрос локально; Redis вызывается только для нового ключа"""
+        exact = self.exact or rate_limiter
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.limit != limit:
+            # Первый запрос ключа в воркере - точная проверка, она же задает остаток
+            result = await exact.hit(key, limit)
+            self._buckets[key] = _LocalBucket(limit, result.remaining, self.clock())
+            return result
+
+        bucket.refill(self.clock())
+        interval = limit.seconds / limit.times
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.pending += 1
+            return RateLimitResult(
+                allowed=True,
+                limit=limit.times,
+                remaining=int(bucket.tokens),
+                reset_after=(limit.times - bucket.tokens) * interval,
+            )
+        return RateLimitResult(
+            allowed=False,
+            limit=limit.times,
+            remaining=0,
+            reset_after=(limit.times - bucket.tokens) * interval,
+            retry_after=(1 - bucket.tokens) * interval,
+        )
 
+    async def sync(self) -> None:
+        """Сообщить Redis локальный расход и принять общий остаток"""
+        now = self.clock()
+        spent = []
+        for key, bucket in list(self._buckets.items()):
+            if bucket.pending:
+                spent.append((key, bucket, bucket.pending))
+                bucket.pending = 0
+            elif now - bucket.updated > bucket.limit.seconds:
+                # Квота давно восстановилась: корзина больше не нужна
+                del self._buckets[key]
+        if not spent:
+            return
+
+        exact = self.exact or rate_limiter
+        try:
+            remaining = await exact.reconcile(
+                [(key, bucket.limit, cost) for key, bucket, cost in spent]
+            )
+        except RedisError as e:
+            # Расход не потерян: уйдет со следующей сверкой
+            for _, bucket, cost in spent:
+                bucket.pending += cost
+            logger.warning("Rate limit sync failed", keys=len(spent), error=str(e))
+            return
+
+        now = self.clock()
+        for (_, bucket, _), left in zip(spent, remaining):
+            # Пока шла сверка, воркер мог потратить еще
+            bucket.tokens = max(left - bucket.pending, 0)
+            bucket.updated = now
+        self.syncs += 1
+
+    async def start(self) -> None:
+        """Запуск фоновой сверки (из lifespan каждого воркера)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        # Остаток расхода не теряем при остановке
+        with contextlib.suppress(Exception):
+            await self.sync()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning("Rate limit sync failed", error=str(e))
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+
+# Лимитеры процесса (клиент берется из общего пула при первой проверке)
+rate_limiter = GCRARateLimiter()
+approximate_limiter = ApproximateRateLimiter(
+    sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL_MS / 1000
+)
+
+
+def is_approximate(policy: str) -> bool:
+    """Политика из RATE_LIMIT_APPROXIMATE лимитируется приблизительно"""
+    names = {
+        name.strip().lower()
+        for name in settings.RATE_LIMIT_APPROXIMATE.split(",")
+        if name.strip()
+    }
+    return policy.lower() in names
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """
+    Строка таблицы лимитов
+
+    Args:
+        path: Путь маршрута или, при prefix=True, префикс путей
+        policy: Имя политики - лимит берется из настройки RATE_LIMIT_<POLICY>
+        methods: HTTP-методы; None - любые
+        prefix: Сопоставлять path как префикс
+    """
+
+    path: str
+    policy: str
+    methods: Optional[Tuple[str, ...]] = None
+    prefix: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return path.startswith(self.path) if self.prefix else path == self.path
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Политика, собранная из настроек"""
+
+    name: str
+    limit: RateLimit
+    approximate: bool
+
+
+def policy_from_settings(name: str) -> RateLimitPolicy:
+    """Политика RATE_LIMIT_<NAME>; неизвестное имя получает RATE_LIMIT_DEFAULT"""
+    value = getattr(settings, f"RATE_LIMIT_{name.upper()}", settings.RATE_LIMIT_DEFAULT)
+    return RateLimitPolicy(name, RateLimit.parse(value), is_approximate(name))
+
+
+def rate_limit_identity(request: Request) -> str:
+    """Кого лимитируем: пользователь валидного Bearer-токена или IP клиента"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        payload = verify_token(token)
+        if payload and payload.get("sub"):
+            return f"user:{payload.get('uid') or payload['sub']}"
+    return f"ip:{get_client_ip(request)}"
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware rate limiting по таблице маршрутов
+
+    Таблица правил и лимиты политик собираются один раз при создании
+    приложения; на запросе остается найти первое подходящее правило и
+    сделать одну проверку лимитера. Квота политики общая для всех ее
+    маршрутов и считается отдельно для каждого пользователя или IP.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[RateLimitRule] = ()):
+        self.app = app
+        policies: Dict[str, RateLimitPolicy] = {}
+        self.table: List[Tuple[RateLimitRule, RateLimitPolicy]] = []
+        for rule in rules:
+            if rule.policy not in policies:
+                policies[rule.policy] = policy_from_settings(rule.policy)
+            self.table.append((rule, policies[rule.policy]))
+        logger.info(
+            "Rate limit table compiled",
+            rules=len(self.table),
+            policies={
+                name: f"{policy.limit.times}/{policy.limit.seconds}s"
+                + (" approximate" if policy.approximate else "")
+                for name, policy in policies.items()
+            },
+        )
 
-def get_subscriptions_limiter():
-    """Лимитер для подписок (10 запросов в минуту)"""
-    return create_rate_limiter(times=10, seconds=60)
+    def resolve(self, method: str, path: str) -> Optional[RateLimitPolicy]:
+        for rule, policy in self.table:
+            if rule.matches(method, path):
+                return policy
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not settings.RATE_LIMIT_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.resolve(scope["method"], scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = approximate_limiter if policy.approximate else rate_limiter
+        key = f"{policy.name}:{rate_limit_identity(Request(scope))}"
+        result = await limiter.hit(key, policy.limit)
+        if not result.allowed:
+            logger.info("Rate limit exceeded", policy=policy.name, key=key)
+            response = JSONResponse(
+                {"detail": "Превышен лимит запросов"},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers=result.headers(),
+            )
+            await response(scope, receive, send)
+            return
+
+        extra = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in result.headers().items()
+        ]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
 def parse_rate_limit(rate_limit_str: str) -> tuple[int, int]:
@@ -119,16 +552,3 @@ def parse_rate_limit(rate_limit_str: str) -> tuple[int, int]:
     except (ValueError, AttributeError):
         # Возвращаем значения по умолчанию
         return 20, 60
-
-
-def get_limiter_from_settings(setting_name: str, default: str = "20/minute"):
-    """Создание лимитера из настроек"""
-    rate_limit_str = getattr(settings, setting_name, default)
-    times, seconds = parse_rate_limit(rate_limit_str)
-    return create_rate_limiter(times=times, seconds=seconds)
-
-
-async def get_limiter():
-    """Получение rate limiter для dependency injection"""
-    # Возвращаем стандартный лимитер
-    return get_default_limiter()
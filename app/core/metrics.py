@@ -0,0 +1,133 @@
+"""
+Метрики Neuro Store в текстовом формате Prometheus
+
+Сервисы регистрируют сборщики - функции, возвращающие строки экспозиции,
+а эндпоинт /metrics склеивает их вывод. Отдельная клиентская библиотека не
+нужна: формат текстовый, а счетчики и так живут в самих сервисах.
+"""
+
+import bisect
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.core.logging_config import get_logger
+
+logger = get_logger("neuro_store.metrics")
+
+Labels = Dict[str, str]
+
+# Границы корзин гистограмм задержки, в секундах
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+@dataclass
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    buckets: Sequence[float] = LATENCY_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            # Последняя корзина - +Inf
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+def register_collector(collector: Callable[[], Iterable[str]]):
+    """Регистрация сборщика метрик (можно использовать как декоратор)"""
+    _collectors.append(collector)
+    return collector
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    rendered = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + rendered + "}"
+
+
+def metric_lines(
+    name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, float]]
+) -> List[str]:
+    """Строки экспозиции для счетчика или измерителя"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return lines
+
+
+def histogram_lines(
+    name: str, help_text: str, series: Iterable[Tuple[Labels, Histogram]]
+) -> List[str]:
+    """Строки экспозиции гистограмм"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            bucket_labels = _format_labels({**labels, "le": repr(bound)})
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        inf_labels = _format_labels({**labels, "le": "+Inf"})
+        lines.append(f"{name}_bucket{inf_labels} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def render_metrics() -> str:
+    """Все зарегистрированные метрики в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.error(
+                "Metrics collector failed",
+                collector=getattr(collector, "__name__", repr(collector)),
+                error=str(e),
+            )
+    return "\n".join(lines) + "\n"
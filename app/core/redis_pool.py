@@ -0,0 +1,300 @@
+"""
+Общий пул соединений Redis с автоматическим выключателем
+
+Кэш, шина инвалидации и rate limiter работают через одного клиента и один
+пул с ограниченным числом соединений и таймаутами из настроек. Клиент
+обернут в circuit breaker: после нескольких подряд ошибок соединения Redis
+на время cool-down не вызывается вовсе, команды сразу завершаются
+CircuitOpenError. Так медленный Redis не добавляет таймаут к каждому
+запросу. По истечении cool-down пропускается одна пробная команда: успех
+замыкает цепь, ошибка снова размыкает ее. Ожидание свободного соединения
+своего пула отказом Redis не считается.
+"""
+
+import asyncio
+import time
+from enum import Enum
+from typing import Callable, Iterable, List, Optional
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.core.metrics import metric_lines, register_collector
+
+logger = get_logger("neuro_store.redis")
+
+# Ошибки, говорящие о недоступности Redis (в отличие от ошибок команд)
+_FAILURES = (redis.ConnectionError, redis.TimeoutError, OSError, asyncio.TimeoutError)
+
+
+class CircuitState(str, Enum):
+    """Состояние выключателя"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(redis.ConnectionError):
+    """Redis временно обходится: цепь разомкнута"""
+
+
+class PoolExhaustedError(redis.ConnectionError):
+    """Все соединения пула заняты дольше REDIS_POOL_TIMEOUT_SECONDS"""
+
+
+class BoundedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Блокирующий пул, отличающий нехватку своих соединений от сбоя Redis
+
+    BlockingConnectionPool при таймауте ожидания соединения поднимает обычный
+    ConnectionError. Здесь он заменяется на PoolExhaustedError, чтобы всплеск
+    нагрузки на исправный Redis не размыкал выключатель.
+    """
+
+    async def get_connection(self, command_name, *keys, **options):
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            # Таймаут ожидания очереди пула, а не ошибка подключения к Redis
+            if isinstance(e.__context__, (asyncio.QueueEmpty, asyncio.TimeoutError)):
+                raise PoolExhaustedError(str(e)) from e.__context__
+            raise
+
+
+class CircuitBreaker:
+    """Выключатель по подряд идущим ошибкам соединения"""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        cooldown: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "CircuitBreaker":
+        return cls(
+            failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+            cooldown=settings.REDIS_BREAKER_COOLDOWN_SECONDS,
+        )
+
+    @property
+    def is_open(self) -> bool:
+        """Цепь разомкнута и cool-down еще не истек"""
+        return (
+            self.state == CircuitState.OPEN
+            and self.clock() < self._opened_at + self.cooldown
+        )
+
+    def before_call(self) -> None:
+        """Проверка перед командой; при разомкнутой цепи - CircuitOpenError"""
+        if self.state == CircuitState.CLOSED:
+            return
+
+        now = self.clock()
+        if self.state == CircuitState.OPEN:
+            if now < self._opened_at + self.cooldown:
+                self.rejected += 1
+                raise CircuitOpenError("Redis circuit is open")
+            self.state = CircuitState.HALF_OPEN
+            self._probe_started = now
+            logger.info("Redis circuit half-open, probing")
+            return
+
+        # Полуоткрытая цепь: одна проба за раз; зависшая проба не держит цепь вечно
+        if now < self._probe_started + self.cooldown:
+            self.rejected += 1
+            raise CircuitOpenError("Redis circuit is probing")
+        self._probe_started = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != CircuitState.CLOSED:
+            self.state = CircuitState.CLOSED
+            logger.info("Redis circuit closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.trip()
+
+    def trip(self) -> None:
+        """Размыкание цепи на cool-down"""
+        if self.state != CircuitState.OPEN:
+            self.opened += 1
+            logger.warning(
+                "Redis circuit opened",
+                failures=self.failures,
+                cooldown_seconds=self.cooldown,
+            )
+        self.state = CircuitState.OPEN
+        self._opened_at = self.clock()
+
+    def reset(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+
+
+class _Guarded:
+    """Выполнение обращения к Redis под контролем выключателя"""
+
+    breaker: CircuitBreaker
+
+    async def _guarded(self, call):
+        self.breaker.before_call()
+        try:
+            result = await call()
+        except (CircuitOpenError, PoolExhaustedError):
+            # До Redis дело не дошло: ни успех, ни отказ соединения
+            raise
+        except _FAILURES:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # Redis ответил ошибкой команды - соединение исправно
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+
+class BreakerPipeline(_Guarded, Pipeline):
+    """Pipeline, выполняемый под контролем выключателя"""
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.command_stack and not self.scripts:
+            return await super().execute(raise_on_error)
+        return await self._guarded(
+            lambda: super(BreakerPipeline, self).execute(raise_on_error)
+        )
+
+
+class BreakerRedis(_Guarded, redis.Redis):
+    """Клиент Redis с выключателем на каждой команде и pipeline"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await self._guarded(
+            lambda: super(BreakerRedis, self).execute_command(*args, **options)
+        )
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: Optional[str] = None
+    ) -> BreakerPipeline:
+        pipe = BreakerPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+        pipe.breaker = self.breaker
+        return pipe
+
+
+# Выключатель и клиент процесса
+redis_breaker = CircuitBreaker.from_settings()
+_client: Optional[BreakerRedis] = None
+
+
+def create_pool() -> BoundedConnectionPool:
+    """
+    Пул соединений из настроек
+
+    Блокирующий пул при исчерпании соединений ждет свободное не дольше
+    REDIS_POOL_TIMEOUT_SECONDS, а не открывает новые без ограничения.
+    """
+    return BoundedConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+    )
+
+
+def get_redis_client() -> BreakerRedis:
+    """Общий клиент Redis (создается при первом обращении)"""
+    global _client
+
+    if _client is None:
+        # Значения кэша хранятся в бинарном виде (см. cache_codec), поэтому без decode
+        _client = BreakerRedis(connection_pool=create_pool(), breaker=redis_breaker)
+        logger.info(
+            "Redis pool created",
+            redis_url=settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+    return _client
+
+
+async def close_redis_client() -> None:
+    """Закрытие общего клиента и всех соединений пула"""
+    global _client
+
+    if _client is None:
+        return
+    try:
+        await _client.close()
+        await _client.connection_pool.disconnect()
+        logger.info("Redis pool closed")
+    except Exception as e:
+        logger.error("Failed to close Redis pool", error=str(e))
+    finally:
+        _client = None
+        redis_breaker.reset()
+
+
+@register_collector
+def collect_redis_metrics() -> Iterable[str]:
+    """Состояние выключателя и занятость пула"""
+    states = [
+        ({"state": state.value}, int(redis_breaker.state == state))
+        for state in CircuitState
+    ]
+    lines: List[str] = metric_lines(
+        "neuro_store_redis_circuit_state",
+        "gauge",
+        "Current Redis circuit breaker state",
+        states,
+    )
+    lines += metric_lines(
+        "neuro_store_redis_circuit_opened_total",
+        "counter",
+        "Times the Redis circuit was opened",
+        [({}, redis_breaker.opened)],
+    )
+    lines += metric_lines(
+        "neuro_store_redis_circuit_rejected_total",
+        "counter",
+        "Redis calls bypassed while the circuit was open",
+        [({}, redis_breaker.rejected)],
+    )
+    if _client is not None:
+        pool = _client.connection_pool
+        lines += metric_lines(
+            "neuro_store_redis_pool_connections",
+            "gauge",
+            "Redis pool connections by state",
+            [
+                # В очереди блокирующего пула лежат свободные соединения и слоты
+                ({"state": "in_use"}, pool.max_connections - pool.pool.qsize()),
+                ({"state": "max"}, pool.max_connections),
+            ],
+        )
+    return lines
@@ -2,13 +2,31 @@
 Функции безопасности
 """
 
+import asyncio
+import contextlib
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Sequence
 
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.core.metrics import (
+    Histogram,
+    histogram_lines,
+    metric_lines,
+    register_collector,
+)
+
+logger = get_logger("neuro_store.security")
 
 # Контекст для хеширования паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -24,9 +42,218 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Создание JWT токена"""
+def _lower_priority(increment: int) -> None:
+    """Понижение приоритета процесса хеширования: CPU в первую очередь у API"""
+    if increment:
+        with contextlib.suppress(OSError):
+            os.nice(increment)
+
+
+class PasswordHashingBusyError(HTTPException):
+    """Очередь хеширования паролей заполнена: 503 с Retry-After"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис перегружен, повторите запрос позже",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+@dataclass
+class PasswordHasherStats:
+    """Счетчики сервиса хеширования"""
+
+    completed: int = 0
+    rejected: int = 0
+    failed: int = 0
+
+
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей в отдельном пуле процессов
+
+    bcrypt занимает десятки миллисекунд CPU. В цикле событий он остановил бы
+    все запросы воркера, а в общем пуле потоков конкурировал бы с
+    синхронными эндпоинтами за потоки anyio и за GIL. Поэтому он выполняется
+    в собственных процессах, а очередь к ним ограничена: при всплеске входов
+    лишние запросы сразу получают 503 с Retry-After, а не ждут минутами,
+    удерживая соединения и память.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        executor_factory: Optional[Callable[[], Executor]] = None,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor_factory = executor_factory or self._process_pool
+        self.in_flight = 0
+        self.stats = PasswordHasherStats()
+        self.latency: Dict[str, Histogram] = {
+            "hash": Histogram(),
+            "verify": Histogram(),
+        }
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_settings(cls) -> "PasswordHasher":
+        return cls(
+            workers=settings.PASSWORD_HASH_WORKERS,
+            queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+        )
+
+    def _process_pool(self) -> Executor:
+        # forkserver: процессы порождаются из чистого сервера с уже
+        # импортированным модулем и не наследуют потоки и блокировки воркера
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_lower_priority,
+            initargs=(settings.PASSWORD_HASH_NICE,),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """Сколько операций ждут свободный процесс"""
+        return max(self.in_flight - self.workers, 0)
+
+    def retry_after(self) -> int:
+        """Оценка, через сколько секунд очередь освободится"""
+        count = sum(histogram.count for histogram in self.latency.values())
+        total = sum(histogram.sum for histogram in self.latency.values())
+        per_operation = total / count if count else 0.25
+        return max(1, math.ceil((self.queue_depth + 1) * per_operation / self.workers))
+
+    async def _run(self, operation: str, func: Callable, *args):
+        if self.in_flight >= self.workers + self.queue_size:
+            self.stats.rejected += 1
+            logger.warning(
+                "Password hashing queue is full",
+                operation=operation,
+                in_flight=self.in_flight,
+            )
+            raise PasswordHashingBusyError(self.retry_after())
+
+        if self._executor is None:
+            self._executor = self.executor_factory()
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        except BrokenExecutor:
+            # Процесс пула упал: следующая операция создаст пул заново
+            self.stats.failed += 1
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+        self.latency[operation].observe(time.perf_counter() - started)
+        self.stats.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(
+            "verify", verify_password, plain_password, hashed_password
+        )
+
+    async def start(self) -> None:
+        """
+        Запуск процессов пула заранее (из lifespan)
+
+        Процессы порождаются при отправке задач; первая волна входов иначе
+        ждала бы их запуска прямо в цикле событий.
+        """
+        if self._executor is None:
+            self._executor = self.executor_factory()
+        await asyncio.get_running_loop().run_in_executor(None, self._warm_up)
+        logger.info("Password hasher started", workers=self.workers)
+
+    def _warm_up(self) -> None:
+        futures = [self._executor.submit(os.getpid) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        """Остановка пула (при завершении приложения)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Сервис процесса (пул создается при первом обращении)
+password_hasher = PasswordHasher.from_settings()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля в пуле хеширования, не блокируя цикл событий"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Хеширование пароля в пуле хеширования, не блокируя цикл событий"""
+    return await password_hasher.hash(password)
+
+
+@register_collector
+def collect_password_hasher_metrics() -> List[str]:
+    """Очередь и задержка хеширования паролей для /metrics"""
+    lines: List[str] = metric_lines(
+        "neuro_store_password_hash_queue_depth",
+        "gauge",
+        "Password hashing operations waiting for a worker process",
+        [({}, password_hasher.queue_depth)],
+    )
+    lines += metric_lines(
+        "neuro_store_password_hash_in_flight",
+        "gauge",
+        "Password hashing operations admitted and not finished",
+        [({}, password_hasher.in_flight)],
+    )
+    lines += metric_lines(
+        "neuro_store_password_hash_rejected_total",
+        "counter",
+        "Password hashing operations rejected because the queue was full",
+        [({}, password_hasher.stats.rejected)],
+    )
+    lines += histogram_lines(
+        "neuro_store_password_hash_seconds",
+        "Password hashing latency including queue wait",
+        [
+            ({"operation": name}, histogram)
+            for name, histogram in password_hasher.latency.items()
+        ],
+    )
+    return lines
+
+
+def create_access_token(
+    data: dict,
+    expires_delta: Optional[timedelta] = None,
+    roles: Optional[Sequence[str]] = None,
+    role_version: Optional[int] = None,
+):
+    """
+    Создание JWT токена
+
+    Роли и их версия (claims ``roles`` и ``rv``) позволяют проверять права
+    без запросов к БД; на каждом запросе версия сверяется с
+    ``users.role_version``, закэшированной в L1 и Redis.
+    """
     to_encode = data.copy()
+    if roles is not None:
+        to_encode["roles"] = list(roles)
+    if role_version is not None:
+        to_encode["rv"] = role_version
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
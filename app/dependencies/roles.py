@@ -5,40 +5,29 @@
 from typing import List
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
 
-from app.api.v1.auth import get_current_user_from_token
-from app.core.database import get_db
-from app.models.role import Role
-from app.models.user import User
-from app.models.user_role import UserRole
+from app.api.v1.auth import get_token_claims
+from app.services.principal import TokenClaims
 
 
 def get_current_user_roles(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_token_claims),
 ) -> List[str]:
     """Получение списка ролей текущего пользователя"""
-    user_roles = db.query(UserRole).filter(UserRole.user_id == current_user.id).all()
-    roles = []
-
-    for user_role in user_roles:
-        role = db.query(Role).filter(Role.id == user_role.role_id).first()
-        if role and role.is_active:
-            roles.append(role.name)
-
-    return roles
+    # Роли уже проверены get_token_claims: токен с claim rv, не совпавшим с
+    # users.role_version (копия в L1 и Redis), отклонен, а у токена без rv
+    # роли взяты из снимка пользователя
+    return list(current_user.roles)
 
 
 def require_role(required_role: str):
     """Декоратор для проверки конкретной роли"""
 
     def role_checker(
-        current_user: User = Depends(get_current_user_from_token),
-        db: Session = Depends(get_db),
-    ) -> User:
+        current_user: TokenClaims = Depends(get_token_claims),
+    ) -> TokenClaims:
         # Получаем роли пользователя
-        user_roles = get_current_user_roles(current_user, db)
+        user_roles = get_current_user_roles(current_user)
 
         if required_role not in user_roles:
             raise HTTPException(
@@ -52,11 +41,10 @@ def require_role(required_role: str):
 
 
 def require_admin(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
-) -> User:
+    current_user: TokenClaims = Depends(get_token_claims),
+) -> TokenClaims:
     """Проверка роли администратора"""
-    user_roles = get_current_user_roles(current_user, db)
+    user_roles = get_current_user_roles(current_user)
 
     if "admin" not in user_roles:
         raise HTTPException(
@@ -68,11 +56,10 @@ def require_admin(
 
 
 def require_moderator_or_admin(
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
-) -> User:
+    current_user: TokenClaims = Depends(get_token_claims),
+) -> TokenClaims:
     """Проверка роли модератора или администратора"""
-    user_roles = get_current_user_roles(current_user, db)
+    user_roles = get_current_user_roles(current_user)
 
     if not any(role in user_roles for role in ["admin", "moderator"]):
         raise HTTPException(
@@ -85,11 +72,10 @@ def require_moderator_or_admin(
 
 def check_user_permissions(
     resource_user_id: int,
-    current_user: User = Depends(get_current_user_from_token),
-    db: Session = Depends(get_db),
-) -> User:
+    current_user: TokenClaims = Depends(get_token_claims),
+) -> TokenClaims:
     """Проверка, что пользователь может работать с ресурсом (свой ресурс или админ)"""
-    user_roles = get_current_user_roles(current_user, db)
+    user_roles = get_current_user_roles(current_user)
 
     # Админ может работать с любыми ресурсами
     if "admin" in user_roles:
@@ -6,13 +6,16 @@ import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from jose import JWTError
 from sqlalchemy.exc import IntegrityError, OperationalError
 
 from app.api import api_router
 from app.core.config import settings
+from app.core.database import SessionLocal
 from app.core.exceptions import (
     NeuroStoreException,
     generic_exception_handler,
@@ -22,9 +25,27 @@ from app.core.exceptions import (
     operational_exception_handler,
     validation_exception_handler,
 )
-from app.core.limiter import close_limiter, init_limiter
+from app.core.limiter import (
+    RateLimitMiddleware,
+    RateLimitRule,
+    close_limiter,
+    init_limiter,
+)
 from app.core.logging_config import configure_logging, get_logger, log_request
-from app.services.cache import close_cache, init_cache
+from app.core.metrics import render_metrics
+from app.core.redis_pool import close_redis_client, redis_breaker
+from app.core.security import password_hasher
+from app.services.cache import (
+    CATALOG_NAMESPACE,
+    close_cache,
+    get_cache_stats,
+    get_redis,
+    init_cache,
+)
+from app.services.cache_bus import invalidation_bus
+from app.services.cache_warmup import warm_cache
+from app.services.reference_data import reference_data
+from app.services.response_cache import ResponseCacheMiddleware, ResponseCacheRule
 
 # Настройка логирования
 configure_logging()
@@ -45,11 +66,26 @@ async def lifespan(app: FastAPI):
         # Инициализация Redis для кэширования
         await init_cache()
 
+        # Подписка на инвалидации L1 кэша от других воркеров
+        await invalidation_bus.start(await get_redis())
+
         # Инициализация rate limiter
         await init_limiter()
 
+        # Справочники в памяти воркера и проверка их версии
+        if settings.REFERENCE_DATA_PRELOAD:
+            await run_in_threadpool(reference_data.preload, SessionLocal)
+        await reference_data.start()
+
+        # Процессы хеширования паролей запускаются до первого входа
+        await password_hasher.start()
+
         logger.info("✅ Все сервисы инициализированы успешно")
 
+        # Прогрев кэша каталога (ограничен по времени, ошибки не роняют старт)
+        if settings.CACHE_WARMUP_ENABLED:
+            await warm_cache()
+
     except Exception as e:
         logger.error("❌ Ошибка инициализации сервисов", error=str(e))
         raise
@@ -60,8 +96,12 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 Остановка Neuro Store API")
 
     try:
+        await reference_data.stop()
+        await invalidation_bus.stop()
         await close_cache()
         await close_limiter()
+        await close_redis_client()
+        password_hasher.shutdown()
         logger.info("✅ Все сервисы остановлены корректно")
     except Exception as e:
         logger.error("❌ Ошибка при остановке сервисов", error=str(e))
@@ -108,6 +148,72 @@ def create_application() -> FastAPI:
         ],
     )
 
+    # Кэш готовых ответов каталога и личного кабинета: попадание не доходит
+    # до эндпоинта (и до запроса пользователя в БД)
+    api_path = settings.API_V1_STR
+    products_path = f"{api_path}/products"
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        rules=[
+            ResponseCacheRule(
+                f"{products_path}/",
+                settings.CACHE_TTL_PRODUCTS,
+                namespace=CATALOG_NAMESPACE,
+            ),
+            ResponseCacheRule(
+                f"{products_path}/plans",
+                settings.CACHE_TTL_PLANS,
+                namespace=CATALOG_NAMESPACE,
+                tags=["plans", "plans:batch"],
+            ),
+            ResponseCacheRule(
+                f"{products_path}/{{product_id}}",
+                settings.CACHE_TTL_PRODUCTS,
+                namespace=CATALOG_NAMESPACE,
+                tags=["product:{product_id}"],
+            ),
+            ResponseCacheRule(
+                f"{products_path}/{{product_id}}/plans",
+                settings.CACHE_TTL_PLANS,
+                namespace=CATALOG_NAMESPACE,
+                tags=["plans", "product:{product_id}"],
+            ),
+            ResponseCacheRule(
+                f"{api_path}/auth/me",
+                settings.CACHE_TTL_USER,
+                private=True,
+                tags=["user:{uid}"],
+            ),
+            ResponseCacheRule(
+                f"{api_path}/subscriptions/",
+                settings.CACHE_TTL_USER,
+                private=True,
+                tags=["user:{uid}"],
+            ),
+            ResponseCacheRule(
+                f"{api_path}/balance",
+                settings.CACHE_TTL_USER,
+                private=True,
+                tags=["user:{uid}"],
+            ),
+        ],
+    )
+
+    # Rate limiting по таблице маршрутов: снаружи кэша ответов, чтобы лимит
+    # действовал и на попадания в кэш. Первое подходящее правило выигрывает
+    auth_path = f"{api_path}/auth"
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(f"{auth_path}/login", "login", methods=("POST",)),
+            RateLimitRule(f"{auth_path}/login-json", "login", methods=("POST",)),
+            RateLimitRule(f"{auth_path}/register", "register", methods=("POST",)),
+            RateLimitRule(products_path, "products", prefix=True),
+            RateLimitRule(f"{api_path}/subscriptions", "subscriptions", prefix=True),
+            RateLimitRule(api_path, "default", prefix=True),
+        ],
+    )
+
     # Middleware для логирования запросов
     @app.middleware("http")
     async def log_requests(request: Request, call_next):
@@ -200,11 +306,25 @@ async def health_check():
             health_status["redis"] = "not_initialized"
     except Exception:
         health_status["redis"] = "disconnected"
+    health_status["redis_circuit"] = redis_breaker.state.value
 
-    return health_status
+    health_status["cache"] = get_cache_stats()
 
+    return health_status
 
 
+@app.get(
+    "/metrics",
+    summary="Метрики",
+    description="Метрики приложения в текстовом формате Prometheus",
+    tags=["Мониторинг"],
+    response_class=PlainTextResponse,
+)
+async def metrics():
+    """Метрики для Prometheus"""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
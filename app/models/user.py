@@ -29,6 +29,13 @@ class User(Base):
     balance = Column(Numeric(12, 2), default=0.00, comment="Баланс пользователя")
     is_active = Column(Boolean, default=True, comment="Активен ли пользователь")
     is_verified = Column(Boolean, default=False, comment="Подтвержден ли email")
+    role_version = Column(
+        Integer,
+        nullable=False,
+        default=1,
+        server_default="1",
+        comment="Версия ролей (claim rv в access-токенах)",
+    )
     created_at = Column(
         DateTime(timezone=True), server_default=func.now(), comment="Дата регистрации"
     )
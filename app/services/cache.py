@@ -2,20 +2,117 @@
 Сервис кэширования для Neuro Store API
 """
 
+import asyncio
+import contextlib
 import functools
-import json
-from typing import Callable, Optional
+import inspect
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import (
+    Annotated,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+    get_args,
+    get_origin,
+)
 
 import redis.asyncio as redis
+from fastapi import BackgroundTasks, HTTPException, Response, params, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import SecurityScopes
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
 
 from app.core.config import settings
 from app.core.logging_config import get_logger
+from app.core.metrics import histogram_lines, metric_lines, register_collector
+from app.core.redis_pool import get_redis_client, redis_breaker
+from app.services.cache_bus import invalidation_bus
+from app.services.cache_codec import CodecError, codec
+from app.services.cache_metrics import cache_metrics
+from app.services.local_cache import l1_ttl_for, local_cache
 
 logger = get_logger("neuro_store.cache")
 
 # Глобальная переменная для Redis клиента
 redis_client: Optional[redis.Redis] = None
 
+# Префикс индексов тегов: ZSET ключей кэша со временем их истечения
+TAG_KEY_PREFIX = "cache:tag:"
+
+# Запас к времени истечения при чистке индекса: часы воркеров могут расходиться,
+# а живой ключ, выпавший из индекса, пережил бы инвалидацию тега
+TAG_PRUNE_GRACE_SECONDS = 60
+
+# Префикс счетчиков поколений пространств имен
+NAMESPACE_KEY_PREFIX = "cache:ns:"
+
+# Пространство имен всех кэшируемых данных каталога
+CATALOG_NAMESPACE = "catalog"
+
+# Удаление всех еще живых ключей тегов и самих индексов за один вызов
+_INVALIDATE_TAGS_LUA = """
+local unpack = unpack or table.unpack
+local deleted = 0
+for _, tag_key in ipairs(KEYS) do
+    local members = redis.call('ZRANGEBYSCORE', tag_key, ARGV[1], '+inf')
+    for i = 1, #members, 1000 do
+        local last = math.min(i + 999, #members)
+        deleted = deleted + redis.call('UNLINK', unpack(members, i, last))
+    end
+    redis.call('DEL', tag_key)
+end
+return deleted
+"""
+
+# Префикс коротких блокировок на пересчет ключа между процессами
+LOCK_KEY_PREFIX = "cache:lock:"
+
+# Снятие блокировки только ее владельцем
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Маркер отсутствия значения (None - допустимый результат функции)
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    """Счетчики декоратора @cache"""
+
+    hits: int = 0
+    l1_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    stale_hits: int = 0
+    negative_hits: int = 0
+    refreshes: int = 0
+
+
+cache_stats = CacheStats()
+
+# Вычисления, выполняющиеся в этом процессе прямо сейчас: ключ -> Future
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Ссылки на фоновые обновления, чтобы задачи не собрал сборщик мусора
+_background_tasks: set = set()
+
 
 async def get_redis() -> redis.Redis:
     """Получение Redis клиента для dependency injection"""
@@ -29,9 +126,8 @@ async def init_cache() -> None:
     global redis_client
 
     try:
-        redis_client = redis.from_url(
-            settings.REDIS_URL, encoding="utf-8", decode_responses=True
-        )
+        # Общий с rate limiter пул соединений с circuit breaker
+        redis_client = get_redis_client()
 
         # Проверяем подключение
         await redis_client.ping()
@@ -47,81 +143,351 @@ async def init_cache() -> None:
 
 
 async def close_cache() -> None:
-    """Закрытие подключения к Redis"""
+    """Отключение кэша от Redis (пул закрывается close_redis_client)"""
     global redis_client
 
     if redis_client:
-        try:
-            await redis_client.close()
-            logger.info("Cache service closed successfully")
-        except Exception as e:
-            logger.error("Failed to close cache service", error=str(e))
-        finally:
-            redis_client = None
+        redis_client = None
+        logger.info("Cache service closed successfully")
 
 
-async def get_cache(key: str) -> Optional[str]:
+def redis_available() -> bool:
+    """
+    Можно ли обращаться к Redis
+
+    Пока цепь выключателя разомкнута, кэш обходит Redis сразу: без ожидания
+    таймаута и без записи ошибки в лог на каждый запрос.
+    """
+    return redis_client is not None and not redis_breaker.is_open
+
+
+async def get_cache(key: str) -> Optional[bytes]:
     """Получение значения из кэша"""
-    if not redis_client:
+    if not redis_available():
         return None
 
+    started = time.perf_counter()
     try:
         value = await redis_client.get(key)
-        if value:
-            logger.debug("Cache hit", key=key)
-            return value
-        else:
-            logger.debug("Cache miss", key=key)
-            return None
     except Exception as e:
+        cache_metrics.record_error(key)
         logger.error("Cache get error", key=key, error=str(e))
         return None
+    finally:
+        cache_metrics.observe(key, "get", time.perf_counter() - started)
+
+    if value:
+        cache_metrics.record_hit(key)
+        logger.debug("Cache hit", key=key)
+        return value
+    else:
+        cache_metrics.record_miss(key)
+        logger.debug("Cache miss", key=key)
+        return None
 
 
-async def set_cache(key: str, value: str, ttl: int = None) -> bool:
-    """Сохранение значения в кэш"""
-    if not redis_client:
+def tag_key(tag: str) -> str:
+    """Ключ Redis с индексом ключей кэша, помеченных тегом"""
+    return f"{TAG_KEY_PREFIX}{tag}"
+
+
+async def set_cache(
+    key: str, value: Union[bytes, str], ttl: int = None, tags: Sequence[str] = ()
+) -> bool:
+    """
+    Сохранение значения в кэш
+
+    Если переданы теги, ключ добавляется в индекс каждого тега в том же
+    pipeline. Индекс тега живет не меньше самого долгоживущего ключа.
+    """
+    if not redis_available():
         return False
 
+    started = time.perf_counter()
     try:
-        if ttl:
-            await redis_client.setex(key, ttl, value)
-        else:
-            await redis_client.set(key, value)
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_set(pipe, key, value, ttl, tags)
+        await pipe.execute()
 
-        logger.debug("Cache set", key=key, ttl=ttl)
+        cache_metrics.record_set(key, len(value))
+        logger.debug("Cache set", key=key, ttl=ttl, tags=list(tags) or None)
         return True
     except Exception as e:
+        cache_metrics.record_error(key)
         logger.error("Cache set error", key=key, error=str(e))
         return False
+    finally:
+        cache_metrics.observe(key, "set", time.perf_counter() - started)
 
 
-async def delete_cache(key: str) -> bool:
-    """Удаление значения из кэша"""
-    if not redis_client:
+def _queue_set(
+    pipe: redis.client.Pipeline,
+    key: str,
+    value: Union[bytes, str],
+    ttl: Optional[int],
+    tags: Sequence[str],
+) -> None:
+    """
+    Команды записи ключа и его тегов в pipeline
+
+    Ключ попадает в индекс тега с временем своего истечения, а истекшие
+    ключи из индекса тут же удаляются. Иначе индекс часто обновляемого тега
+    (например, plans или user:{id}) не истекал бы никогда и рос бы вечно.
+    """
+    if ttl:
+        pipe.setex(key, ttl, value)
+    else:
+        pipe.set(key, value)
+
+    now = time.time()
+    expires_at = now + ttl if ttl else float("inf")
+    for tag in tags:
+        pipe.zadd(tag_key(tag), {key: expires_at})
+        pipe.zremrangebyscore(tag_key(tag), "-inf", now - TAG_PRUNE_GRACE_SECONDS)
+        if ttl:
+            pipe.expire(tag_key(tag), ttl, nx=True)
+            pipe.expire(tag_key(tag), ttl, gt=True)
+        else:
+            pipe.persist(tag_key(tag))
+
+
+async def get_many(keys: Sequence[str]) -> Dict[str, bytes]:
+    """Получение нескольких значений одним MGET: {ключ: значение} для найденных"""
+    if not redis_available() or not keys:
+        return {}
+
+    started = time.perf_counter()
+    try:
+        values = await redis_client.mget(keys)
+    except Exception as e:
+        for key in keys:
+            cache_metrics.record_error(key)
+        logger.error("Cache mget error", keys_count=len(keys), error=str(e))
+        return {}
+    finally:
+        cache_metrics.observe(keys[0], "mget", time.perf_counter() - started)
+
+    found = {}
+    for key, value in zip(keys, values):
+        if value:
+            cache_metrics.record_hit(key)
+            found[key] = value
+        else:
+            cache_metrics.record_miss(key)
+
+    logger.debug("Cache mget", requested=len(keys), found=len(found))
+    return found
+
+
+async def set_many(
+    items: Mapping[str, Union[bytes, str]],
+    ttl: int = None,
+    tags: Mapping[str, Sequence[str]] = None,
+) -> bool:
+    """
+    Сохранение нескольких значений одним pipeline
+
+    Args:
+        items: {ключ: значение}
+        ttl: Время жизни в секундах
+        tags: Теги отдельных ключей, {ключ: [теги]}
+    """
+    if not redis_available() or not items:
         return False
 
+    tags = tags or {}
+    first_key = next(iter(items))
+    started = time.perf_counter()
     try:
-        result = await redis_client.delete(key)
-        logger.debug("Cache delete", key=key, deleted=bool(result))
-        return bool(result)
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value in items.items():
+            _queue_set(pipe, key, value, ttl, tags.get(key, ()))
+        await pipe.execute()
     except Exception as e:
-        logger.error("Cache delete error", key=key, error=str(e))
+        for key in items:
+            cache_metrics.record_error(key)
+        logger.error("Cache mset error", keys_count=len(items), error=str(e))
+        return False
+    finally:
+        cache_metrics.observe(first_key, "mset", time.perf_counter() - started)
+
+    for key, value in items.items():
+        cache_metrics.record_set(key, len(value))
+    logger.debug("Cache mset", keys_count=len(items), ttl=ttl)
+    return True
+
+
+async def _drop_local(
+    keys: Sequence[str] = (),
+    tags: Sequence[str] = (),
+    patterns: Sequence[str] = (),
+) -> None:
+    """
+    Сброс L1 в этом и остальных воркерах
+
+    Вызывается после удаления из Redis: иначе промах в L1 в этом окне
+    перечитал бы из Redis старое значение и держал его весь L1 TTL.
+    """
+    for key in keys:
+        local_cache.delete(key)
+    if tags:
+        local_cache.invalidate_tags(tags)
+    for pattern in patterns:
+        local_cache.delete_matching(pattern)
+    if redis_available():
+        await invalidation_bus.publish(keys=keys, tags=tags, patterns=patterns)
+
+
+async def delete_many(keys: Sequence[str]) -> int:
+    """Удаление нескольких ключей пачками UNLINK, возвращает число удаленных"""
+    if not keys:
+        return 0
+    if not redis_available():
+        await _drop_local(keys=keys)
+        return 0
+
+    chunk_size = settings.CACHE_UNLINK_CHUNK_SIZE
+    deleted = 0
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for i in range(0, len(keys), chunk_size):
+            pipe.unlink(*keys[i : i + chunk_size])
+        deleted = sum(await pipe.execute())
+        logger.debug("Cache delete many", requested=len(keys), deleted=deleted)
+    except Exception as e:
+        logger.error("Cache delete many error", keys_count=len(keys), error=str(e))
+
+    await _drop_local(keys=keys)
+    return deleted
+
+
+class CacheUnavailableError(Exception):
+    """Redis не выполнил операцию, без которой нельзя продолжать"""
+
+
+async def delete_cache(key: str, required: bool = False) -> bool:
+    """
+    Удаление значения из кэша
+
+    С required=True ошибка Redis или разомкнутая цепь выключателя поднимаются
+    как CacheUnavailableError: вызывающий не должен продолжать, пока в Redis
+    может остаться старое значение. Без подключенного кэша удалять нечего.
+    """
+    if not redis_available():
+        await _drop_local(keys=[key])
+        if required and redis_client is not None:
+            raise CacheUnavailableError("Redis circuit breaker is open")
         return False
 
+    result = False
+    try:
+        result = bool(await redis_client.delete(key))
+        logger.debug("Cache delete", key=key, deleted=result)
+    except Exception as e:
+        logger.error("Cache delete error", key=key, error=str(e))
+        if required:
+            await _drop_local(keys=[key])
+            raise CacheUnavailableError(str(e)) from e
+
+    await _drop_local(keys=[key])
+    return result
+
+
+@dataclass
+class InvalidationReport:
+    """Итог инкрементальной инвалидации ключей по паттерну"""
+
+    pattern: str
+    matched: int = 0
+    deleted: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+
+ProgressCallback = Callable[[InvalidationReport], Union[Awaitable[None], None]]
+
+
+async def scan_delete_pattern(
+    pattern: str,
+    batch_size: int = None,
+    progress: Optional[ProgressCallback] = None,
+) -> InvalidationReport:
+    """
+    Инкрементальное удаление ключей по паттерну через SCAN + UNLINK
+
+    В отличие от KEYS, каждый вызов SCAN обрабатывает ограниченную порцию
+    keyspace, поэтому Redis не блокируется на время обхода. Найденные ключи
+    удаляются командой UNLINK (освобождение памяти в фоне) пачками в pipeline.
+
+    Args:
+        pattern: Glob-паттерн ключей
+        batch_size: Подсказка COUNT для SCAN (по умолчанию из настроек)
+        progress: Колбэк, вызываемый после каждой пачки
+
+    Returns:
+        InvalidationReport: Статистика обхода
+    """
+    report = InvalidationReport(pattern=pattern)
+    if not redis_available():
+        await _drop_local(patterns=[pattern])
+        return report
+
+    batch_size = batch_size or settings.CACHE_SCAN_BATCH_SIZE
+    chunk_size = settings.CACHE_UNLINK_CHUNK_SIZE
+    started = time.perf_counter()
+    cursor = 0
+
+    try:
+        while True:
+            cursor, keys = await redis_client.scan(
+                cursor=cursor, match=pattern, count=batch_size
+            )
+
+            if keys:
+                pipe = redis_client.pipeline(transaction=False)
+                for i in range(0, len(keys), chunk_size):
+                    pipe.unlink(*keys[i : i + chunk_size])
+                results = await pipe.execute()
+
+                report.matched += len(keys)
+                report.deleted += sum(results)
+
+            report.batches += 1
+            report.elapsed = time.perf_counter() - started
+
+            if progress is not None:
+                outcome = progress(report)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+
+            if cursor == 0:
+                break
+
+            # Отдаем управление event loop между пачками
+            await asyncio.sleep(settings.CACHE_SCAN_PAUSE_MS / 1000)
+    finally:
+        # L1 сбрасывается после обхода (в том числе прерванного ошибкой):
+        # до его конца промах в L1 вернул бы еще не удаленное значение
+        await _drop_local(patterns=[pattern])
+
+    return report
+
 
 async def delete_cache_pattern(pattern: str) -> int:
     """Удаление всех ключей по паттерну"""
-    if not redis_client:
+    if not redis_available():
         return 0
 
     try:
-        keys = await redis_client.keys(pattern)
-        if keys:
-            result = await redis_client.delete(*keys)
-            logger.info("Cache pattern delete", pattern=pattern, deleted_count=result)
-            return result
-        return 0
+        report = await scan_delete_pattern(pattern)
+        logger.info(
+            "Cache pattern delete",
+            pattern=pattern,
+            deleted_count=report.deleted,
+            batches=report.batches,
+            elapsed_ms=round(report.elapsed * 1000, 2),
+        )
+        return report.deleted
     except Exception as e:
         logger.error("Cache pattern delete error", pattern=pattern, error=str(e))
         return 0
@@ -143,40 +509,739 @@ def generate_cache_key(prefix: str, *args, **kwargs) -> str:
     return ":".join(key_parts)
 
 
-def cache(ttl: int = None, key_prefix: str = None):
-    """Декоратор для кэширования результатов функций"""
+# Параметры этих типов FastAPI подставляет сам, в ключ кэша они не входят
+_INJECTED_TYPES = (HTTPConnection, Response, BackgroundTasks, SecurityScopes, Session)
+
+
+def _is_injected(param: inspect.Parameter) -> bool:
+    """Параметр - зависимость FastAPI (Depends, Request, сессия БД и т.п.)"""
+    if isinstance(param.default, params.Depends):
+        return True
+
+    annotation = param.annotation
+    if get_origin(annotation) is Annotated:
+        annotation, *metadata = get_args(annotation)
+        if any(isinstance(item, params.Depends) for item in metadata):
+            return True
+
+    return inspect.isclass(annotation) and issubclass(annotation, _INJECTED_TYPES)
+
+
+def _normalize_key_value(value: Any) -> Any:
+    """Приведение значения параметра к стабильному виду для ключа"""
+    if isinstance(value, params.Param):
+        # Функцию вызвали напрямую, и умолчание осталось объектом Query/Path
+        value = value.default
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return ",".join(sorted(str(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    return value
+
+
+def key_arguments(
+    signature: inspect.Signature, names: Sequence[str], args: tuple, kwargs: dict
+) -> Dict[str, Any]:
+    """
+    Аргументы вызова, из которых строится ключ кэша
+
+    Позиционные аргументы приводятся к именованным, пропущенные заполняются
+    умолчаниями, поэтому ``/products/`` и ``/products/?skip=0`` дают один ключ.
+    """
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    return {
+        name: _normalize_key_value(bound.arguments[name])
+        for name in names
+        if name in bound.arguments
+    }
+
+
+def render_tags(
+    tags: Sequence[str], func: Callable, args: tuple, kwargs: dict
+) -> list[str]:
+    """Подстановка аргументов вызова в шаблоны тегов, например 'product:{product_id}'"""
+    if not tags:
+        return []
+
+    bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    return [tag.format(**bound.arguments) for tag in tags]
+
+
+async def invalidate_tags(*tags: str) -> int:
+    """
+    Инвалидация всех ключей, помеченных тегами
+
+    Выполняется одним Lua-скриптом: стоимость пропорциональна числу
+    затронутых ключей, а не размеру keyspace.
+    """
+    if not tags:
+        return 0
+    if not redis_available():
+        await _drop_local(tags=tags)
+        return 0
+
+    deleted = 0
+    try:
+        script = redis_client.register_script(_INVALIDATE_TAGS_LUA)
+        deleted = await script(
+            keys=[tag_key(tag) for tag in tags],
+            args=[time.time() - TAG_PRUNE_GRACE_SECONDS],
+        )
+        logger.info("Cache tags invalidated", tags=list(tags), deleted_count=deleted)
+    except Exception as e:
+        logger.error("Cache tags invalidation error", tags=list(tags), error=str(e))
+
+    await _drop_local(tags=tags)
+    return deleted
+
+
+def namespace_key(namespace: str) -> str:
+    """Ключ Redis со счетчиком поколения пространства имен"""
+    return f"{NAMESPACE_KEY_PREFIX}{namespace}"
+
+
+def _initial_generation() -> int:
+    # Если счетчик вытеснен из Redis (allkeys-lru), новое поколение все равно
+    # должно быть больше прежних, иначе оживут давно осиротевшие ключи
+    return int(time.time() * 1_000_000)
+
+
+async def namespace_generation(namespace: str) -> int:
+    """
+    Текущее поколение пространства имен
+
+    Счетчик читается на каждом запросе к кэшу пространства, поэтому он
+    кэшируется в L1 на CACHE_NAMESPACE_L1_TTL_SECONDS. Увеличение счетчика
+    рассылается по шине, так что другие воркеры сбрасывают свою копию сразу.
+    """
+    key = namespace_key(namespace)
+    found, generation = local_cache.get(key)
+    if found:
+        return generation
+    if not redis_available():
+        return 0
+
+    try:
+        raw = await redis_client.get(key)
+        if raw is None:
+            await redis_client.set(key, _initial_generation(), nx=True)
+            raw = await redis_client.get(key)
+    except Exception as e:
+        cache_metrics.record_error(key)
+        logger.error("Cache namespace read error", namespace=namespace, error=str(e))
+        return 0
+
+    generation = int(raw or 0)
+    local_cache.set(
+        key, generation, len(str(generation)), settings.CACHE_NAMESPACE_L1_TTL_SECONDS
+    )
+    return generation
+
+
+async def bump_namespace(namespace: str) -> int:
+    """
+    Логическая инвалидация всего пространства имен одним INCR
+
+    Ключи прежнего поколения больше никто не читает; они уходят по TTL
+    или вытесняются LRU самого Redis.
+    """
+    key = namespace_key(namespace)
+    local_cache.delete(key)
+    if not redis_available():
+        return 0
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(key, _initial_generation(), nx=True)
+        pipe.incr(key)
+        _, generation = await pipe.execute()
+    except Exception as e:
+        cache_metrics.record_error(key)
+        logger.error("Cache namespace bump error", namespace=namespace, error=str(e))
+        return 0
+
+    await invalidation_bus.publish(keys=[key])
+    logger.info("Cache namespace bumped", namespace=namespace, generation=generation)
+    return generation
+
+
+async def _versioned_prefix(prefix: str, namespace: Optional[str]) -> str:
+    """Префикс ключа с поколением пространства имен, если оно задано"""
+    if not namespace:
+        return prefix
+    return f"{prefix}:v{await namespace_generation(namespace)}"
+
+
+@dataclass
+class _Tombstone:
+    """Закэшированный отрицательный ответ эндпоинта (например, 404)"""
+
+    status_code: int
+    detail: Any
+
+    def exception(self) -> HTTPException:
+        return HTTPException(status_code=self.status_code, detail=self.detail)
+
+
+def _pack_entry(value: Any, fresh_until: Optional[float] = None) -> bytes:
+    """Кодирование записи декоратора вместе с границей свежести"""
+    return codec.encode({"value": value, "fresh_until": fresh_until})
+
+
+def _pack_tombstone(error: HTTPException) -> bytes:
+    """Кодирование отрицательного ответа"""
+    return codec.encode(
+        {"error": {"status_code": error.status_code, "detail": error.detail}}
+    )
+
+
+def _unpack_entry(payload: Union[bytes, str]) -> tuple[Any, Optional[float]]:
+    """Разбор записи декоратора: (значение или _Tombstone, граница свежести)"""
+    entry = codec.decode(payload)
+    if "error" in entry:
+        return _Tombstone(**entry["error"]), None
+    return entry["value"], entry.get("fresh_until")
+
+
+def _resolve(value: Any) -> Any:
+    """Значение из кэша; для отрицательного ответа - исходное исключение"""
+    if isinstance(value, _Tombstone):
+        cache_stats.negative_hits += 1
+        raise value.exception()
+    return value
+
+
+def _jittered(ttl: int) -> int:
+    """TTL со случайной надбавкой, чтобы записи одного момента не истекали разом"""
+    return ttl + int(random.uniform(0, ttl * settings.CACHE_TTL_JITTER))
+
+
+async def _read_cached(cache_key: str) -> tuple[Any, Optional[float], int]:
+    """Чтение записи из Redis: (значение или _MISSING, граница свежести, размер)"""
+    cached_value = await get_cache(cache_key)
+    if not cached_value:
+        return _MISSING, None, 0
+
+    try:
+        value, fresh_until = _unpack_entry(cached_value)
+        return value, fresh_until, len(cached_value)
+    except (CodecError, KeyError, TypeError):
+        logger.warning("Invalid cache entry", key=cache_key)
+        return _MISSING, None, 0
+
+
+async def _acquire_lock(cache_key: str) -> Optional[str]:
+    """Попытка взять блокировку пересчета ключа, возвращает токен владельца"""
+    if not redis_available():
+        return None
+
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis_client.set(
+            f"{LOCK_KEY_PREFIX}{cache_key}",
+            token,
+            nx=True,
+            px=settings.CACHE_LOCK_TTL_MS,
+        )
+    except Exception as e:
+        logger.error("Cache lock error", key=cache_key, error=str(e))
+        return None
+
+    return token if acquired else None
+
+
+async def _release_lock(cache_key: str, token: str) -> None:
+    """Снятие блокировки, если она все еще наша"""
+    try:
+        script = redis_client.register_script(RELEASE_LOCK_LUA)
+        await script(keys=[f"{LOCK_KEY_PREFIX}{cache_key}"], args=[token])
+    except Exception as e:
+        logger.error("Cache unlock error", key=cache_key, error=str(e))
+
+
+async def _wait_for_value(cache_key: str) -> Any:
+    """Ожидание результата, который считает другой процесс"""
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.CACHE_LOCK_POLL_MS / 1000)
+        value, _, _ = await _read_cached(cache_key)
+        if value is not _MISSING:
+            return value
+    return _MISSING
+
+
+async def _load_with_lock(cache_key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Пересчет ключа не более чем одним процессом
+
+    Кто взял блокировку - считает. Остальные ждут появления значения в Redis
+    и только по истечении ожидания считают сами (например, если владелец упал).
+    """
+    token = await _acquire_lock(cache_key)
+    if token is None and redis_available():
+        value = await _wait_for_value(cache_key)
+        if value is not _MISSING:
+            cache_stats.coalesced += 1
+            return value
+
+    try:
+        return await compute()
+    finally:
+        if token is not None:
+            await _release_lock(cache_key, token)
+
+
+class _LeaderCancelled(Exception):
+    """Ведущий вызов отменен, не досчитав значение"""
+
+
+async def _single_flight(cache_key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Объединение одновременных промахов по ключу внутри процесса
+
+    Отмена ведущего вызова (например, клиент отключился) не отменяет
+    ожидающих: их запросы живы, поэтому они повторяют загрузку, и один из
+    них становится новым ведущим.
+    """
+    while (future := _inflight.get(cache_key)) is not None:
+        try:
+            result = await asyncio.shield(future)
+        except _LeaderCancelled:
+            continue
+        cache_stats.coalesced += 1
+        return result
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result = await load()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.set_exception(_LeaderCancelled())
+        else:
+            future.set_exception(e)
+        # Исключение получит ведущий вызов, ожидающих может не быть
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(cache_key, None)
+
+
+@contextlib.contextmanager
+def _detached_request_scope(kwargs: dict):
+    """
+    Аргументы вызова для фонового обновления
+
+    Сессия БД принадлежит запросу и закрывается вместе с ним, поэтому фоновая
+    задача получает собственную сессию на том же подключении.
+    """
+    sessions = []
+    detached = {}
+    for name, value in kwargs.items():
+        if isinstance(value, Session):
+            value = Session(bind=value.get_bind())
+            sessions.append(value)
+        detached[name] = value
+
+    try:
+        yield detached
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def _refresh_in_background(
+    cache_key: str, compute: Callable[[dict], Awaitable[Any]], kwargs: dict
+) -> None:
+    """Фоновое обновление устаревшей записи, не более одного на кластер"""
+    if cache_key in _inflight:
+        return
+
+    async def refresh():
+        token = await _acquire_lock(cache_key)
+        if token is None:
+            # Запись уже обновляет другой процесс
+            return
+
+        try:
+            with _detached_request_scope(kwargs) as detached:
+                await _single_flight(cache_key, lambda: compute(detached))
+            cache_stats.refreshes += 1
+        except Exception as e:
+            logger.warning(
+                "Background cache refresh failed", key=cache_key, error=str(e)
+            )
+        finally:
+            await _release_lock(cache_key, token)
+
+    task = asyncio.create_task(refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Счетчики кэша процесса для мониторинга"""
+    return {
+        **asdict(cache_stats),
+        "l1": {
+            **asdict(local_cache.stats),
+            "items": len(local_cache),
+            "bytes": local_cache.size_bytes,
+        },
+        "bus": asdict(invalidation_bus.stats),
+    }
+
+
+@register_collector
+def collect_cache_metrics() -> list[str]:
+    """Метрики кэша для /metrics"""
+    prefixes = sorted(cache_metrics.prefixes.items())
+    lines = []
+    for field_name, help_text in (
+        ("hits", "Redis cache hits"),
+        ("l1_hits", "In-process L1 cache hits"),
+        ("misses", "Redis cache misses"),
+        ("sets", "Cache writes"),
+        ("errors", "Redis errors on cache operations"),
+        ("bytes_written", "Bytes written to the cache"),
+    ):
+        lines += metric_lines(
+            f"neuro_store_cache_{field_name}_total",
+            "counter",
+            help_text,
+            (({"prefix": p}, getattr(m, field_name)) for p, m in prefixes),
+        )
+    lines += histogram_lines(
+        "neuro_store_cache_redis_latency_seconds",
+        "Redis round-trip time of cache operations",
+        (
+            ({"prefix": p, "operation": op}, histogram)
+            for p, m in prefixes
+            for op, histogram in sorted(m.latency.items())
+        ),
+    )
+    for field_name, value in asdict(cache_stats).items():
+        lines += metric_lines(
+            f"neuro_store_cache_decorator_{field_name}_total",
+            "counter",
+            f"@cache decorator {field_name.replace('_', ' ')}",
+            [({}, value)],
+        )
+    lines += metric_lines(
+        "neuro_store_cache_l1_items", "gauge", "L1 entries", [({}, len(local_cache))]
+    )
+    lines += metric_lines(
+        "neuro_store_cache_l1_bytes",
+        "gauge",
+        "L1 size in bytes",
+        [({}, local_cache.size_bytes)],
+    )
+    return lines
+
+
+def cache(
+    ttl: int = None,
+    key_prefix: str = None,
+    tags: Sequence[str] = (),
+    stale_ttl: int = 0,
+    response_model: Any = None,
+    negative_ttl: int = 0,
+    namespace: str = None,
+):
+    """
+    Декоратор для кэширования результатов функций
+
+    Одновременные промахи по одному ключу объединяются: внутри процесса
+    функцию выполняет один вызов, остальные ждут его результат, а между
+    процессами пересчет защищен короткой блокировкой в Redis.
+
+    С ``stale_ttl`` запись после истечения ``ttl`` (мягкий TTL) еще
+    ``stale_ttl`` секунд отдается сразу, а обновляется в фоне. TTL получает
+    случайную надбавку до ``CACHE_TTL_JITTER``, чтобы записи, созданные
+    одновременно, не истекали одновременно.
+
+    Ключ строится только из параметров запроса и пути: зависимости FastAPI
+    (``Depends``, ``Request``, сессия БД) в него не входят.
+
+    С ``negative_ttl`` ответ 404 тоже кэшируется (запись-надгробие с коротким
+    TTL), и повторные запросы несуществующих объектов не доходят до БД.
+    Синхронные функции выполняются в пуле потоков, как это делает FastAPI.
+
+    С ``namespace`` в ключ входит текущее поколение пространства имен, и
+    ``bump_namespace`` одним INCR инвалидирует все его записи.
+
+    Args:
+        ttl: Время жизни свежей записи в секундах
+        key_prefix: Префикс ключа (по умолчанию модуль и имя функции)
+        tags: Шаблоны тегов для точечной инвалидации, например
+            ``["catalog", "product:{product_id}"]``
+        stale_ttl: Сколько секунд после ``ttl`` можно отдавать устаревшую запись
+        response_model: Схема ответа эндпоинта; результат (например, объекты
+            ORM) кэшируется и возвращается сериализованным по ней
+        negative_ttl: Время жизни закэшированного ответа 404 в секундах
+        namespace: Пространство имен с поколением для массовой инвалидации
+    """
 
     def decorator(func: Callable) -> Callable:
+        prefix = key_prefix or f"{func.__module__}.{func.__name__}"
+        cache_ttl = ttl or settings.CACHE_TTL_SECONDS
+        l1_ttl = l1_ttl_for(prefix)
+        if l1_ttl:
+            l1_ttl = min(l1_ttl, cache_ttl)
+
+        signature = inspect.signature(func)
+        key_names = [
+            name
+            for name, param in signature.parameters.items()
+            if not _is_injected(param)
+        ]
+        adapter = TypeAdapter(response_model) if response_model is not None else None
+        is_async = inspect.iscoroutinefunction(func)
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # Генерируем ключ кэша
-            prefix = key_prefix or f"{func.__module__}.{func.__name__}"
-            cache_key = generate_cache_key(prefix, *args, **kwargs)
+            cache_key = generate_cache_key(
+                await _versioned_prefix(prefix, namespace),
+                **key_arguments(signature, key_names, args, kwargs),
+            )
+            rendered_tags = render_tags(tags, func, args, kwargs)
 
-            # Пытаемся получить из кэша
-            cached_value = await get_cache(cache_key)
-            if cached_value:
+            # Сначала L1 в памяти процесса
+            if l1_ttl:
+                found, value = local_cache.get(cache_key)
+                if found:
+                    cache_stats.hits += 1
+                    cache_stats.l1_hits += 1
+                    cache_metrics.record_l1_hit(cache_key)
+                    return value
+
+            async def compute(call_kwargs: dict):
+                cache_stats.misses += 1
+
+                # Выполняем функцию
                 try:
-                    return json.loads(cached_value)
-                except json.JSONDecodeError:
-                    logger.warning("Invalid JSON in cache", key=cache_key)
+                    if is_async:
+                        result = await func(*args, **call_kwargs)
+                    else:
+                        result = await run_in_threadpool(func, *args, **call_kwargs)
+                except HTTPException as e:
+                    if negative_ttl and e.status_code == status.HTTP_404_NOT_FOUND:
+                        await set_cache(
+                            cache_key,
+                            _pack_tombstone(e),
+                            negative_ttl,
+                            tags=rendered_tags,
+                        )
+                    raise
+
+                if adapter is not None and result is not None:
+                    # Пока сессия открыта, превращаем объекты ORM в данные ответа
+                    result = adapter.dump_python(
+                        adapter.validate_python(result, from_attributes=True),
+                        mode="json",
+                    )
+
+                # Сохраняем в кэш
+                if result is not None:
+                    try:
+                        fresh_ttl = _jittered(cache_ttl)
+                        fresh_until = time.time() + fresh_ttl if stale_ttl else None
+                        payload = _pack_entry(result, fresh_until)
+                        await set_cache(
+                            cache_key,
+                            payload,
+                            fresh_ttl + stale_ttl,
+                            tags=rendered_tags,
+                        )
+                        if l1_ttl:
+                            # В L1 кладем то же, что вернул бы Redis, а не объекты ORM
+                            value, _ = _unpack_entry(payload)
+                            local_cache.set(
+                                cache_key, value, len(payload), l1_ttl, rendered_tags
+                            )
+                    except (TypeError, ValueError, KeyError) as e:
+                        logger.warning(
+                            "Failed to cache result", key=cache_key, error=str(e)
+                        )
 
-            # Выполняем функцию
-            result = await func(*args, **kwargs)
+                return result
 
-            # Сохраняем в кэш
-            if result is not None:
+            # Пытаемся получить из кэша
+            value, fresh_until, size = await _read_cached(cache_key)
+            if value is not _MISSING:
+                cache_stats.hits += 1
+                if isinstance(value, _Tombstone):
+                    return _resolve(value)
+                if fresh_until is not None and time.time() > fresh_until:
+                    # Мягкий TTL истек: отдаем как есть, обновляем в фоне
+                    cache_stats.stale_hits += 1
+                    _refresh_in_background(cache_key, compute, kwargs)
+                elif l1_ttl:
+                    local_cache.set(cache_key, value, size, l1_ttl, rendered_tags)
+                return value
+
+            return _resolve(
+                await _single_flight(
+                    cache_key,
+                    lambda: _load_with_lock(cache_key, lambda: compute(kwargs)),
+                )
+            )
+
+        return wrapper
+
+    return decorator
+
+
+def cache_many(
+    ttl: int = None,
+    key_prefix: str = None,
+    id_param: str = "id",
+    tags: Sequence[str] = (),
+    stale_ttl: int = 0,
+    response_model: Any = None,
+    namespace: str = None,
+):
+    """
+    Декоратор для пакетных загрузчиков
+
+    Первый аргумент функции - список идентификаторов, результат - словарь
+    ``{id: значение}``. Кэш читается одним MGET; функция вызывается один раз
+    и только для отсутствующих идентификаторов, а найденное записывается
+    одним pipeline. Идентификаторы, которых нет в результате, не кэшируются.
+
+    Ключ элемента строится так же, как у ``@cache`` с параметром ``id_param``,
+    поэтому пакетный загрузчик и эндпоинт отдельного объекта делят записи.
+
+    Args:
+        ttl: Время жизни свежей записи в секундах
+        key_prefix: Префикс ключа (по умолчанию модуль и имя функции)
+        id_param: Имя параметра идентификатора в ключе и шаблонах тегов
+        tags: Шаблоны тегов элемента, например ``["product:{product_id}"]``
+        stale_ttl: Сколько секунд после ``ttl`` запись еще хранится в Redis
+        response_model: Схема одного значения для сериализации результата
+        namespace: Пространство имен с поколением для массовой инвалидации
+    """
+
+    def decorator(func: Callable) -> Callable:
+        prefix = key_prefix or f"{func.__module__}.{func.__name__}"
+        cache_ttl = ttl or settings.CACHE_TTL_SECONDS
+        l1_ttl = l1_ttl_for(prefix)
+        if l1_ttl:
+            l1_ttl = min(l1_ttl, cache_ttl)
+
+        signature = inspect.signature(func)
+        # Первый параметр - список идентификаторов, в общую часть ключа не входит
+        key_names = [
+            name
+            for name, param in list(signature.parameters.items())[1:]
+            if not _is_injected(param)
+        ]
+        adapter = TypeAdapter(response_model) if response_model is not None else None
+        is_async = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(ids: Iterable[Hashable], *args, **kwargs):
+            ids = list(dict.fromkeys(ids))
+            extra = key_arguments(signature, key_names, (ids, *args), kwargs)
+            versioned = await _versioned_prefix(prefix, namespace)
+            bound = signature.bind_partial(ids, *args, **kwargs)
+            bound.apply_defaults()
+
+            keys = {
+                item_id: generate_cache_key(versioned, **extra, **{id_param: item_id})
+                for item_id in ids
+            }
+
+            def item_tags(item_id) -> list[str]:
+                params = {**bound.arguments, id_param: item_id}
+                return [tag.format(**params) for tag in tags]
+
+            results: Dict[Hashable, Any] = {}
+
+            # L1, затем один MGET на все остальное
+            pending = []
+            for item_id in ids:
+                found, value = (
+                    local_cache.get(keys[item_id]) if l1_ttl else (False, None)
+                )
+                if found:
+                    cache_stats.hits += 1
+                    cache_stats.l1_hits += 1
+                    cache_metrics.record_l1_hit(keys[item_id])
+                    results[item_id] = value
+                else:
+                    pending.append(item_id)
+
+            cached = await get_many([keys[item_id] for item_id in pending])
+            missing = []
+            now = time.time()
+            for item_id in pending:
+                payload = cached.get(keys[item_id])
                 try:
-                    cache_ttl = ttl or settings.CACHE_TTL_SECONDS
-                    await set_cache(
-                        cache_key, json.dumps(result, default=str), cache_ttl
+                    value, fresh_until = (
+                        _unpack_entry(payload) if payload else (_MISSING, None)
                     )
-                except (TypeError, ValueError) as e:
-                    logger.warning(
-                        "Failed to cache result", key=cache_key, error=str(e)
+                except (CodecError, KeyError, TypeError):
+                    value, fresh_until = _MISSING, None
+
+                # Устаревшие записи загружаем заново вместе с отсутствующими
+                if (
+                    value is _MISSING
+                    or isinstance(value, _Tombstone)
+                    or (fresh_until is not None and now > fresh_until)
+                ):
+                    missing.append(item_id)
+                    continue
+
+                cache_stats.hits += 1
+                results[item_id] = value
+                if l1_ttl:
+                    local_cache.set(
+                        keys[item_id], value, len(payload), l1_ttl, item_tags(item_id)
                     )
 
-            return result
+            if missing:
+                cache_stats.misses += len(missing)
+                call_args = (missing, *args)
+                if is_async:
+                    loaded = await func(*call_args, **kwargs)
+                else:
+                    loaded = await run_in_threadpool(func, *call_args, **kwargs)
+
+                payloads = {}
+                payload_tags = {}
+                fresh_ttl = _jittered(cache_ttl)
+                fresh_until = time.time() + fresh_ttl if stale_ttl else None
+                for item_id in missing:
+                    value = (loaded or {}).get(item_id)
+                    if value is None:
+                        continue
+                    if adapter is not None:
+                        value = adapter.dump_python(
+                            adapter.validate_python(value, from_attributes=True),
+                            mode="json",
+                        )
+                    results[item_id] = value
+                    try:
+                        payloads[keys[item_id]] = _pack_entry(value, fresh_until)
+                    except (TypeError, ValueError) as e:
+                        logger.warning(
+                            "Failed to cache result", key=keys[item_id], error=str(e)
+                        )
+                        continue
+                    payload_tags[keys[item_id]] = item_tags(item_id)
+
+                await set_many(payloads, fresh_ttl + stale_ttl, tags=payload_tags)
+
+            return {item_id: results[item_id] for item_id in ids if item_id in results}
 
         return wrapper
 
@@ -187,35 +1252,21 @@ def cache(ttl: int = None, key_prefix: str = None):
 
 
 async def invalidate_products_cache() -> None:
-    """Инвалидация кэша продуктов"""
-    patterns = ["products:*", "product_plans:*", "*products*"]
-
-    total_deleted = 0
-    for pattern in patterns:
-        deleted = await delete_cache_pattern(pattern)
-        total_deleted += deleted
-
-    logger.info("Products cache invalidated", total_deleted=total_deleted)
+    """Инвалидация кэша каталога (списки, карточки, планы и надгробия 404)"""
+    generation = await bump_namespace(CATALOG_NAMESPACE)
+    logger.info("Products cache invalidated", generation=generation)
 
 
 async def invalidate_plans_cache(product_id: int = None) -> None:
     """Инвалидация кэша планов"""
-    if product_id:
-        pattern = f"*plans*{product_id}*"
-    else:
-        pattern = "*plans*"
+    tag = f"product:{product_id}" if product_id else "plans"
 
-    deleted = await delete_cache_pattern(pattern)
-    logger.info("Plans cache invalidated", pattern=pattern, deleted_count=deleted)
+    # Пакетные ответы по нескольким продуктам помечены общим тегом
+    deleted = await invalidate_tags(tag, "plans:batch")
+    logger.info("Plans cache invalidated", tag=tag, deleted_count=deleted)
 
 
 async def invalidate_user_cache(user_id: int) -> None:
     """Инвалидация кэша пользователя"""
-    patterns = [f"*user*{user_id}*", f"*subscriptions*{user_id}*"]
-
-    total_deleted = 0
-    for pattern in patterns:
-        deleted = await delete_cache_pattern(pattern)
-        total_deleted += deleted
-
-    logger.info("User cache invalidated", user_id=user_id, total_deleted=total_deleted)
+    deleted = await invalidate_tags(f"user:{user_id}")
+    logger.info("User cache invalidated", user_id=user_id, total_deleted=deleted)
@@ -0,0 +1,182 @@
+"""
+Шина инвалидации L1 кэша между воркерами через Redis pub/sub
+
+Каждый воркер держит собственный L1 кэш, поэтому инвалидация в одном
+процессе рассылается остальным. Сообщения нумеруются по источнику: пропуск
+номера означает потерянное сообщение, и воркер полностью очищает L1. Так же
+поступаем при каждом (пере)подключении подписки - все, что было опубликовано,
+пока подписка не работала, могло быть потеряно.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+import redis.asyncio as redis
+from redis.asyncio.client import PubSub
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.local_cache import LocalCache, local_cache
+
+logger = get_logger("neuro_store.cache_bus")
+
+
+@dataclass
+class BusStats:
+    """Счетчики шины инвалидации"""
+
+    published: int = 0
+    received: int = 0
+    gaps: int = 0
+    full_flushes: int = 0
+    reconnects: int = 0
+
+
+class _BusPubSub(PubSub):
+    """PubSub, сообщающий шине о каждом (пере)подключении соединения"""
+
+    def __init__(self, *args, bus: "InvalidationBus", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bus = bus
+
+    async def on_connect(self, connection) -> None:
+        # Драйвер переподключается молча, поэтому сбрасываем L1 здесь
+        self.bus.on_subscribed()
+        await super().on_connect(connection)
+
+
+class InvalidationBus:
+    """Публикация и прием инвалидаций L1 кэша"""
+
+    def __init__(self, local: LocalCache, channel: str):
+        self.local = local
+        self.channel = channel
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = BusStats()
+        self._redis: Optional[redis.Redis] = None
+        self._seq = 0
+        self._last_seen: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(
+        self,
+        keys: Sequence[str] = (),
+        tags: Sequence[str] = (),
+        patterns: Sequence[str] = (),
+        flush: bool = False,
+    ) -> None:
+        """Рассылка инвалидации остальным воркерам"""
+        if not self._redis:
+            return
+
+        self._seq += 1
+        message = {
+            "origin": self.origin,
+            "seq": self._seq,
+            "keys": list(keys),
+            "tags": list(tags),
+            "patterns": list(patterns),
+            "flush": flush,
+        }
+
+        try:
+            await self._redis.publish(self.channel, json.dumps(message))
+            self.stats.published += 1
+        except Exception as e:
+            # Остальные воркеры увидят пропуск номера и очистят L1 целиком
+            logger.error("Cache bus publish error", seq=self._seq, error=str(e))
+
+    def handle_message(self, raw: Any) -> None:
+        """Применение полученного сообщения к локальному L1"""
+        try:
+            message = json.loads(raw)
+            origin = message["origin"]
+            seq = int(message["seq"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Invalid cache bus message", error=str(e))
+            return
+
+        if origin == self.origin:
+            return
+
+        self.stats.received += 1
+        last = self._last_seen.get(origin)
+        self._last_seen[origin] = seq
+
+        if last is not None and seq != last + 1:
+            self.stats.gaps += 1
+            self.flush_local("sequence_gap", origin=origin, expected=last + 1, got=seq)
+            return
+
+        if message.get("flush"):
+            self.flush_local("remote_flush", origin=origin)
+            return
+
+        for key in message.get("keys", ()):
+            self.local.delete(key)
+        for pattern in message.get("patterns", ()):
+            self.local.delete_matching(pattern)
+        if message.get("tags"):
+            self.local.invalidate_tags(message["tags"])
+
+    def flush_local(self, reason: str, **details: Any) -> None:
+        """Полная очистка L1"""
+        self.local.clear()
+        self.stats.full_flushes += 1
+        logger.info("L1 cache flushed", reason=reason, **details)
+
+    async def start(self, redis_client: redis.Redis) -> None:
+        """Запуск фоновой подписки (вызывается из lifespan каждого воркера)"""
+        self._redis = redis_client
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Остановка подписки"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._redis = None
+
+    def on_subscribed(self) -> None:
+        """Новое соединение подписки: пропущенное за время разрыва не восстановить"""
+        self._last_seen.clear()
+        self.flush_local("subscribe", channel=self.channel)
+
+    async def _listen(self) -> None:
+        backoff = 0.1
+        while True:
+            pubsub = _BusPubSub(
+                self._redis.connection_pool, ignore_subscribe_messages=True, bus=self
+            )
+            try:
+                await pubsub.subscribe(self.channel)
+                backoff = 0.1
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        self.handle_message(message["data"])
+            except Exception as e:
+                self.stats.reconnects += 1
+                self.flush_local("disconnect", error=str(e))
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.close()
+
+
+# Шина текущего процесса
+invalidation_bus = InvalidationBus(local_cache, settings.CACHE_BUS_CHANNEL)
@@ -0,0 +1,169 @@
+"""
+Кодеки значений кэша Neuro Store
+
+Первый байт записи - заголовок. Старший бит отличает его от записей старого
+формата (JSON-текст всегда начинается с ASCII-символа), биты 4-6 задают
+алгоритм сжатия, биты 0-3 - сериализатор. Запись читается по собственному
+заголовку, а не по текущим настройкам, поэтому кодек можно сменить без
+очистки кэша: старые записи дочитываются, новые пишутся новым кодеком.
+"""
+
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Union
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - зависит от окружения
+    lz4_frame = None
+
+logger = get_logger("neuro_store.cache_codec")
+
+HEADER_FLAG = 0x80
+
+
+class CodecError(ValueError):
+    """Запись кэша не удалось декодировать"""
+
+
+@dataclass(frozen=True)
+class Serializer:
+    """Сериализатор значения в байты"""
+
+    id: int
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+@dataclass(frozen=True)
+class Compressor:
+    """Алгоритм сжатия сериализованного значения"""
+
+    id: int
+    name: str
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+
+# Идентификаторы записываются в Redis: менять их нельзя, только добавлять новые
+SERIALIZERS: Dict[int, Serializer] = {
+    0: Serializer(0, "json", _json_dumps, json.loads),
+}
+COMPRESSORS: Dict[int, Compressor] = {
+    0: Compressor(0, "none", bytes, bytes),
+    1: Compressor(1, "zlib", zlib.compress, zlib.decompress),
+}
+
+if orjson is not None:
+    SERIALIZERS[1] = Serializer(
+        1,
+        "orjson",
+        lambda value: orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads,
+    )
+
+if msgpack is not None:
+    SERIALIZERS[2] = Serializer(
+        2,
+        "msgpack",
+        lambda value: msgpack.packb(value, default=str, use_bin_type=True),
+        lambda payload: msgpack.unpackb(payload, raw=False),
+    )
+
+if lz4_frame is not None:
+    COMPRESSORS[2] = Compressor(2, "lz4", lz4_frame.compress, lz4_frame.decompress)
+
+
+def _by_name(registry: Dict[int, Any], name: str, fallback: int, kind: str) -> Any:
+    """Поиск кодека по имени из настроек; недоступный заменяется запасным"""
+    for item in registry.values():
+        if item.name == name:
+            return item
+
+    logger.warning(
+        "Cache codec is not available, using fallback",
+        kind=kind,
+        requested=name,
+        fallback=registry[fallback].name,
+    )
+    return registry[fallback]
+
+
+@dataclass
+class CacheCodec:
+    """Кодирование значений кэша с заголовком и сжатием больших записей"""
+
+    serializer: Serializer
+    compressor: Compressor
+    compress_threshold: int
+
+    @classmethod
+    def from_settings(cls) -> "CacheCodec":
+        return cls(
+            serializer=_by_name(
+                SERIALIZERS, settings.CACHE_SERIALIZER, 0, "serializer"
+            ),
+            compressor=_by_name(
+                COMPRESSORS, settings.CACHE_COMPRESSION, 0, "compression"
+            ),
+            compress_threshold=settings.CACHE_COMPRESS_THRESHOLD_BYTES,
+        )
+
+    def encode(self, value: Any) -> bytes:
+        """Сериализация значения с заголовком"""
+        body = self.serializer.dumps(value)
+        compressor = COMPRESSORS[0]
+
+        if self.compressor.id and len(body) >= self.compress_threshold:
+            compressed = self.compressor.compress(body)
+            # Несжимаемые данные храним как есть
+            if len(compressed) < len(body):
+                body = compressed
+                compressor = self.compressor
+
+        header = HEADER_FLAG | compressor.id << 4 | self.serializer.id
+        return bytes((header,)) + body
+
+    def decode(self, payload: Union[bytes, str]) -> Any:
+        """Разбор записи по ее заголовку"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if not payload:
+            raise CodecError("empty cache payload")
+
+        header = payload[0]
+        try:
+            if not header & HEADER_FLAG:
+                # Запись старого формата - JSON-текст без заголовка
+                return json.loads(payload)
+
+            serializer = SERIALIZERS[header & 0x0F]
+            compressor = COMPRESSORS[(header >> 4) & 0x07]
+            return serializer.loads(compressor.decompress(payload[1:]))
+        except KeyError as e:
+            raise CodecError(f"unknown cache codec in header {header:#04x}") from e
+        except Exception as e:
+            raise CodecError(str(e)) from e
+
+
+# Кодек текущего процесса
+codec = CacheCodec.from_settings()
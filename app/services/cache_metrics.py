@@ -0,0 +1,187 @@
+"""
+Метрики кэша по префиксам ключей и анализ памяти Redis
+
+Счетчики ведутся отдельно для каждого префикса (``products``,
+``product_plans``, ...), чтобы было видно, какой кэш реально помогает.
+Анализатор памяти берет случайную выборку ключей, спрашивает у Redis
+MEMORY USAGE и экстраполирует результат на весь keyspace.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from app.core.logging_config import get_logger
+from app.core.metrics import Histogram
+
+logger = get_logger("neuro_store.cache_metrics")
+
+
+def prefix_of(key: str) -> str:
+    """Префикс ключа для группировки метрик: 'products:skip=0' -> 'products'"""
+    parts = key.split(":", 2)
+    # Служебные ключи кэша (теги, блокировки) группируем по второму сегменту
+    if parts[0] == "cache" and len(parts) > 2:
+        return f"{parts[0]}:{parts[1]}"
+    return parts[0]
+
+
+@dataclass
+class PrefixMetrics:
+    """Счетчики одного префикса"""
+
+    hits: int = 0
+    l1_hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    errors: int = 0
+    bytes_written: int = 0
+    latency: Dict[str, Histogram] = field(
+        default_factory=lambda: defaultdict(Histogram)
+    )
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.l1_hits + self.misses
+        return (self.hits + self.l1_hits) / lookups if lookups else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "l1_hits": self.l1_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "sets": self.sets,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written,
+            "latency_seconds": {
+                op: histogram.snapshot() for op, histogram in self.latency.items()
+            },
+        }
+
+
+class CacheMetrics:
+    """Реестр метрик кэша процесса"""
+
+    def __init__(self):
+        self.prefixes: Dict[str, PrefixMetrics] = defaultdict(PrefixMetrics)
+
+    def record_hit(self, key: str) -> None:
+        self.prefixes[prefix_of(key)].hits += 1
+
+    def record_l1_hit(self, key: str) -> None:
+        self.prefixes[prefix_of(key)].l1_hits += 1
+
+    def record_miss(self, key: str) -> None:
+        self.prefixes[prefix_of(key)].misses += 1
+
+    def record_set(self, key: str, size: int) -> None:
+        metrics = self.prefixes[prefix_of(key)]
+        metrics.sets += 1
+        metrics.bytes_written += size
+
+    def record_error(self, key: str) -> None:
+        self.prefixes[prefix_of(key)].errors += 1
+
+    def observe(self, key: str, operation: str, seconds: float) -> None:
+        """Время round-trip к Redis для операции над ключом"""
+        self.prefixes[prefix_of(key)].latency[operation].observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            prefix: metrics.snapshot()
+            for prefix, metrics in sorted(self.prefixes.items())
+        }
+
+    def reset(self) -> None:
+        self.prefixes.clear()
+
+
+# Метрики текущего процесса
+cache_metrics = CacheMetrics()
+
+
+@dataclass
+class MemoryReport:
+    """Оценка памяти Redis по префиксам ключей"""
+
+    total_keys: int
+    sampled: int
+    unsupported: int
+    elapsed: float
+    prefixes: Dict[str, Dict[str, int]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+async def analyze_memory(
+    redis_client: redis.Redis, sample_size: int = 1000
+) -> MemoryReport:
+    """
+    Оценка памяти по префиксам на случайной выборке ключей
+
+    Выборка собирается RANDOMKEY (равномерно по keyspace, в отличие от первых
+    страниц SCAN), размер каждого ключа - MEMORY USAGE. Обе команды отправляются
+    пачками в pipeline, поэтому анализ стоит два round-trip на пачку.
+    """
+    started = time.perf_counter()
+    total_keys = await redis_client.dbsize()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for _ in range(min(sample_size, total_keys)):
+        pipe.randomkey()
+    keys = {key for key in await pipe.execute() if key is not None}
+
+    sizes: List[Any] = []
+    keys = sorted(keys)
+    if keys:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+        sizes = await pipe.execute(raise_on_error=False)
+
+    sampled: Dict[str, Dict[str, int]] = defaultdict(lambda: {"keys": 0, "bytes": 0})
+    unsupported = 0
+    for key, size in zip(keys, sizes):
+        if isinstance(size, ResponseError) or size is None:
+            # Ключ истек между командами или MEMORY недоступна (managed Redis)
+            unsupported += 1
+            continue
+        name = key.decode() if isinstance(key, bytes) else key
+        bucket = sampled[prefix_of(name)]
+        bucket["keys"] += 1
+        bucket["bytes"] += int(size)
+
+    measured = len(keys) - unsupported
+    scale = total_keys / measured if measured else 0.0
+    prefixes = {
+        prefix: {
+            "sampled_keys": bucket["keys"],
+            "sampled_bytes": bucket["bytes"],
+            "estimated_keys": round(bucket["keys"] * scale),
+            "estimated_bytes": round(bucket["bytes"] * scale),
+        }
+        for prefix, bucket in sorted(
+            sampled.items(), key=lambda item: item[1]["bytes"], reverse=True
+        )
+    }
+
+    report = MemoryReport(
+        total_keys=total_keys,
+        sampled=measured,
+        unsupported=unsupported,
+        elapsed=time.perf_counter() - started,
+        prefixes=prefixes,
+    )
+    logger.info(
+        "Cache memory analyzed",
+        total_keys=total_keys,
+        sampled=measured,
+        elapsed_ms=round(report.elapsed * 1000, 1),
+    )
+    return report
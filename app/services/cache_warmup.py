@@ -0,0 +1,188 @@
+"""
+Прогрев кэша каталога при старте приложения
+
+После деплоя все воркеры стартуют с пустым кэшем, и первые запросы каталога
+уходят в базу. Прогрев заранее вызывает кэшируемые эндпоинты каталога, чтобы
+записи появились в Redis под теми же ключами, что и у обычных запросов.
+
+Одновременно греет один воркер на кластер: кто первым взял блокировку в
+Redis, тот и греет, и по окончании снимает ее. Воркер, стартующий позже,
+прогревает снова, но его шаги уже попадают в кэш.
+
+Время прогрева ограничено бюджетом. Запросы к БД синхронные и выполняются в
+пуле потоков, поэтому event loop свободен и бюджет соблюдается: шаг, не
+уложившийся в остаток, старт больше не задерживает и дорабатывает в фоне,
+а оставшиеся шаги пропускаются.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.api.v1.products import get_product_plans, get_products
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging_config import get_logger
+from app.models.product import Product
+from app.services.cache import RELEASE_LOCK_LUA, get_redis
+from app.services.cache_bus import invalidation_bus
+
+logger = get_logger("neuro_store.cache_warmup")
+
+WARMUP_LOCK_KEY = "cache:lock:warmup"
+
+# Шаги, не уложившиеся в бюджет и дорабатывающие в фоне
+_abandoned: set = set()
+
+
+@dataclass
+class WarmupReport:
+    """Итог прогрева"""
+
+    status: str
+    warmed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+
+def _catalog_steps(db: Session) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    """Шаги прогрева: общий список, списки по категориям и планы продуктов"""
+    products = (
+        db.query(Product.id, Product.category)
+        .filter(Product.is_active)
+        .order_by(Product.id)
+        .all()
+    )
+    categories = sorted({category for _, category in products if category})
+
+    steps = [("products", lambda: get_products(db=db))]
+    steps += [
+        (f"products:{category}", lambda c=category: get_products(category=c, db=db))
+        for category in categories
+    ]
+    steps += [
+        (f"product_plans:{pid}", lambda p=pid: get_product_plans(product_id=p, db=db))
+        for pid, _ in products
+    ]
+    return steps
+
+
+async def _wait_within(task: asyncio.Task, timeout: float) -> bool:
+    """
+    Ожидание задачи не дольше timeout
+
+    Поток пула не прервать, а asyncio.wait_for после таймаута ждет отмены:
+    медленный запрос все равно задержал бы старт. Поэтому задача, не
+    уложившаяся в timeout, не отменяется и дорабатывает в фоне.
+    """
+    done, _ = await asyncio.wait({task}, timeout=max(timeout, 0))
+    if done:
+        return True
+
+    _abandoned.add(task)
+    task.add_done_callback(_abandoned.discard)
+    return False
+
+
+async def _release_lock(redis_client) -> None:
+    """Снятие блокировки прогрева, если она все еще наша"""
+    try:
+        script = redis_client.register_script(RELEASE_LOCK_LUA)
+        await script(keys=[WARMUP_LOCK_KEY], args=[invalidation_bus.origin])
+    except Exception as e:
+        logger.error("Cache warmup unlock error", error=str(e))
+
+
+async def warm_cache(
+    session_factory: Callable[[], Session] = SessionLocal,
+    budget: float = None,
+) -> WarmupReport:
+    """
+    Прогрев кэша каталога
+
+    Ошибки не пробрасываются: прогрев - оптимизация, и старт приложения
+    не должен от него зависеть.
+
+    Args:
+        session_factory: Фабрика сессий БД
+        budget: Бюджет времени в секундах (по умолчанию из настроек)
+    """
+    started = time.monotonic()
+    if budget is None:
+        budget = settings.CACHE_WARMUP_BUDGET_SECONDS
+    deadline = started + budget
+
+    try:
+        redis_client = await get_redis()
+        acquired = await redis_client.set(
+            WARMUP_LOCK_KEY,
+            invalidation_bus.origin,
+            nx=True,
+            ex=settings.CACHE_WARMUP_LOCK_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.error("Cache warmup lock error", error=str(e))
+        return WarmupReport(status="error")
+
+    if not acquired:
+        logger.info("Cache warmup is done by another worker")
+        return WarmupReport(status="locked")
+
+    report = WarmupReport(status="done")
+    db = session_factory()
+    running: Optional[asyncio.Task] = None
+    try:
+        running = asyncio.ensure_future(run_in_threadpool(_catalog_steps, db))
+        if await _wait_within(running, deadline - time.monotonic()):
+            steps = running.result()
+        else:
+            steps = []
+            report.status = "budget_exceeded"
+            logger.warning("Cache warmup step timed out", step="catalog")
+
+        for index, (name, step) in enumerate(steps):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                report.status = "budget_exceeded"
+                report.skipped = len(steps) - index
+                break
+
+            running = asyncio.ensure_future(step())
+            if not await _wait_within(running, remaining):
+                report.status = "budget_exceeded"
+                report.skipped = len(steps) - index
+                logger.warning("Cache warmup step timed out", step=name)
+                break
+
+            try:
+                running.result()
+                report.warmed += 1
+            except Exception as e:
+                report.failed += 1
+                logger.warning("Cache warmup step failed", step=name, error=str(e))
+    except Exception as e:
+        report.status = "error"
+        logger.error("Cache warmup failed", error=str(e))
+    finally:
+        if running is not None and not running.done():
+            # Сессией еще пользуется шаг, дорабатывающий в фоне
+            running.add_done_callback(lambda _: db.close())
+        else:
+            db.close()
+        await _release_lock(redis_client)
+
+    report.elapsed = time.monotonic() - started
+    logger.info(
+        "Cache warmup finished",
+        status=report.status,
+        warmed=report.warmed,
+        skipped=report.skipped,
+        failed=report.failed,
+        elapsed_ms=round(report.elapsed * 1000, 1),
+    )
+    return report
@@ -0,0 +1,251 @@
+"""
+Локальный (L1) кэш процесса для Neuro Store API
+
+Ограниченный LRU с TTL перед Redis. Допуск новых записей решает политика
+TinyLFU: частоты обращений оцениваются count-min sketch, и при нехватке места
+запись вытесняет LRU-кандидатов только если к ней обращаются чаще. Ключ
+попадает в L1 только после нескольких обращений (продвижение горячих ключей),
+поэтому разовые запросы не вымывают каталог из памяти.
+"""
+
+import fnmatch
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.core.config import settings
+
+
+class FrequencySketch:
+    """Count-min sketch с 4-битными счетчиками и периодическим старением"""
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, capacity: int):
+        width = 1
+        while width < max(capacity, 16):
+            width <<= 1
+
+        self._mask = width - 1
+        self._table = [[0] * width for _ in range(self.DEPTH)]
+        self._sample_size = 10 * max(capacity, 16)
+        self._additions = 0
+
+    # Нечетные множители для перемешивания хэша в каждой строке: младшие биты
+    # hash((row, key)) для разных строк коррелируют, и строки не независимы
+    _SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+    )
+
+    def _indexes(self, key: str):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        for row, seed in enumerate(self._SEEDS):
+            mixed = ((h ^ (h >> 29)) * seed) & 0xFFFFFFFFFFFFFFFF
+            yield row, (mixed >> 32) & self._mask
+
+    def increment(self, key: str) -> None:
+        """Учет обращения к ключу"""
+        for row, idx in self._indexes(key):
+            if self._table[row][idx] < self.MAX_COUNT:
+                self._table[row][idx] += 1
+
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def estimate(self, key: str) -> int:
+        """Оценка частоты обращений к ключу"""
+        return min(self._table[row][idx] for row, idx in self._indexes(key))
+
+    def _reset(self) -> None:
+        """Старение: делим все счетчики пополам, чтобы забывать старую популярность"""
+        for row in self._table:
+            for idx, value in enumerate(row):
+                row[idx] = value >> 1
+        self._additions //= 2
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires_at: float
+    tags: Tuple[str, ...] = ()
+
+
+@dataclass
+class LocalCacheStats:
+    """Счетчики L1 кэша"""
+
+    hits: int = 0
+    misses: int = 0
+    admissions: int = 0
+    rejections: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class LocalCache:
+    """Ограниченный по числу записей и байтам LRU кэш с TTL и допуском TinyLFU"""
+
+    max_items: int
+    max_bytes: int
+    promote_after: int = 2
+    stats: LocalCacheStats = field(default_factory=LocalCacheStats)
+
+    def __post_init__(self):
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._sketch = FrequencySketch(self.max_items)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Получение значения: (найдено, значение)"""
+        self._sketch.increment(key)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return False, None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return True, entry.value
+
+    def set(
+        self, key: str, value: Any, size: int, ttl: float, tags: Iterable[str] = ()
+    ) -> bool:
+        """
+        Предложение записи в L1
+
+        Returns:
+            bool: True, если запись допущена в кэш
+        """
+        if key in self._entries:
+            self._remove(key)
+        elif self._sketch.estimate(key) < self.promote_after:
+            # Ключ еще не стал горячим - обслуживается из Redis
+            return False
+
+        if size > self.max_bytes or not self._make_room(key, size):
+            self.stats.rejections += 1
+            return False
+
+        entry = _Entry(value, size, time.monotonic() + ttl, tuple(tags))
+        self._entries[key] = entry
+        self._bytes += size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        self.stats.admissions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Удаление записи"""
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        return True
+
+    def delete_matching(self, pattern: str) -> int:
+        """Удаление записей по glob-паттерну Redis"""
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Удаление всех записей, помеченных тегами"""
+        removed = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """Полная очистка"""
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+
+    def _make_room(self, candidate: str, size: int) -> bool:
+        """Подбор LRU-жертв; вытеснение только если кандидат популярнее каждой"""
+        now = time.monotonic()
+        candidate_freq = self._sketch.estimate(candidate)
+        victims = []
+        freed_items = 0
+        freed_bytes = 0
+
+        for key, entry in self._entries.items():
+            if (
+                len(self._entries) - freed_items < self.max_items
+                and self._bytes - freed_bytes + size <= self.max_bytes
+            ):
+                break
+
+            if entry.expires_at > now and self._sketch.estimate(key) >= candidate_freq:
+                return False
+
+            victims.append(key)
+            freed_items += 1
+            freed_bytes += entry.size
+
+        for key in victims:
+            self._remove(key)
+            self.stats.evictions += 1
+        return True
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def parse_prefix_ttls(value: str) -> Dict[str, int]:
+    """Парсинг настройки вида 'products=30,product_plans=60' в {префикс: TTL}"""
+    result: Dict[str, int] = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        prefix, _, ttl = item.partition("=")
+        result[prefix.strip()] = int(ttl) if ttl.strip() else settings.CACHE_TTL_SECONDS
+    return result
+
+
+# L1 кэш текущего процесса (у каждого воркера gunicorn свой)
+local_cache = LocalCache(
+    max_items=settings.CACHE_L1_MAX_ITEMS,
+    max_bytes=settings.CACHE_L1_MAX_BYTES,
+    promote_after=settings.CACHE_L1_PROMOTE_AFTER,
+)
+
+# TTL L1 по префиксам ключей; префиксы вне списка в L1 не попадают
+l1_prefix_ttls: Dict[str, int] = parse_prefix_ttls(settings.CACHE_L1_PREFIXES)
+
+
+def l1_ttl_for(prefix: str) -> Optional[int]:
+    """TTL L1 для префикса ключа или None, если L1 для него выключен"""
+    return l1_prefix_ttls.get(prefix)
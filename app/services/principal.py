@@ -0,0 +1,243 @@
+"""
+Кэш субъекта запроса (principal)
+
+Каждый аутентифицированный запрос раньше искал пользователя в БД по email из
+токена. Большинству эндпоинтов нужны только ID, контактные поля, флаг
+активности и роли, поэтому они получают неизменяемый снимок Principal из
+L1 и Redis с коротким TTL. Баланс в снимок не входит: он меняется часто, и
+эндпоинты, работающие с ним, загружают ORM-запись пользователя отдельно.
+
+Снимок помечен тегом ``user:{id}``: его сбрасывает та же инвалидация, что и
+остальные данные пользователя (активация, деактивация, назначение и отзыв
+ролей), в том числе в L1 других воркеров через шину инвалидации.
+
+Проверка ролей не требует даже снимка: токен несет имена ролей и версию
+ролей пользователя (TokenClaims). Версия хранится в ``users.role_version``;
+назначение, отзыв роли и деактивация увеличивают ее в той же транзакции, и
+выданные раньше токены сразу отклоняются. Запросы читают копию версии из L1
+и Redis, а вытесненная из Redis копия перечитывается из БД - это не
+разлогинивает пользователей. Перед фиксацией изменения копия сбрасывается;
+если Redis ее не удалил, изменение откатывается (RoleVersionUnavailable).
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.models.user import User
+from app.services.cache import (
+    CacheUnavailableError,
+    delete_cache,
+    generate_cache_key,
+    get_cache,
+    set_cache,
+)
+from app.services.cache_codec import CodecError, codec
+from app.services.local_cache import local_cache
+from app.services.roles import get_user_role_names
+
+logger = get_logger("neuro_store.principal")
+
+KEY_PREFIX = "principal"
+ROLE_VERSION_PREFIX = "role_version"
+
+
+class RoleVersionUnavailable(HTTPException):
+    """Копию версии ролей не удалось сбросить: изменение откатывается, 503"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис временно недоступен, повторите запрос",
+            headers={"Retry-After": "1"},
+        )
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Снимок пользователя для аутентификации и авторизации (без баланса)"""
+
+    id: int
+    email: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    phone: Optional[str]
+    is_active: bool
+    is_verified: bool
+    created_at: Optional[datetime]
+    roles: Tuple[str, ...]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat() if self.created_at else None
+        data["roles"] = list(self.roles)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Principal":
+        created_at = data.get("created_at")
+        if created_at:
+            created_at = datetime.fromisoformat(created_at)
+        return cls(**{**data, "created_at": created_at, "roles": tuple(data["roles"])})
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """Субъект и роли из access-токена"""
+
+    id: Optional[int]
+    email: str
+    roles: Tuple[str, ...] = ()
+    role_version: int = 0
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "TokenClaims":
+        return cls(
+            id=payload.get("uid"),
+            email=payload["sub"],
+            roles=tuple(payload.get("roles") or ()),
+            role_version=int(payload.get("rv") or 0),
+        )
+
+    @classmethod
+    def from_principal(cls, principal: Principal) -> "TokenClaims":
+        return cls(principal.id, principal.email, principal.roles)
+
+
+def principal_key(subject: str) -> str:
+    return generate_cache_key(KEY_PREFIX, subject)
+
+
+def principal_tags(user_id: int) -> Tuple[str, ...]:
+    return (f"user:{user_id}",)
+
+
+def role_version_key(user_id: int) -> str:
+    return generate_cache_key(ROLE_VERSION_PREFIX, user_id)
+
+
+def load_role_version(db: Session, user_id: int) -> Optional[int]:
+    """Версия ролей из БД (None - пользователя нет)"""
+    return db.query(User.role_version).filter(User.id == user_id).scalar()
+
+
+async def role_version(db: Session, user_id: int) -> Optional[int]:
+    """Текущая версия ролей пользователя: L1, затем Redis, затем БД"""
+    key = role_version_key(user_id)
+    found, version = local_cache.get(key)
+    if found:
+        return version
+
+    version = None
+    payload = await get_cache(key)
+    if payload is not None:
+        try:
+            version = int(payload)
+        except ValueError:
+            logger.warning("Invalid cached role version", key=key)
+    if version is None:
+        version = load_role_version(db, user_id)
+        if version is None:
+            return None
+        payload = str(version).encode()
+        await set_cache(
+            key,
+            payload,
+            settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            tags=principal_tags(user_id),
+        )
+
+    if settings.PRINCIPAL_CACHE_L1_TTL_SECONDS:
+        local_cache.set(
+            key,
+            version,
+            len(payload),
+            settings.PRINCIPAL_CACHE_L1_TTL_SECONDS,
+            principal_tags(user_id),
+        )
+    return version
+
+
+def bump_role_version(db: Session, user_id: int) -> None:
+    """Увеличение версии ролей в текущей транзакции (фиксирует вызывающий)"""
+    db.query(User).filter(User.id == user_id).update(
+        {User.role_version: User.role_version + 1}, synchronize_session=False
+    )
+
+
+async def forget_role_version(user_id: int) -> None:
+    """
+    Сброс копии версии ролей в Redis и L1 перед фиксацией ее увеличения
+
+    Оставшаяся копия принимала бы отозванные роли до истечения TTL, поэтому
+    ошибка Redis не глотается, а поднимается как RoleVersionUnavailable.
+    После фиксации копию еще раз сбрасывает invalidate_user_cache (тег
+    ``user:{id}``) - на случай, если параллельный запрос успел перечитать
+    старую версию из БД.
+    """
+    try:
+        await delete_cache(role_version_key(user_id), required=True)
+    except CacheUnavailableError as e:
+        logger.error("Role version reset failed", user_id=user_id, error=str(e))
+        raise RoleVersionUnavailable() from e
+
+
+def load_principal(db: Session, subject: str) -> Optional[Principal]:
+    """Снимок из БД: пользователь по email и его активные роли"""
+    user = db.query(User).filter(User.email == subject).first()
+    if user is None:
+        return None
+
+    return Principal(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        phone=user.phone,
+        is_active=bool(user.is_active),
+        is_verified=bool(user.is_verified),
+        created_at=user.created_at,
+        roles=get_user_role_names(db, user.id),
+    )
+
+
+async def get_principal(db: Session, subject: str) -> Optional[Principal]:
+    """Снимок по субъекту токена: L1, затем Redis, затем БД"""
+    key = principal_key(subject)
+    found, principal = local_cache.get(key)
+    if found:
+        return principal
+
+    payload = await get_cache(key)
+    if payload is not None:
+        try:
+            principal = Principal.from_dict(codec.decode(payload))
+        except (CodecError, KeyError, TypeError, ValueError) as e:
+            logger.warning("Invalid cached principal", key=key, error=str(e))
+            principal = None
+    if principal is None:
+        principal = load_principal(db, subject)
+        if principal is None:
+            return None
+        payload = codec.encode(principal.to_dict())
+        await set_cache(
+            key,
+            payload,
+            settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            tags=principal_tags(principal.id),
+        )
+
+    if settings.PRINCIPAL_CACHE_L1_TTL_SECONDS:
+        local_cache.set(
+            key,
+            principal,
+            len(payload),
+            settings.PRINCIPAL_CACHE_L1_TTL_SECONDS,
+            principal_tags(principal.id),
+        )
+    return principal
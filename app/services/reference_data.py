@@ -0,0 +1,221 @@
+"""
+Справочные данные в памяти воркера: активные тарифные планы
+
+Таблица plans крошечная, меняется редко, а читается при каждом создании
+подписки. Реестр держит ее неизменяемый снимок, и горячий путь разрешает ID
+плана без запроса к БД. Роли пользователя здесь не хранятся: они входят в
+токен и в снимок пользователя (app.services.principal), а из БД читаются
+одним запросом (app.services.roles).
+
+Снимок перечитывается, когда устарел:
+
+- после изменения справочника в этом воркере (invalidate_reference_data);
+- когда фоновая проверка видит новое поколение пространства имен
+  ``reference`` в Redis - его увеличивает воркер, изменивший справочник;
+- когда снимок старше REFERENCE_DATA_MAX_AGE_SECONDS: у планов нет пути
+  записи через API, поэтому их изменения в БД подхватываются только так;
+- когда ID, которого нет в снимке, находится в БД запросом по первичному
+  ключу (например, план создан в обход API).
+
+Промах снимка стоит одного запроса по первичному ключу, как и до реестра:
+несуществующие и неактивные ID не перечитывают справочники.
+
+Перечитывание выполняется синхронно в сессии текущего запроса, поэтому
+горячие пути остаются синхронными и не зависят от SessionLocal.
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.models.plan import Plan
+from app.services.cache import bump_namespace, namespace_generation
+
+logger = get_logger("neuro_store.reference_data")
+
+# Пространство имен, поколение которого означает версию справочников
+REFERENCE_NAMESPACE = "reference"
+
+
+@dataclass(frozen=True)
+class PlanRef:
+    """Активный тарифный план из снимка"""
+
+    id: int
+    name: str
+    description: Optional[str]
+    price: Decimal
+    duration_days: int
+    max_requests_per_month: Optional[int]
+    features: Optional[str]
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """Неизменяемый снимок справочников"""
+
+    plans: Mapping[int, PlanRef]
+    loaded_at: float
+
+
+def _plan_ref(plan: Plan) -> PlanRef:
+    return PlanRef(
+        plan.id,
+        plan.name,
+        plan.description,
+        Decimal(plan.price),
+        plan.duration_days,
+        plan.max_requests_per_month,
+        plan.features,
+    )
+
+
+def load_snapshot(db: Session) -> ReferenceSnapshot:
+    """Чтение справочников из БД: один запрос к маленькой таблице"""
+    plans = {
+        plan.id: _plan_ref(plan) for plan in db.query(Plan).filter(Plan.is_active).all()
+    }
+    return ReferenceSnapshot(
+        plans=MappingProxyType(plans),
+        loaded_at=time.time(),
+    )
+
+
+@dataclass
+class ReferenceStats:
+    """Счетчики реестра"""
+
+    loads: int = 0
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    remote_changes: int = 0
+
+
+class ReferenceDataRegistry:
+    """Снимок справочников процесса с ленивым перечитыванием"""
+
+    def __init__(self, check_interval: float, max_age: Optional[float] = None):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.stats = ReferenceStats()
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self, db: Session) -> ReferenceSnapshot:
+        """Текущий снимок; устаревший перечитывается в переданной сессии"""
+        if self._stale or self._snapshot is None:
+            self._reload(db)
+        elif self.max_age and time.time() - self._snapshot.loaded_at >= self.max_age:
+            self.stats.expired += 1
+            self._stale = True
+            self._reload(db)
+        return self._snapshot
+
+    def _reload(self, db: Session, force: bool = False) -> None:
+        with self._lock:
+            # Пока ждали блокировку, снимок мог перечитать другой поток
+            if not force and not self._stale and self._snapshot is not None:
+                return
+            self._stale = False
+            try:
+                self._snapshot = load_snapshot(db)
+            except Exception:
+                self._stale = True
+                raise
+            self.stats.loads += 1
+        logger.debug("Reference data loaded", plans=len(self._snapshot.plans))
+
+    def plan(self, db: Session, plan_id: int) -> Optional[PlanRef]:
+        """Активный план по ID или None"""
+        plan = self.snapshot(db).plans.get(plan_id)
+        if plan is not None:
+            self.stats.hits += 1
+            return plan
+
+        self.stats.misses += 1
+        row = db.get(Plan, plan_id)
+        if row is None or not row.is_active:
+            return None
+        # План есть в БД, но не в снимке: он устарел
+        self.invalidate()
+        return _plan_ref(row)
+
+    def invalidate(self) -> None:
+        """Пометить снимок устаревшим: перечитается при следующем обращении"""
+        self._stale = True
+
+    def preload(self, session_factory: Callable[[], Session]) -> None:
+        """Загрузка снимка при старте (ошибка не мешает старту)"""
+        db = session_factory()
+        try:
+            self._reload(db, force=True)
+            logger.info("Reference data preloaded", plans=len(self._snapshot.plans))
+        except Exception as e:
+            logger.warning("Reference data preload failed", error=str(e))
+        finally:
+            db.close()
+
+    async def check_version(self) -> None:
+        """Сравнение поколения в Redis с последним увиденным"""
+        generation = await namespace_generation(REFERENCE_NAMESPACE)
+        if generation and generation != self._generation:
+            if self._generation is not None:
+                self.stats.remote_changes += 1
+                logger.info("Reference data changed", generation=generation)
+            # Первое чтение тоже сбрасывает снимок: изменение могло случиться
+            # между загрузкой и запуском проверки
+            self._generation = generation
+            self.invalidate()
+
+    async def start(self) -> None:
+        """Запуск фоновой проверки версии (из lifespan каждого воркера)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.check_version()
+            except Exception as e:
+                logger.warning("Reference data version check failed", error=str(e))
+            await asyncio.sleep(self.check_interval)
+
+    def reset(self) -> None:
+        """Полный сброс (тесты и смена БД)"""
+        self._snapshot = None
+        self._stale = True
+        self._generation = None
+
+
+# Реестр текущего процесса
+reference_data = ReferenceDataRegistry(
+    check_interval=settings.REFERENCE_DATA_CHECK_SECONDS,
+    max_age=settings.REFERENCE_DATA_MAX_AGE_SECONDS,
+)
+
+
+async def invalidate_reference_data() -> None:
+    """Справочник изменен: сбросить снимок здесь и в остальных воркерах"""
+    reference_data.invalidate()
+    generation = await bump_namespace(REFERENCE_NAMESPACE)
+    logger.info("Reference data invalidated", generation=generation)
@@ -0,0 +1,365 @@
+"""
+Кэш готовых HTTP-ответов (ASGI middleware)
+
+Декоратор @cache возвращает из кэша Python-объекты, и FastAPI на каждом
+запросе заново валидирует их по response_model и кодирует в JSON. Этот слой
+стоит перед приложением и для настроенных GET-маршрутов хранит уже
+закодированный ответ: статус, заголовки и тело. Попадание отдается без
+Pydantic, без JSON и без вызова эндпоинта.
+
+Ключ строится из пути, нормализованного query, значений заголовков из Vary
+и, для приватных маршрутов, субъекта JWT. Теги приватных ответов строятся по
+claims токена (например, ``user:{uid}``), так что их сбрасывает та же
+инвалидация, что и остальные данные пользователя. Не кэшируются:
+
+- запросы с Cache-Control: no-store (no-cache - читается мимо кэша);
+- приватные маршруты без валидного токена - ответ дает само приложение;
+- ответы не 200, с Set-Cookie, с Cache-Control: no-store/private
+  (для публичных маршрутов) и с Vary по заголовкам, не входящим в ключ.
+"""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.core.metrics import metric_lines, register_collector
+from app.core.security import verify_token
+from app.services.cache import (
+    generate_cache_key,
+    get_cache,
+    namespace_generation,
+    set_cache,
+)
+from app.services.local_cache import l1_ttl_for, local_cache
+
+logger = get_logger("neuro_store.response_cache")
+
+KEY_PREFIX = "response"
+
+# Заголовки, которые относятся к конкретному ответу и не сохраняются
+_SKIPPED_HEADERS = {b"date", b"server", b"set-cookie", b"x-cache"}
+
+_PARAM_RE = re.compile(r"\{(\w+)\}")
+
+# Закэшированный ответ: статус, заголовки, тело
+_Entry = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+@dataclass
+class ResponseCacheRule:
+    """
+    Правило кэширования маршрута
+
+    Args:
+        path: Шаблон пути, например ``/api/v1/products/{product_id}``
+        ttl: Время жизни ответа в секундах
+        private: Ответ зависит от пользователя - в ключ входит субъект токена
+        namespace: Пространство имен с поколением (инвалидация bump_namespace)
+        tags: Шаблоны тегов; доступны параметры пути, а для приватных
+            маршрутов - ``{subject}`` и claims токена
+        vary: Заголовки запроса, значения которых входят в ключ
+    """
+
+    path: str
+    ttl: int
+    private: bool = False
+    namespace: Optional[str] = None
+    tags: Sequence[str] = ()
+    vary: Sequence[str] = ()
+    pattern: re.Pattern = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Литеральные части экранируются, {param} становится именованной группой
+        parts = _PARAM_RE.split(self.path)
+        regex = "".join(
+            f"(?P<{part}>[^/]+)" if index % 2 else re.escape(part)
+            for index, part in enumerate(parts)
+        )
+        self.pattern = re.compile(f"^{regex}$")
+        self.vary = tuple(name.lower() for name in self.vary)
+
+    def match(self, path: str) -> Optional[Dict[str, str]]:
+        found = self.pattern.match(path)
+        return found.groupdict() if found else None
+
+
+@dataclass
+class ResponseCacheStats:
+    """Счетчики кэша ответов"""
+
+    hits: int = 0
+    l1_hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    bypassed: int = 0
+    uncacheable: int = 0
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def normalize_query(query_string: bytes) -> str:
+    """Query в каноническом виде: параметры отсортированы, пустые отброшены"""
+    pairs = parse_qsl(query_string.decode("latin-1"), keep_blank_values=False)
+    return urlencode(sorted(pairs))
+
+
+def _cache_control(value: Optional[str]) -> set:
+    if not value:
+        return set()
+    return {item.strip().split("=", 1)[0].lower() for item in value.split(",")}
+
+
+def _bearer_claims(headers: Headers) -> Optional[Dict[str, Any]]:
+    """Claims валидного Bearer-токена с субъектом или None"""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = verify_token(token)
+    return payload if payload and payload.get("sub") else None
+
+
+def _pack(
+    status: int, headers: List[Tuple[bytes, bytes]], body: bytes, tags: List[str]
+) -> bytes:
+    """Запись ответа: длина метаданных, метаданные JSON и тело как есть"""
+    meta = json.dumps(
+        {
+            "status": status,
+            "tags": tags,
+            "headers": [
+                [name.decode("latin-1"), value.decode("latin-1")]
+                for name, value in headers
+            ],
+        },
+        separators=(",", ":"),
+    ).encode()
+    return len(meta).to_bytes(4, "big") + meta + body
+
+
+def _unpack(payload: bytes) -> Tuple[_Entry, List[str]]:
+    """Разбор записи: (статус, заголовки, тело) и теги для L1"""
+    size = int.from_bytes(payload[:4], "big")
+    meta = json.loads(payload[4 : 4 + size])
+    headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in meta["headers"]
+    ]
+    return (meta["status"], headers, payload[4 + size :]), meta["tags"]
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware кэша ответов для маршрутов из rules"""
+
+    def __init__(self, app: ASGIApp, rules: Sequence[ResponseCacheRule] = ()):
+        self.app = app
+        self.rules = list(rules)
+        self.l1_ttl = l1_ttl_for(KEY_PREFIX)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            not settings.RESPONSE_CACHE_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        for rule in self.rules:
+            path_params = rule.match(scope["path"])
+            if path_params is not None:
+                break
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_directives = _cache_control(headers.get("cache-control"))
+        claims = _bearer_claims(headers) if rule.private else {}
+        if "no-store" in request_directives or claims is None:
+            response_cache_stats.bypassed += 1
+            await self.app(scope, receive, send)
+            return
+
+        subject = claims.get("sub")
+        key = await self._key(rule, scope, headers, subject)
+        if "no-cache" not in request_directives:
+            cached = await self._read(key)
+            if cached is not None:
+                await self._send_cached(send, *cached)
+                return
+
+        response_cache_stats.misses += 1
+        await self._call_and_store(
+            rule,
+            key,
+            {**claims, **path_params, "subject": subject},
+            scope,
+            receive,
+            send,
+        )
+
+    async def _key(
+        self,
+        rule: ResponseCacheRule,
+        scope: Scope,
+        headers: Headers,
+        subject: Optional[str],
+    ) -> str:
+        prefix = KEY_PREFIX
+        if rule.namespace:
+            prefix = f"{prefix}:v{await namespace_generation(rule.namespace)}"
+        return generate_cache_key(
+            prefix,
+            scope["path"],
+            query=normalize_query(scope["query_string"]) or None,
+            user=subject,
+            **{f"h_{name}": headers.get(name, "") for name in rule.vary},
+        )
+
+    async def _read(self, key: str) -> Optional[_Entry]:
+        if self.l1_ttl:
+            found, entry = local_cache.get(key)
+            if found:
+                response_cache_stats.hits += 1
+                response_cache_stats.l1_hits += 1
+                return entry
+
+        payload = await get_cache(key)
+        if payload is None:
+            return None
+        try:
+            entry, tags = _unpack(payload)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Invalid cached response", key=key, error=str(e))
+            return None
+
+        response_cache_stats.hits += 1
+        if self.l1_ttl:
+            local_cache.set(key, entry, len(payload), self.l1_ttl, tags)
+        return entry
+
+    async def _send_cached(
+        self, send: Send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes
+    ) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [*headers, (b"x-cache", b"HIT")],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _call_and_store(
+        self,
+        rule: ResponseCacheRule,
+        key: str,
+        tag_params: Dict[str, Any],
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        started: Dict[str, Message] = {}
+        chunks: List[bytes] = []
+        size = 0
+        cacheable = True
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal size, cacheable
+            if message["type"] == "http.response.start":
+                started["message"] = message
+                cacheable = self._is_cacheable(rule, message)
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"x-cache", b"MISS")],
+                }
+            elif message["type"] == "http.response.body" and cacheable:
+                size += len(message.get("body", b""))
+                if size > settings.RESPONSE_CACHE_MAX_BODY_BYTES:
+                    cacheable = False
+                    chunks.clear()
+                else:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        if not cacheable or "message" not in started:
+            response_cache_stats.uncacheable += 1
+            return
+
+        start = started["message"]
+        headers = [
+            (name, value)
+            for name, value in start.get("headers", [])
+            if name.lower() not in _SKIPPED_HEADERS
+        ]
+        try:
+            tags = [tag.format(**tag_params) for tag in rule.tags]
+        except KeyError as e:
+            # Например, токен старого формата без нужного claim: без тега
+            # ответ нельзя было бы инвалидировать, поэтому не сохраняем
+            logger.debug("Response not cached, tag is missing", key=key, error=str(e))
+            response_cache_stats.uncacheable += 1
+            return
+        payload = _pack(start["status"], headers, b"".join(chunks), tags)
+        if await set_cache(key, payload, rule.ttl, tags=tags):
+            response_cache_stats.stored += 1
+
+    def _is_cacheable(self, rule: ResponseCacheRule, start: Message) -> bool:
+        if start["status"] != 200:
+            return False
+
+        headers = Headers(raw=start.get("headers", []))
+        if "set-cookie" in headers:
+            return False
+
+        directives = _cache_control(headers.get("cache-control"))
+        if "no-store" in directives or (not rule.private and "private" in directives):
+            return False
+
+        # Vary по заголовку, не входящему в ключ, смешал бы разные варианты ответа
+        keyed = set(rule.vary) | ({"authorization"} if rule.private else set())
+        vary = {
+            item.strip().lower()
+            for item in headers.get("vary", "").split(",")
+            if item.strip()
+        }
+        return vary <= keyed
+
+
+def get_response_cache_stats() -> Dict[str, int]:
+    """Статистика кэша ответов"""
+    stats = response_cache_stats
+    lookups = stats.hits + stats.misses
+    return {
+        "hits": stats.hits,
+        "l1_hits": stats.l1_hits,
+        "misses": stats.misses,
+        "stored": stats.stored,
+        "bypassed": stats.bypassed,
+        "uncacheable": stats.uncacheable,
+        "hit_ratio": round(stats.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+@register_collector
+def collect_response_cache_metrics() -> List[str]:
+    """Метрики кэша ответов для /metrics"""
+    lines: List[str] = []
+    for field_name, value in asdict(response_cache_stats).items():
+        lines += metric_lines(
+            f"neuro_store_response_cache_{field_name}_total",
+            "counter",
+            f"Response cache {field_name.replace('_', ' ')}",
+            [({}, value)],
+        )
+    return lines
@@ -0,0 +1,33 @@
+"""
+Разрешение ролей пользователя
+
+Роли читаются одним запросом с JOIN user_roles -> roles: и для снимка
+пользователя при входе и аутентификации, и для эндпоинтов, отдающих список
+ролей. Неактивные роли не возвращаются.
+"""
+
+from typing import List, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+from app.models.role import Role
+from app.models.user_role import UserRole
+
+
+def _active_roles(db: Session, user_id: int, *entities) -> Query:
+    return (
+        db.query(*entities)
+        .join(UserRole, UserRole.role_id == Role.id)
+        .filter(UserRole.user_id == user_id, Role.is_active)
+        .order_by(Role.id)
+    )
+
+
+def get_user_roles(db: Session, user_id: int) -> List[Role]:
+    """Активные роли пользователя"""
+    return _active_roles(db, user_id, Role).all()
+
+
+def get_user_role_names(db: Session, user_id: int) -> Tuple[str, ...]:
+    """Имена активных ролей пользователя"""
+    return tuple(name for (name,) in _active_roles(db, user_id, Role.name))
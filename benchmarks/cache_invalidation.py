@@ -0,0 +1,129 @@
+"""
+Бенчмарк инвалидации кэша: KEYS + DEL против SCAN + UNLINK
+
+Заполняет Redis N ключами (часть из них - ключи каталога, остальное - чужие
+данные), затем удаляет ключи каталога двумя способами и параллельно замеряет
+задержку PING из отдельного соединения. Задержка PING показывает, насколько
+долго Redis был заблокирован для остальных клиентов.
+
+Запуск (нужен отдельный, НЕ боевой Redis - база очищается):
+
+    python -m benchmarks.cache_invalidation --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import redis.asyncio as redis
+
+from app.services import cache
+
+
+async def populate(client: redis.Redis, total: int, catalog_ratio: float) -> int:
+    """Заполнение базы ключами, возвращает число ключей каталога"""
+    await client.flushdb()
+    catalog_every = max(1, round(1 / catalog_ratio))
+    catalog = 0
+
+    pipe = client.pipeline(transaction=False)
+    for i in range(total):
+        if i % catalog_every == 0:
+            pipe.set(f"products:skip=0:limit=100:page={i}", "x" * 64)
+            catalog += 1
+        else:
+            pipe.set(f"tenant:{i % 97}:session:{i}", "x" * 64)
+
+        if len(pipe) >= 10_000:
+            await pipe.execute()
+    await pipe.execute()
+
+    return catalog
+
+
+async def probe(client: redis.Redis, stop: asyncio.Event, samples: list) -> None:
+    """Замер задержки PING, пока идет инвалидация"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.ping()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.001)
+
+
+async def keys_delete(client: redis.Redis, pattern: str) -> int:
+    """Прежняя реализация delete_cache_pattern"""
+    keys = await client.keys(pattern)
+    if keys:
+        return await client.delete(*keys)
+    return 0
+
+
+async def scan_unlink(client: redis.Redis, pattern: str) -> int:
+    """Текущая реализация через cache.scan_delete_pattern"""
+    cache.redis_client = client
+    report = await cache.scan_delete_pattern(pattern)
+    return report.deleted
+
+
+async def run_case(name, func, args) -> dict:
+    worker = redis.from_url(args.redis_url)
+    prober = redis.from_url(args.redis_url)
+
+    expected = await populate(worker, args.keys, args.catalog_ratio)
+
+    samples: list = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(prober, stop, samples))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    deleted = await func(worker, "products:*")
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    await worker.flushdb()
+    await worker.close()
+    await prober.close()
+
+    samples.sort()
+    return {
+        "name": name,
+        "expected": expected,
+        "deleted": deleted,
+        "elapsed_ms": elapsed * 1000,
+        "ping_p50_ms": statistics.median(samples) if samples else 0.0,
+        "ping_p99_ms": samples[int(len(samples) * 0.99) - 1] if samples else 0.0,
+        "ping_max_ms": samples[-1] if samples else 0.0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--catalog-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = [
+        await run_case("KEYS + DEL", keys_delete, args),
+        await run_case("SCAN + UNLINK", scan_unlink, args),
+    ]
+
+    header = (
+        f"{'strategy':<15} {'deleted':>9} {'total ms':>10} "
+        f"{'ping p50':>9} {'ping p99':>9} {'ping max':>9}"
+    )
+    print(f"keys={args.keys} catalog_ratio={args.catalog_ratio}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<15} {r['deleted']:>9} {r['elapsed_ms']:>10.1f} "
+            f"{r['ping_p50_ms']:>9.2f} {r['ping_p99_ms']:>9.2f} {r['ping_max_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Бенчмарк задержки каталога во время всплеска входов
+
+Одно ASGI-приложение (один цикл событий, как воркер uvicorn) обслуживает
+одновременно поток входов с проверкой bcrypt и запросы каталога, ответ
+которого уже в кэше. Сравниваются проверка пароля прямо в цикле событий
+(прежний login) и в пуле процессов хеширования (verify_password_async).
+Внешние сервисы не нужны: каталог отдает готовый ответ, как при попадании
+в кэш, поэтому вся его задержка - ожидание цикла событий. Запросы каталога
+идут по расписанию, задержка отсчитывается от запланированного момента.
+
+Запуск:
+
+    python -m benchmarks.login_load --logins 200 --login-concurrency 20
+"""
+
+import argparse
+import asyncio
+import math
+import statistics
+import time
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.core import security
+
+CATALOG = [{"id": i, "name": f"Product {i}", "price": "9.99"} for i in range(50)]
+
+
+def build_app(password_hash: str, offload: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login(password: str):
+        if offload:
+            valid = await security.verify_password_async(password, password_hash)
+        else:
+            valid = security.verify_password(password, password_hash)
+        return {"valid": valid}
+
+    @app.get("/products")
+    async def products():
+        return CATALOG
+
+    return app
+
+
+async def run_case(name: str, offload: bool, password_hash: str, args) -> dict:
+    app = build_app(password_hash, offload)
+    samples: list = []
+    done = asyncio.Event()
+
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+
+        async def login_worker(count: int) -> None:
+            for _ in range(count):
+                await client.post("/login", params={"password": "wrong-password"})
+
+        async def catalog_prober() -> None:
+            # Запросы идут по расписанию, задержка считается от запланированного
+            # момента: иначе остановленный цикл событий просто уменьшил бы число
+            # замеров, а не увеличил задержку
+            interval = args.probe_interval_ms / 1000
+            scheduled = time.perf_counter()
+            while not done.is_set():
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await client.get("/products")
+                samples.append((time.perf_counter() - scheduled) * 1000)
+                scheduled += interval
+
+        prober = asyncio.create_task(catalog_prober())
+        started = time.perf_counter()
+        per_worker = args.logins // args.login_concurrency
+        await asyncio.gather(
+            *(login_worker(per_worker) for _ in range(args.login_concurrency))
+        )
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    samples.sort()
+    return {
+        "name": name,
+        "logins_per_s": per_worker * args.login_concurrency / elapsed,
+        "catalog_requests": len(samples),
+        "p50_ms": statistics.median(samples),
+        "p99_ms": samples[math.ceil(len(samples) * 0.99) - 1],
+        "max_ms": samples[-1],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=20)
+    parser.add_argument("--probe-interval-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    password_hash = security.get_password_hash("correct-password")
+    # Как в lifespan: процессы пула запущены до нагрузки
+    await security.password_hasher.start()
+    results = [
+        await run_case("in event loop", False, password_hash, args),
+        await run_case("process pool", True, password_hash, args),
+    ]
+    security.password_hasher.shutdown()
+
+    header = (
+        f"{'bcrypt':<14} {'logins/s':>9} {'catalog':>8} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    print(
+        f"logins={args.logins} concurrency={args.login_concurrency} "
+        f"workers={security.settings.PASSWORD_HASH_WORKERS}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<14} {r['logins_per_s']:>9.1f} {r['catalog_requests']:>8} "
+            f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+Бенчмарк rate limiting: фиксированное окно fastapi_limiter против GCRA
+
+Оба лимитера делают один EVALSHA на проверку. Замеряются задержка проверки
+под параллельной нагрузкой (много клиентов с разными ключами) и число
+запросов, пропущенных одному клиенту за короткий интервал на границе окна:
+фиксированное окно в этот момент пропускает до двойного лимита, GCRA - нет.
+
+Запуск (нужен отдельный, НЕ боевой Redis - база очищается):
+
+    python -m benchmarks.rate_limiter --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import redis.asyncio as redis
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+
+from app.core.limiter import GCRARateLimiter, RateLimit
+
+
+def fixed_window(client: redis.Redis, times: int, seconds: int):
+    """Прежний лимитер: проверка пропущена, если PTTL не вернулся"""
+    limiter = RateLimiter(times=times, seconds=seconds)
+
+    async def check(key: str) -> bool:
+        return await limiter._check(f"fastapi-limiter:{key}") == 0
+
+    return check
+
+
+def gcra(client: redis.Redis, times: int, seconds: int):
+    """Текущий лимитер app.core.limiter"""
+    limiter = GCRARateLimiter(client)
+    policy = RateLimit(times, seconds)
+
+    async def check(key: str) -> bool:
+        return (await limiter.hit(key, policy)).allowed
+
+    return check
+
+
+async def measure_latency(check, args) -> tuple:
+    """Задержки проверок и общее время: clients параллельных клиентов"""
+    samples: list = []
+
+    async def worker(client_id: int) -> None:
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            await check(f"10.0.{client_id // 256}.{client_id % 256}")
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.clients)))
+    return samples, time.perf_counter() - started
+
+
+async def measure_boundary(check) -> int:
+    """
+    Пропущенные запросы одного клиента за 200 мс вокруг границы окна
+
+    Первый запрос открывает секундное окно; через 0,9 с клиент выбирает
+    остаток квоты и продолжает после истечения окна.
+    """
+    await check("boundary")
+    await asyncio.sleep(0.9)
+    allowed = 0
+    deadline = time.perf_counter() + 0.2
+    while time.perf_counter() < deadline:
+        allowed += await check("boundary")
+    return allowed
+
+
+async def run_case(name, factory, args) -> dict:
+    client = redis.from_url(args.redis_url)
+    await client.flushdb()
+    await FastAPILimiter.init(client)
+
+    # Лимит недостижим: замеряется стоимость самой проверки
+    samples, elapsed = await measure_latency(factory(client, 10**6, 60), args)
+
+    await client.flushdb()
+    allowed = await measure_boundary(factory(client, args.limit, 1))
+
+    await client.flushdb()
+    await client.close()
+
+    samples.sort()
+    return {
+        "name": name,
+        "checks": len(samples),
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(samples),
+        "p99_ms": samples[int(len(samples) * 0.99) - 1],
+        "boundary_allowed": allowed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20, help="лимит в секунду")
+    args = parser.parse_args()
+
+    results = [
+        await run_case("fixed window", fixed_window, args),
+        await run_case("GCRA", gcra, args),
+    ]
+
+    header = (
+        f"{'limiter':<13} {'checks':>8} {'checks/s':>10} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'boundary':>9}"
+    )
+    print(
+        f"clients={args.clients} requests={args.requests} "
+        f"limit={args.limit}/second (boundary: allowed in 200 ms around the edge)"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<13} {r['checks']:>8} {r['rps']:>10.0f} "
+            f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['boundary_allowed']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
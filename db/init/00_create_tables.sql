@@ -22,6 +22,7 @@ CREATE TABLE IF NOT EXISTS users (
     balance NUMERIC(12,2) DEFAULT 0.00,
     is_active BOOLEAN DEFAULT true,
     is_verified BOOLEAN DEFAULT false,
+    role_version INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
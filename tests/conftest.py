@@ -3,11 +3,13 @@
 """
 
 import asyncio
+import contextlib
 from typing import AsyncGenerator, Generator
 
 import fakeredis.aioredis as fakeredis
 import pytest
 import pytest_asyncio
+import redis
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
@@ -15,6 +17,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app.core.config import settings
 from app.core.database import Base, get_db
 from app.core.security import get_password_hash
 from app.main import app
@@ -25,6 +28,14 @@ from app.models.role import Role
 from app.models.user import User
 from app.models.user_role import UserRole
 
+# Отдельная база Redis для тестов: client очищает ее перед каждым тестом,
+# поэтому Redis из .env (возможно, общий) тестам не передается
+if settings.TEST_REDIS_URL == type(settings)().REDIS_URL:
+    raise pytest.UsageError(
+        "TEST_REDIS_URL совпадает с REDIS_URL: тесты очистили бы рабочую базу Redis"
+    )
+settings.REDIS_URL = settings.TEST_REDIS_URL
+
 # Настройка тестовой базы данных в памяти
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///:memory:"
 
@@ -87,19 +98,27 @@ def override_get_db(db_session: Session):
 
 
 @pytest.fixture(scope="function")
-def test_app(override_get_db, override_get_redis, override_get_limiter):
+def test_app(override_get_db, override_get_redis):
     """Создание тестового приложения"""
     from app.services.cache import get_redis
-    from app.core.limiter import get_limiter
     from app.main import create_application
     
     # Создаем новое приложение для тестов без инициализации внешних сервисов
     test_app = create_application()
+
+    # Прогрев читает рабочую БД через SessionLocal, а не тестовую
+    settings.CACHE_WARMUP_ENABLED = False
+
+    # Кэш ответов включают только его собственные тесты: остальные проверяют
+    # поведение эндпоинтов и декоратора @cache за ним
+    settings.RESPONSE_CACHE_ENABLED = False
+
+    # Справочники читаются из тестовой БД сессией запроса
+    settings.REFERENCE_DATA_PRELOAD = False
     
     # Переопределяем зависимости
     test_app.dependency_overrides[get_db] = override_get_db
     test_app.dependency_overrides[get_redis] = override_get_redis
-    test_app.dependency_overrides[get_limiter] = override_get_limiter
     
     yield test_app
     test_app.dependency_overrides.clear()
@@ -108,6 +127,18 @@ def test_app(override_get_db, override_get_redis, override_get_limiter):
 @pytest.fixture(scope="function")
 def client(test_app: FastAPI) -> Generator[TestClient, None, None]:
     """Создание синхронного тестового клиента"""
+    from app.core.limiter import approximate_limiter
+    from app.services.local_cache import local_cache
+    from app.services.reference_data import reference_data
+
+    # Кэш живет дольше теста, а тестовая БД пересоздается; квоты rate limiting
+    # (в Redis и в локальных корзинах) у каждого теста свои
+    local_cache.clear()
+    reference_data.reset()
+    approximate_limiter.reset()
+    with contextlib.suppress(redis.ConnectionError):
+        redis.Redis.from_url(settings.TEST_REDIS_URL).flushdb()
+
     with TestClient(test_app) as test_client:
         yield test_client
 
@@ -134,24 +165,6 @@ def override_get_redis(fake_redis):
     
     return _override_get_redis
 
-@pytest.fixture(scope="function")
-def override_get_limiter():
-    """Переопределение зависимости get_limiter для тестов"""
-    
-    async def _override_get_limiter():
-        # Возвращаем заглушку вместо rate limiter
-        class MockRateLimiter:
-            def __init__(self):
-                pass
-            
-            async def __call__(self, request):
-                return True  # Всегда разрешаем
-        
-        return MockRateLimiter()
-    
-    return _override_get_limiter
-
-
 @pytest.fixture(scope="function")
 def test_user(db_session: Session) -> User:
     """Создание тестового пользователя"""
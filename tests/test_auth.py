@@ -226,3 +226,305 @@ class TestRoleBasedAccess:
         data = response.json()
         assert isinstance(data, list)
         assert len(data) >= 1  # Должен быть хотя бы тестовый пользователь
+
+
+    @pytest.mark.admin
+    def test_login_token_carries_role_claims(
+        self, client: TestClient, admin_token: str
+    ):
+        """Токен входа содержит роли и их версию"""
+        from app.core.security import verify_token
+
+        payload = verify_token(admin_token)
+        assert payload["roles"] == ["admin"]
+        assert payload["rv"] > 0
+
+    @pytest.mark.admin
+    def test_role_check_runs_without_db_queries(
+        self, client: TestClient, db_session: Session, admin_headers: dict
+    ):
+        """Проверка роли по токену не обращается к БД"""
+        from sqlalchemy import event
+
+        test_engine = db_session.get_bind()
+        executed = []
+
+        def count(conn, cursor, statement, *args):
+            executed.append(statement)
+
+        event.listen(test_engine, "before_cursor_execute", count)
+        try:
+            response = client.get("/api/v1/admin/cache/stats", headers=admin_headers)
+        finally:
+            event.remove(test_engine, "before_cursor_execute", count)
+
+        assert response.status_code == 200
+        assert executed == []
+
+    @pytest.mark.admin
+    def test_role_change_rejects_issued_tokens(
+        self,
+        client: TestClient,
+        db_session: Session,
+        admin_headers: dict,
+        auth_headers: dict,
+        test_user: User,
+    ):
+        """После назначения и отзыва роли старые токены отклоняются"""
+        from app.models.role import Role
+
+        admin_role = db_session.query(Role).filter(Role.name == "admin").one()
+        assignment = {"user_id": test_user.id, "role_id": admin_role.id}
+        url = "/api/v1/admin/protected-route"
+
+        response = client.post(
+            "/api/v1/roles/roles/assign", json=assignment, headers=admin_headers
+        )
+        assert response.status_code == 201
+        assert client.get(url, headers=auth_headers).status_code == 401
+
+        login = client.post(
+            "/api/v1/auth/login",
+            data={"username": test_user.email, "password": "testpass123"},
+        )
+        fresh_headers = {"Authorization": f"bearer {login.json()['access_token']}"}
+        assert client.get(url, headers=fresh_headers).status_code == 200
+
+        response = client.request(
+            "DELETE",
+            "/api/v1/roles/roles/revoke",
+            json=assignment,
+            headers=admin_headers,
+        )
+        assert response.status_code == 204
+        assert client.get(url, headers=fresh_headers).status_code == 401
+
+    @pytest.mark.admin
+    def test_evicted_role_version_is_reloaded_from_db(
+        self, client: TestClient, admin_headers: dict, test_admin: User
+    ):
+        """Вытесненная из Redis версия ролей читается из БД, токен принимается"""
+        import redis
+
+        from app.core.config import settings
+        from app.services.local_cache import local_cache
+        from app.services.principal import role_version_key
+
+        key = role_version_key(test_admin.id)
+        redis.Redis.from_url(settings.TEST_REDIS_URL).delete(key)
+        local_cache.delete(key)
+
+        response = client.get("/api/v1/admin/protected-route", headers=admin_headers)
+
+        assert response.status_code == 200
+
+    @pytest.mark.admin
+    def test_revoke_rolled_back_when_role_version_reset_fails(
+        self,
+        client: TestClient,
+        db_session: Session,
+        admin_headers: dict,
+        test_admin: User,
+        test_user: User,
+        monkeypatch,
+    ):
+        """Без сброса копии версии в Redis отзыв роли откатывается с 503"""
+        from app.models.role import Role
+        from app.models.user_role import UserRole
+        from app.services import principal
+        from app.services.cache import CacheUnavailableError
+
+        admin_role = db_session.query(Role).filter(Role.name == "admin").one()
+        assignment = {"user_id": test_user.id, "role_id": admin_role.id}
+        response = client.post(
+            "/api/v1/roles/roles/assign", json=assignment, headers=admin_headers
+        )
+        assert response.status_code == 201
+        version = principal.load_role_version(db_session, test_user.id)
+
+        async def unavailable(key, required=False):
+            raise CacheUnavailableError("connection refused")
+
+        monkeypatch.setattr(principal, "delete_cache", unavailable)
+        response = client.request(
+            "DELETE",
+            "/api/v1/roles/roles/revoke",
+            json=assignment,
+            headers=admin_headers,
+        )
+
+        assert response.status_code == 503
+        assert principal.load_role_version(db_session, test_user.id) == version
+        assert (
+            db_session.query(UserRole)
+            .filter(
+                UserRole.user_id == test_user.id,
+                UserRole.role_id == admin_role.id,
+            )
+            .count()
+            == 1
+        )
+
+
+class TestPasswordHashing:
+    """Тесты сервиса хеширования паролей"""
+
+    @pytest.mark.auth
+    @pytest.mark.asyncio
+    async def test_hash_and_verify_in_process_pool(self):
+        """bcrypt выполняется в пуле процессов, задержка учитывается"""
+        from app.core.security import PasswordHasher
+
+        hasher = PasswordHasher(workers=1, queue_size=1)
+        try:
+            hashed = await hasher.hash("secret-password")
+
+            assert await hasher.verify("secret-password", hashed)
+            assert not await hasher.verify("wrong-password", hashed)
+        finally:
+            hasher.shutdown()
+        assert hasher.stats.completed == 3
+        assert hasher.latency["verify"].count == 2
+        assert hasher.in_flight == 0
+
+    @pytest.mark.auth
+    @pytest.mark.asyncio
+    async def test_full_queue_rejected_with_retry_after(self):
+        """Сверх очереди операции сразу получают 503 с Retry-After"""
+        import asyncio
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        from app.core.security import PasswordHasher, PasswordHashingBusyError
+
+        release = threading.Event()
+        hasher = PasswordHasher(
+            workers=1,
+            queue_size=1,
+            executor_factory=lambda: ThreadPoolExecutor(max_workers=1),
+        )
+
+        async def blocked(value):
+            return await hasher._run("hash", lambda: release.wait(5) and value)
+
+        running = asyncio.create_task(blocked("first"))
+        queued = asyncio.create_task(blocked("second"))
+        await asyncio.sleep(0.05)
+        assert hasher.in_flight == 2
+        assert hasher.queue_depth == 1
+
+        with pytest.raises(PasswordHashingBusyError) as error:
+            await hasher.hash("third")
+
+        release.set()
+        assert await running == "first"
+        assert await queued == "second"
+        hasher.shutdown()
+        assert error.value.status_code == 503
+        assert int(error.value.headers["Retry-After"]) >= 1
+        assert hasher.stats.rejected == 1
+
+    @pytest.mark.auth
+    def test_login_rejected_when_hashing_saturated(
+        self, client: TestClient, test_user: User, monkeypatch
+    ):
+        """Вход при заполненной очереди - 503, а не 500"""
+        from app.core import security
+
+        monkeypatch.setattr(security.password_hasher, "queue_size", 0)
+        monkeypatch.setattr(
+            security.password_hasher, "in_flight", security.password_hasher.workers
+        )
+
+        response = client.post(
+            "/api/v1/auth/login",
+            data={"username": test_user.email, "password": "testpass123"},
+        )
+
+        assert response.status_code == 503
+        assert "retry-after" in response.headers
+
+
+class TestRoleResolution:
+    """Тесты разрешения ролей одним запросом"""
+
+    @pytest.fixture
+    def statements(self, db_session):
+        """Счетчик SQL-запросов к тестовой БД"""
+        from sqlalchemy import event
+
+        test_engine = db_session.get_bind()
+        executed = []
+
+        def count(conn, cursor, statement, *args):
+            executed.append(statement)
+
+        event.listen(test_engine, "before_cursor_execute", count)
+        yield executed
+        event.remove(test_engine, "before_cursor_execute", count)
+
+    @pytest.fixture
+    def user_with_roles(self, db_session: Session, test_user: User) -> User:
+        """Пользователь с тремя активными и одной неактивной ролью"""
+        from app.models.role import Role
+        from app.models.user_role import UserRole
+
+        for name, is_active in [
+            ("editor", True),
+            ("moderator", True),
+            ("support", True),
+            ("legacy", False),
+        ]:
+            role = Role(name=name, is_active=is_active)
+            db_session.add(role)
+            db_session.flush()
+            db_session.add(UserRole(user_id=test_user.id, role_id=role.id))
+        db_session.commit()
+        return test_user
+
+    def test_role_names_use_single_query(
+        self, db_session: Session, user_with_roles: User, statements: list
+    ):
+        """Имена ролей читаются одним запросом независимо от их числа"""
+        from app.services.roles import get_user_role_names
+
+        user_id = user_with_roles.id
+        statements.clear()
+        names = get_user_role_names(db_session, user_id)
+
+        assert names == ("editor", "moderator", "support")
+        assert len(statements) == 1
+
+    def test_principal_loads_with_two_queries(
+        self, db_session: Session, user_with_roles: User, statements: list
+    ):
+        """Снимок пользователя: запрос пользователя и один запрос ролей"""
+        from app.services.principal import load_principal
+
+        email = user_with_roles.email
+        statements.clear()
+        principal = load_principal(db_session, email)
+
+        assert set(principal.roles) == {"editor", "moderator", "support"}
+        assert len(statements) == 2
+
+    @pytest.mark.admin
+    def test_user_roles_endpoint_has_no_n_plus_one(
+        self,
+        client: TestClient,
+        admin_headers: dict,
+        user_with_roles: User,
+        statements: list,
+    ):
+        """Список ролей пользователя: запросов не больше, чем без ролей"""
+        url = f"/api/v1/roles/roles/user/{user_with_roles.id}"
+        statements.clear()
+        response = client.get(url, headers=admin_headers)
+
+        assert response.status_code == 200
+        assert [role["name"] for role in response.json()] == [
+            "editor",
+            "moderator",
+            "support",
+        ]
+        assert len([s for s in statements if "roles" in s]) == 1
@@ -22,6 +22,14 @@ def test_health_check(client: TestClient):
     assert response.json()["status"] == "healthy"
 
 
+def test_metrics_exposed():
+    """Тест экспозиции метрик в формате Prometheus"""
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE neuro_store_cache_hits_total counter" in response.text
+
+
 def test_docs_available(client: TestClient):
     """Тест доступности документации"""
     response = client.get("/docs")
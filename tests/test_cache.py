@@ -0,0 +1,1526 @@
+"""
+Тесты сервиса кэширования Neuro Store
+"""
+
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.core import redis_pool
+from app.core.config import settings
+from app.core.metrics import render_metrics
+from app.core.security import create_access_token
+from app.services import (
+    cache,
+    cache_codec,
+    cache_metrics,
+    local_cache,
+    reference_data,
+    response_cache,
+)
+from app.services.cache_bus import InvalidationBus
+from app.services.local_cache import LocalCache
+
+
+@pytest_asyncio.fixture(scope="function")
+async def cache_redis(fake_redis, monkeypatch):
+    """Подмена Redis клиента сервиса кэширования на чистый fake Redis"""
+    await fake_redis.flushall()
+    local_cache.local_cache.clear()
+    monkeypatch.setattr(cache, "redis_client", fake_redis)
+    monkeypatch.setattr(cache, "cache_stats", cache.CacheStats())
+    cache_metrics.cache_metrics.reset()
+    return fake_redis
+
+
+class TestPatternInvalidation:
+    """Тесты инкрементальной инвалидации по паттерну"""
+
+    @pytest.mark.asyncio
+    async def test_scan_delete_pattern_removes_only_matching(self, cache_redis):
+        """SCAN + UNLINK удаляет только ключи по паттерну"""
+        for i in range(25):
+            await cache_redis.set(f"products:page={i}", "x")
+        await cache_redis.set("tenant:1:products", "foreign")
+
+        report = await cache.scan_delete_pattern("products:*")
+
+        assert report.deleted == 25
+        assert report.matched == 25
+        assert await cache_redis.exists("tenant:1:products") == 1
+        assert await cache_redis.keys("products:*") == []
+
+    @pytest.mark.asyncio
+    async def test_scan_delete_pattern_reports_progress(self, cache_redis):
+        """Обход идет ограниченными пачками, прогресс сообщается после каждой"""
+        for i in range(30):
+            await cache_redis.set(f"product_plans:{i}", "x")
+
+        seen = []
+
+        async def on_progress(report: cache.InvalidationReport) -> None:
+            seen.append(report.deleted)
+
+        report = await cache.scan_delete_pattern(
+            "product_plans:*", batch_size=5, progress=on_progress
+        )
+
+        assert report.batches > 1
+        assert len(seen) == report.batches
+        assert seen == sorted(seen)
+        assert seen[-1] == report.deleted > 0
+
+
+class TestTagInvalidation:
+    """Тесты инвалидации по тегам"""
+
+    @pytest.mark.asyncio
+    async def test_set_cache_records_tag_membership(self, cache_redis):
+        """Запись с тегами добавляет ключ в индекс каждого тега"""
+        await cache.set_cache("products:a", "1", 60, tags=["catalog", "product:1"])
+
+        assert await cache_redis.zrange(cache.tag_key("catalog"), 0, -1) == [
+            b"products:a"
+        ]
+        assert await cache_redis.zrange(cache.tag_key("product:1"), 0, -1) == [
+            b"products:a"
+        ]
+        assert 0 < await cache_redis.ttl(cache.tag_key("catalog")) <= 60
+
+    @pytest.mark.asyncio
+    async def test_tag_ttl_covers_longest_member(self, cache_redis):
+        """Индекс тега не истекает раньше самого долгоживущего ключа"""
+        await cache.set_cache("product_plans:1", "1", 600, tags=["catalog"])
+        await cache.set_cache("products:a", "1", 60, tags=["catalog"])
+
+        assert await cache_redis.ttl(cache.tag_key("catalog")) > 60
+
+    @pytest.mark.asyncio
+    async def test_tag_index_drops_expired_keys(self, cache_redis, monkeypatch):
+        """Индекс часто обновляемого тега не растет из-за истекших ключей"""
+        import time
+
+        now = [time.time()]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+
+        for i in range(50):
+            await cache.set_cache(f"products:{i}", "1", 60, tags=["plans"])
+            now[0] += 60 + cache.TAG_PRUNE_GRACE_SECONDS + 1
+
+        await cache.set_cache("products:live", "1", 600, tags=["plans"])
+        assert await cache_redis.zrange(cache.tag_key("plans"), 0, -1) == [
+            b"products:live"
+        ]
+        assert await cache_redis.ttl(cache.tag_key("plans")) > 0
+
+    @pytest.mark.asyncio
+    async def test_invalidate_tags_deletes_only_members(self, cache_redis):
+        """Инвалидация тега удаляет ровно его ключи и сам индекс"""
+        await cache.set_cache("product_plans:1", "1", 60, tags=["product:1"])
+        await cache.set_cache("product_plans:2", "2", 60, tags=["product:2"])
+        await cache_redis.set("analytics:top_products", "foreign")
+
+        deleted = await cache.invalidate_tags("product:1")
+
+        assert deleted == 1
+        assert await cache_redis.exists("product_plans:1") == 0
+        assert await cache_redis.exists(cache.tag_key("product:1")) == 0
+        assert await cache_redis.exists("product_plans:2") == 1
+        assert await cache_redis.exists("analytics:top_products") == 1
+
+    @pytest.mark.asyncio
+    async def test_decorator_renders_tag_templates(self, cache_redis):
+        """Шаблоны тегов декоратора заполняются аргументами вызова"""
+
+        @cache.cache(ttl=60, key_prefix="plans_test", tags=["plans", "product:{pid}"])
+        async def load_plans(pid: int):
+            return [{"id": pid}]
+
+        await load_plans(pid=7)
+
+        assert await cache_redis.zcard(cache.tag_key("product:7")) == 1
+        assert await cache_redis.exists(cache.tag_key("plans")) == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_plans_cache_uses_product_tag(self, cache_redis):
+        """Инвалидация планов продукта не задевает планы других продуктов"""
+        await cache.set_cache("product_plans:1", "x", 60, tags=["plans", "product:1"])
+        await cache.set_cache("product_plans:2", "x", 60, tags=["plans", "product:2"])
+
+        await cache.invalidate_plans_cache(1)
+
+        assert await cache_redis.exists("product_plans:1") == 0
+        assert await cache_redis.exists("product_plans:2") == 1
+
+
+class TestNamespaces:
+    """Тесты пространств имен с поколениями"""
+
+    @pytest.mark.asyncio
+    async def test_bump_is_single_incr_and_changes_keys(self, cache_redis):
+        """Инвалидация каталога - один INCR, старые ключи больше не читаются"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="ns_products", namespace="catalog")
+        async def load():
+            calls.append(1)
+            return {"version": len(calls)}
+
+        await cache_redis.set("analytics:top_products", "foreign")
+        assert await load() == {"version": 1}
+        assert await load() == {"version": 1}
+        keys_before = await cache_redis.keys("ns_products:*")
+
+        await cache.invalidate_products_cache()
+
+        assert await load() == {"version": 2}
+        # Физически ничего не удалено: старое поколение уйдет по TTL
+        assert set(keys_before) < set(await cache_redis.keys("ns_products:*"))
+        assert await cache_redis.exists("analytics:top_products") == 1
+
+    @pytest.mark.asyncio
+    async def test_generation_survives_counter_eviction(self, cache_redis):
+        """После вытеснения счетчика поколение не откатывается назад"""
+        first = await cache.bump_namespace("catalog")
+        await cache_redis.delete(cache.namespace_key("catalog"))
+        local_cache.local_cache.clear()
+
+        assert await cache.namespace_generation("catalog") > first
+        assert await cache.bump_namespace("catalog") > first
+
+    @pytest.mark.asyncio
+    async def test_generation_cached_in_l1_and_dropped_on_bump(self, cache_redis):
+        """Горячее поколение читается из L1, а bump сбрасывает копию"""
+        for _ in range(3):
+            generation = await cache.namespace_generation("catalog")
+
+        key = cache.namespace_key("catalog")
+        assert local_cache.local_cache.get(key) == (True, generation)
+
+        bumped = await cache.bump_namespace("catalog")
+
+        assert local_cache.local_cache.get(key) == (False, None)
+        assert await cache.namespace_generation("catalog") == bumped
+
+
+class TestLocalCache:
+    """Тесты L1 кэша в памяти процесса"""
+
+    def test_promotes_only_hot_keys(self):
+        """Ключ допускается в L1 только после нескольких обращений"""
+        l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=2)
+
+        l1.get("k")
+        assert l1.set("k", 1, size=10, ttl=60) is False
+
+        l1.get("k")
+        assert l1.set("k", 1, size=10, ttl=60) is True
+        assert l1.get("k") == (True, 1)
+
+    def test_expired_entries_are_misses(self, monkeypatch):
+        """Запись с истекшим TTL не возвращается"""
+        now = [1000.0]
+        monkeypatch.setattr(local_cache.time, "monotonic", lambda: now[0])
+        l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+
+        l1.set("k", 1, size=10, ttl=5)
+        now[0] += 6
+
+        assert l1.get("k") == (False, None)
+        assert len(l1) == 0
+
+    def test_tinylfu_rejects_cold_candidate(self):
+        """Холодный кандидат не вытесняет популярную запись"""
+        l1 = LocalCache(max_items=1, max_bytes=1024, promote_after=0)
+        for _ in range(5):
+            l1.get("hot")
+        l1.set("hot", "h", size=10, ttl=60)
+
+        assert l1.set("cold", "c", size=10, ttl=60) is False
+        assert l1.get("hot") == (True, "h")
+        assert l1.stats.rejections == 1
+
+    def test_byte_budget_evicts_lru(self):
+        """При нехватке байт вытесняются самые давние записи"""
+        l1 = LocalCache(max_items=10, max_bytes=100, promote_after=0)
+        l1.set("a", "a", size=60, ttl=60)
+        for _ in range(3):
+            l1.get("b")
+
+        assert l1.set("b", "b", size=60, ttl=60) is True
+        assert l1.get("a") == (False, None)
+        assert l1.size_bytes == 60
+
+    def test_invalidate_tags(self):
+        """Инвалидация тега удаляет помеченные записи"""
+        l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+        l1.set("a", 1, size=1, ttl=60, tags=["product:1"])
+        l1.set("b", 2, size=1, ttl=60, tags=["product:2"])
+
+        assert l1.invalidate_tags(["product:1"]) == 1
+        assert l1.get("a") == (False, None)
+        assert l1.get("b") == (True, 2)
+
+    @pytest.mark.asyncio
+    async def test_decorator_serves_hot_key_from_l1(self, cache_redis, monkeypatch):
+        """Горячий ключ отдается из L1 без обращения к Redis"""
+        monkeypatch.setitem(local_cache.l1_prefix_ttls, "l1_test", 30)
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="l1_test", tags=["catalog"])
+        async def load(item_id: int):
+            calls.append(item_id)
+            return {"id": item_id}
+
+        for _ in range(3):
+            assert await load(item_id=1) == {"id": 1}
+
+        # Запись в Redis пропала, но L1 продолжает отвечать
+        await cache_redis.flushall()
+        assert await load(item_id=1) == {"id": 1}
+        assert calls == [1]
+
+        await cache.invalidate_tags("catalog")
+        assert await load(item_id=1) == {"id": 1}
+        assert calls == [1, 1]
+
+
+class TestInvalidationBus:
+    """Тесты шины инвалидации L1 между воркерами"""
+
+    @staticmethod
+    def _message(origin: str, seq: int, **fields) -> str:
+        return json.dumps({"origin": origin, "seq": seq, **fields})
+
+    def test_applies_remote_tags_and_ignores_own_messages(self):
+        """Чужие инвалидации применяются, собственные пропускаются"""
+        l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+        bus = InvalidationBus(l1, "test")
+        l1.set("a", 1, size=1, ttl=60, tags=["catalog"])
+        l1.set("b", 2, size=1, ttl=60)
+
+        bus.handle_message(self._message(bus.origin, 1, tags=["catalog"]))
+        assert l1.get("a") == (True, 1)
+
+        bus.handle_message(self._message("worker-2", 1, tags=["catalog"]))
+        assert l1.get("a") == (False, None)
+        assert l1.get("b") == (True, 2)
+
+    def test_sequence_gap_flushes_everything(self):
+        """Пропущенный номер сообщения приводит к полной очистке L1"""
+        l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+        bus = InvalidationBus(l1, "test")
+
+        bus.handle_message(self._message("worker-2", 1, keys=["x"]))
+        l1.set("a", 1, size=1, ttl=60)
+        bus.handle_message(self._message("worker-2", 3, keys=["x"]))
+
+        assert len(l1) == 0
+        assert bus.stats.gaps == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidation_reaches_other_worker(self, cache_redis):
+        """Инвалидация в одном воркере очищает L1 другого через pub/sub"""
+        publisher_l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+        subscriber_l1 = LocalCache(max_items=10, max_bytes=1024, promote_after=0)
+        publisher = InvalidationBus(publisher_l1, "test:bus")
+        subscriber = InvalidationBus(subscriber_l1, "test:bus")
+
+        await publisher.start(cache_redis)
+        await subscriber.start(cache_redis)
+        try:
+            for _ in range(50):
+                if subscriber.stats.full_flushes:
+                    break
+                await asyncio.sleep(0.01)
+
+            subscriber_l1.set("products:a", 1, size=1, ttl=60, tags=["catalog"])
+            await publisher.publish(tags=["catalog"])
+
+            for _ in range(50):
+                if not len(subscriber_l1):
+                    break
+                await asyncio.sleep(0.01)
+
+            assert len(subscriber_l1) == 0
+            assert subscriber.stats.received == 1
+        finally:
+            await publisher.stop()
+            await subscriber.stop()
+
+    @pytest.mark.asyncio
+    async def test_l1_dropped_after_redis_delete(self, cache_redis, monkeypatch):
+        """L1 и шина сбрасываются только после удаления из Redis"""
+        events = []
+        published = []
+
+        async def publish(**fields):
+            published.append(fields)
+            events.append("publish")
+
+        monkeypatch.setattr(cache.invalidation_bus, "publish", publish)
+        real_l1_delete = local_cache.local_cache.delete
+        real_delete = cache_redis.delete
+
+        def l1_delete(key):
+            events.append("l1")
+            return real_l1_delete(key)
+
+        async def delete(*keys):
+            events.append("redis")
+            return await real_delete(*keys)
+
+        monkeypatch.setattr(local_cache.local_cache, "delete", l1_delete)
+        monkeypatch.setattr(cache_redis, "delete", delete)
+        await cache_redis.set("item:1", b"old")
+
+        assert await cache.delete_cache("item:1") is True
+        assert events == ["redis", "l1", "publish"]
+
+        # Паттерн: рассылка только после обхода всего keyspace
+        for i in range(5):
+            await cache_redis.set(f"page:{i}", "x")
+
+        def progress(report):
+            assert len(published) == 1
+
+        await cache.scan_delete_pattern("page:*", batch_size=2, progress=progress)
+        assert published[-1]["patterns"] == ["page:*"]
+
+
+class TestCodec:
+    """Тесты кодеков значений кэша"""
+
+    VALUE = {"items": [{"id": i, "name": f"Продукт {i}"} for i in range(100)]}
+
+    @pytest.mark.parametrize("serializer", sorted(cache_codec.SERIALIZERS))
+    @pytest.mark.parametrize("compressor", sorted(cache_codec.COMPRESSORS))
+    def test_roundtrip(self, serializer, compressor):
+        """Каждая комбинация сериализатора и сжатия читается обратно"""
+        codec = cache_codec.CacheCodec(
+            cache_codec.SERIALIZERS[serializer],
+            cache_codec.COMPRESSORS[compressor],
+            compress_threshold=64,
+        )
+
+        payload = codec.encode(self.VALUE)
+
+        assert payload[0] & cache_codec.HEADER_FLAG
+        assert codec.decode(payload) == self.VALUE
+
+    def test_compresses_only_above_threshold(self):
+        """Маленькие значения не сжимаются, большие - сжимаются"""
+        codec = cache_codec.CacheCodec(
+            cache_codec.SERIALIZERS[0],
+            cache_codec.COMPRESSORS[1],
+            compress_threshold=1024,
+        )
+
+        small = codec.encode({"id": 1})
+        large = codec.encode(self.VALUE)
+
+        assert (small[0] >> 4) & 0x07 == 0
+        assert (large[0] >> 4) & 0x07 == 1
+        assert len(large) < len(json.dumps(self.VALUE))
+
+    def test_reads_entries_of_other_codecs_and_legacy_json(self):
+        """Запись читается по заголовку, независимо от текущих настроек"""
+        writer = cache_codec.CacheCodec(
+            cache_codec.SERIALIZERS[0], cache_codec.COMPRESSORS[1], 0
+        )
+        reader = cache_codec.CacheCodec(
+            cache_codec.SERIALIZERS[max(cache_codec.SERIALIZERS)],
+            cache_codec.COMPRESSORS[0],
+            1024,
+        )
+
+        assert reader.decode(writer.encode(self.VALUE)) == self.VALUE
+        assert reader.decode(json.dumps(self.VALUE).encode()) == self.VALUE
+
+    def test_unknown_header_is_codec_error(self):
+        """Неизвестный кодек в заголовке - ошибка декодирования, а не падение"""
+        with pytest.raises(cache_codec.CodecError):
+            cache_codec.codec.decode(bytes((0x8F,)) + b"data")
+
+    @pytest.mark.asyncio
+    async def test_decorator_stores_binary_entries(self, cache_redis):
+        """Декоратор пишет в Redis бинарную запись с заголовком"""
+
+        @cache.cache(ttl=60, key_prefix="binary")
+        async def load():
+            return self.VALUE
+
+        assert await load() == self.VALUE
+
+        payload = await cache_redis.get(cache.generate_cache_key("binary"))
+        assert payload[0] & cache_codec.HEADER_FLAG
+        assert await load() == self.VALUE
+        assert cache.cache_stats.hits == 1
+
+
+class TestKeyDerivation:
+    """Тесты построения ключа по сигнатуре эндпоинта"""
+
+    @pytest.mark.asyncio
+    async def test_dependencies_are_not_part_of_key(self, cache_redis):
+        """Зависимости FastAPI не попадают в ключ, параметры нормализуются"""
+        from fastapi import Depends, Request
+        from sqlalchemy.orm import Session
+
+        calls = []
+
+        def get_limiter():
+            return object()
+
+        @cache.cache(ttl=60, key_prefix="endpoint")
+        async def endpoint(
+            request: Request = None,
+            skip: int = 0,
+            category: str = None,
+            db: Session = None,
+            limiter=Depends(get_limiter),
+        ):
+            calls.append(skip)
+            return [{"skip": skip, "category": category}]
+
+        await endpoint(request=object(), db=object(), limiter=object())
+        await endpoint(0, db=object(), limiter=object())
+        await endpoint(request=object(), skip=0, category=None, db=object())
+
+        assert calls == [0]
+        assert await cache_redis.exists(cache.generate_cache_key("endpoint", skip=0))
+
+    @pytest.mark.asyncio
+    async def test_orm_results_cached_as_response_model(self, cache_redis):
+        """С response_model кэшируются сериализованные данные, а не объекты"""
+        from pydantic import BaseModel, ConfigDict
+
+        class Row:
+            def __init__(self, id, name):
+                self.id = id
+                self.name = name
+
+        class RowResponse(BaseModel):
+            id: int
+            name: str
+
+            model_config = ConfigDict(from_attributes=True)
+
+        @cache.cache(ttl=60, key_prefix="rows", response_model=list[RowResponse])
+        async def rows():
+            return [Row(1, "first")]
+
+        assert await rows() == [{"id": 1, "name": "first"}]
+
+        payload = await cache_redis.get(cache.generate_cache_key("rows"))
+        assert cache._unpack_entry(payload)[0] == [{"id": 1, "name": "first"}]
+
+
+class TestNegativeCaching:
+    """Тесты кэширования ответов 404"""
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_cached_as_tombstone(self, cache_redis):
+        """404 кэшируется с коротким TTL и повторно выбрасывается из кэша"""
+        from fastapi import HTTPException
+
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="item", tags=["item:{item_id}"], negative_ttl=5)
+        def load(item_id: int):
+            calls.append(item_id)
+            raise HTTPException(status_code=404, detail="Не найден")
+
+        for _ in range(3):
+            with pytest.raises(HTTPException) as exc_info:
+                await load(item_id=7)
+            assert exc_info.value.status_code == 404
+            assert exc_info.value.detail == "Не найден"
+
+        assert calls == [7]
+        assert cache.cache_stats.negative_hits == 2
+        key = cache.generate_cache_key("item", item_id=7)
+        assert 0 < await cache_redis.ttl(key) <= 5
+
+        await cache.invalidate_tags("item:7")
+        with pytest.raises(HTTPException):
+            await load(item_id=7)
+        assert calls == [7, 7]
+
+    @pytest.mark.asyncio
+    async def test_other_errors_are_not_cached(self, cache_redis):
+        """Прочие ошибки не кэшируются"""
+        from fastapi import HTTPException
+
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="broken", negative_ttl=5)
+        async def load(item_id: int):
+            calls.append(item_id)
+            raise HTTPException(status_code=500, detail="Ошибка")
+
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await load(item_id=1)
+
+        assert calls == [1, 1]
+
+    @pytest.mark.asyncio
+    async def test_sync_function_runs_in_threadpool(self, cache_redis):
+        """Синхронная функция выполняется вне event loop"""
+        import threading
+
+        threads = []
+
+        @cache.cache(ttl=60, key_prefix="sync")
+        def load(item_id: int):
+            threads.append(threading.current_thread())
+            return {"id": item_id}
+
+        assert await load(item_id=1) == {"id": 1}
+        assert await load(item_id=1) == {"id": 1}
+        assert threads != [threading.current_thread()]
+        assert len(threads) == 1
+
+
+class TestSingleFlight:
+    """Тесты объединения одновременных промахов"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_run_function_once(self, cache_redis):
+        """Одновременные промахи в процессе выполняют функцию один раз"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="stampede")
+        async def load(item_id: int):
+            calls.append(item_id)
+            await asyncio.sleep(0.05)
+            return {"id": item_id}
+
+        results = await asyncio.gather(*(load(item_id=1) for _ in range(10)))
+
+        assert results == [{"id": 1}] * 10
+        assert calls == [1]
+        assert cache.cache_stats.misses == 1
+        assert cache.cache_stats.coalesced == 9
+
+        await load(item_id=1)
+        assert cache.cache_stats.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_waiters_take_over_when_leader_is_cancelled(self, cache_redis):
+        """Отмена ведущего запроса не отменяет ожидающих: один из них досчитывает"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="leader")
+        async def load(item_id: int):
+            calls.append(item_id)
+            await asyncio.sleep(0.05)
+            return {"id": item_id}
+
+        leader = asyncio.create_task(load(item_id=1))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(load(item_id=1)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+
+        assert leader.cancelled()
+        assert results == [{"id": 1}] * 3
+        assert calls == [1, 1]
+        assert cache.cache_stats.coalesced == 2
+
+    @pytest.mark.asyncio
+    async def test_waits_for_value_computed_by_other_process(self, cache_redis):
+        """Если ключ пересчитывает другой процесс, ждем его результат"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="remote")
+        async def load(item_id: int):
+            calls.append(item_id)
+            return {"id": item_id, "source": "local"}
+
+        key = cache.generate_cache_key("remote", item_id=1)
+        await cache_redis.set(f"{cache.LOCK_KEY_PREFIX}{key}", "other-worker")
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await cache.set_cache(
+                key, cache._pack_entry({"id": 1, "source": "remote"}), 60
+            )
+
+        result, _ = await asyncio.gather(load(item_id=1), other_worker())
+
+        assert result == {"id": 1, "source": "remote"}
+        assert calls == []
+        assert cache.cache_stats.coalesced == 1
+
+    @pytest.mark.asyncio
+    async def test_computes_itself_when_lock_owner_is_silent(
+        self, cache_redis, monkeypatch
+    ):
+        """Если владелец блокировки не записал значение, считаем сами"""
+        monkeypatch.setattr(cache.settings, "CACHE_LOCK_WAIT_MS", 100)
+
+        @cache.cache(ttl=60, key_prefix="orphan")
+        async def load(item_id: int):
+            return {"id": item_id}
+
+        key = cache.generate_cache_key("orphan", item_id=1)
+        await cache_redis.set(f"{cache.LOCK_KEY_PREFIX}{key}", "crashed-worker")
+
+        assert await load(item_id=1) == {"id": 1}
+        assert cache.cache_stats.misses == 1
+
+
+class TestStaleWhileRevalidate:
+    """Тесты отдачи устаревших записей с фоновым обновлением"""
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_served_and_refreshed_once(self, cache_redis):
+        """Устаревшая запись отдается сразу, обновление выполняется один раз"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="swr", stale_ttl=120)
+        async def load(item_id: int):
+            calls.append(item_id)
+            await asyncio.sleep(0.05)
+            return {"id": item_id, "version": len(calls)}
+
+        key = cache.generate_cache_key("swr", item_id=1)
+        stale = cache._pack_entry({"id": 1, "version": 0}, fresh_until=0)
+        await cache.set_cache(key, stale, 60)
+
+        results = await asyncio.gather(*(load(item_id=1) for _ in range(5)))
+
+        assert results == [{"id": 1, "version": 0}] * 5
+        assert cache.cache_stats.stale_hits == 5
+
+        await asyncio.gather(*cache._background_tasks)
+        assert calls == [1]
+        assert cache.cache_stats.refreshes == 1
+        assert await load(item_id=1) == {"id": 1, "version": 1}
+
+    @pytest.mark.asyncio
+    async def test_hard_ttl_includes_stale_window(self, cache_redis, monkeypatch):
+        """Redis хранит запись мягкий TTL с разбросом плюс окно устаревания"""
+        monkeypatch.setattr(cache.settings, "CACHE_TTL_JITTER", 0.5)
+
+        @cache.cache(ttl=100, key_prefix="jitter", stale_ttl=50)
+        async def load(item_id: int):
+            return {"id": item_id}
+
+        ttls = set()
+        for item_id in range(20):
+            await load(item_id=item_id)
+            key = cache.generate_cache_key("jitter", item_id=item_id)
+            ttls.add(await cache_redis.ttl(key))
+
+        assert all(150 <= ttl <= 200 for ttl in ttls)
+        assert len(ttls) > 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_skipped_when_other_process_holds_lock(self, cache_redis):
+        """Если запись обновляет другой процесс, фоновое обновление не запускается"""
+        calls = []
+
+        @cache.cache(ttl=60, key_prefix="swr_locked", stale_ttl=120)
+        async def load(item_id: int):
+            calls.append(item_id)
+            return {"id": item_id}
+
+        key = cache.generate_cache_key("swr_locked", item_id=1)
+        await cache.set_cache(key, cache._pack_entry({"id": 1}, fresh_until=0), 60)
+        await cache_redis.set(f"{cache.LOCK_KEY_PREFIX}{key}", "other-worker")
+
+        assert await load(item_id=1) == {"id": 1}
+        await asyncio.gather(*cache._background_tasks)
+
+        assert calls == []
+        assert cache.cache_stats.refreshes == 0
+
+
+class TestCacheWarmup:
+    """Тесты прогрева кэша каталога"""
+
+    @pytest.mark.asyncio
+    async def test_warms_catalog_and_releases_lock(
+        self, cache_redis, db_session, test_product_plan
+    ):
+        """Прогрев заполняет списки и планы и снимает блокировку по окончании"""
+        from app.services.cache_warmup import WARMUP_LOCK_KEY, warm_cache
+
+        product_id = test_product_plan.product_id
+        report = await warm_cache(lambda: db_session, budget=10)
+        generation = await cache.namespace_generation(cache.CATALOG_NAMESPACE)
+
+        assert report.status == "done"
+        assert report.warmed == 3
+        assert (
+            await cache_redis.exists(
+                cache.generate_cache_key(f"products:v{generation}", skip=0, limit=100),
+                cache.generate_cache_key(
+                    f"products:v{generation}",
+                    skip=0,
+                    limit=100,
+                    category="Тестирование",
+                ),
+                cache.generate_cache_key(
+                    f"product_plans:v{generation}", product_id=product_id
+                ),
+            )
+            == 3
+        )
+        assert not await cache_redis.exists(WARMUP_LOCK_KEY)
+
+    @pytest.mark.asyncio
+    async def test_skips_while_other_worker_warms(self, cache_redis, db_session):
+        """Пока блокировку держит другой воркер, прогрев не запускается"""
+        from app.services.cache_warmup import WARMUP_LOCK_KEY, warm_cache
+
+        await cache_redis.set(WARMUP_LOCK_KEY, "other-worker")
+
+        report = await warm_cache(lambda: db_session, budget=10)
+
+        assert report.status == "locked"
+        assert await cache_redis.get(WARMUP_LOCK_KEY) == b"other-worker"
+
+    @pytest.mark.asyncio
+    async def test_stops_when_budget_is_spent(
+        self, cache_redis, db_session, test_product
+    ):
+        """Исчерпанный бюджет пропускает прогрев, включая запрос списка шагов"""
+        from app.services.cache_warmup import warm_cache
+
+        report = await warm_cache(lambda: db_session, budget=0)
+
+        assert report.status == "budget_exceeded"
+        assert report.warmed == 0
+        assert await cache_redis.keys("products:*") == []
+
+    @pytest.mark.asyncio
+    async def test_blocking_query_is_bounded_by_budget(self, cache_redis, monkeypatch):
+        """Синхронный запрос к БД не держит старт дольше бюджета"""
+        import threading
+        import time
+
+        from app.services import cache_warmup
+
+        release = threading.Event()
+        closed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        class Session:
+            def close(self):
+                loop.call_soon_threadsafe(closed.set)
+
+        def slow_catalog(db):
+            release.wait(5)
+            return []
+
+        monkeypatch.setattr(cache_warmup, "_catalog_steps", slow_catalog)
+
+        started = time.monotonic()
+        report = await cache_warmup.warm_cache(Session, budget=0.1)
+
+        assert time.monotonic() - started < 1
+        assert report.status == "budget_exceeded"
+        assert not closed.is_set()
+
+        # Сессия закрывается, только когда поток запроса доработает
+        release.set()
+        await asyncio.wait_for(closed.wait(), 5)
+
+    @pytest.mark.asyncio
+    async def test_slow_step_is_bounded_by_budget(
+        self, cache_redis, db_session, monkeypatch
+    ):
+        """Медленный шаг прерывается по остатку бюджета"""
+        from app.services import cache_warmup
+
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        async def fast():
+            return None
+
+        monkeypatch.setattr(
+            cache_warmup,
+            "_catalog_steps",
+            lambda db: [("fast", fast), ("slow", slow), ("next", fast)],
+        )
+
+        started = asyncio.get_running_loop().time()
+        report = await cache_warmup.warm_cache(lambda: db_session, budget=0.1)
+
+        assert asyncio.get_running_loop().time() - started < 1
+        assert report.status == "budget_exceeded"
+        assert report.warmed == 1
+        assert report.skipped == 2
+
+        # Не уложившийся шаг не отменяется, а дорабатывает в фоне
+        assert len(cache_warmup._abandoned) == 1
+        release.set()
+        await asyncio.gather(*cache_warmup._abandoned)
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_do_not_block_startup(self, monkeypatch):
+        """Недоступный Redis завершает прогрев со статусом error"""
+        from app.services import cache_warmup
+
+        async def get_redis():
+            raise ConnectionError("Redis недоступен")
+
+        monkeypatch.setattr(cache_warmup, "get_redis", get_redis)
+
+        report = await cache_warmup.warm_cache(budget=1)
+        assert report.status == "error"
+
+
+class TestCacheMetrics:
+    """Тесты метрик кэша по префиксам"""
+
+    @pytest.mark.asyncio
+    async def test_counts_per_prefix(self, cache_redis):
+        """Попадания, промахи, записи и задержки считаются по префиксу ключа"""
+
+        @cache.cache(ttl=60, key_prefix="metered")
+        async def load(item_id: int):
+            return {"id": item_id}
+
+        await load(item_id=1)
+        await load(item_id=1)
+        await cache.get_cache("other:1")
+
+        snapshot = cache_metrics.cache_metrics.snapshot()
+        metered = snapshot["metered"]
+        assert metered["hits"] == 1
+        assert metered["misses"] == 1
+        assert metered["sets"] == 1
+        assert metered["bytes_written"] > 0
+        assert metered["hit_ratio"] == 0.5
+        assert metered["latency_seconds"]["get"]["count"] == 2
+        assert metered["latency_seconds"]["set"]["count"] == 1
+        assert snapshot["other"]["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_are_counted(self, cache_redis, monkeypatch):
+        """Ошибки Redis попадают в счетчик ошибок префикса"""
+
+        async def broken_get(key):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr(cache_redis, "get", broken_get)
+
+        assert await cache.get_cache("metered:1") is None
+        assert cache_metrics.cache_metrics.snapshot()["metered"]["errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_prometheus_exposition(self, cache_redis):
+        """Метрики префиксов попадают в /metrics с метками"""
+        await cache.set_cache("metered:1", b"value", 60)
+
+        text = render_metrics()
+
+        assert 'neuro_store_cache_sets_total{prefix="metered"} 1' in text
+        assert (
+            'neuro_store_cache_redis_latency_seconds_count{prefix="metered",'
+            'operation="set"} 1'
+        ) in text
+        assert 'le="+Inf"' in text
+
+    @pytest.mark.asyncio
+    async def test_memory_analyzer_groups_by_prefix(self, cache_redis, monkeypatch):
+        """Анализатор памяти оценивает байты по префиксам по выборке"""
+        from redis.asyncio.client import Pipeline
+
+        # В fakeredis нет MEMORY USAGE - подменяем его на STRLEN
+        monkeypatch.setattr(
+            Pipeline,
+            "memory_usage",
+            lambda self, key, samples=None: self.execute_command("STRLEN", key),
+        )
+        for i in range(20):
+            await cache_redis.set(f"products:{i}", "x" * 100)
+        for i in range(5):
+            await cache_redis.set(f"product_plans:{i}", "x" * 10)
+
+        report = await cache_metrics.analyze_memory(cache_redis, sample_size=1000)
+
+        assert report.total_keys == 25
+        assert report.sampled > 0
+        assert list(report.prefixes)[0] == "products"
+        products = report.prefixes["products"]
+        assert products["sampled_bytes"] == products["sampled_keys"] * 100
+
+    def test_admin_cache_stats_endpoint(self, client, admin_headers, auth_headers):
+        """Метрики по префиксам доступны только администратору"""
+        client.get("/api/v1/products/")
+
+        response = client.get("/api/v1/admin/cache/stats", headers=admin_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "summary" in data
+        assert data["prefixes"]["products"]["misses"] >= 1
+
+        response = client.get("/api/v1/admin/cache/stats", headers=auth_headers)
+        assert response.status_code == 403
+
+
+class TestBatchCache:
+    """Тесты пакетного API кэша"""
+
+    @pytest.mark.asyncio
+    async def test_get_set_delete_many(self, cache_redis):
+        """Пакетные операции читают и пишут несколько ключей за один round-trip"""
+        await cache.set_many(
+            {"batch:1": b"one", "batch:2": b"two"},
+            ttl=60,
+            tags={"batch:1": ["batch"]},
+        )
+
+        found = await cache.get_many(["batch:1", "batch:2", "batch:3"])
+        assert found == {"batch:1": b"one", "batch:2": b"two"}
+        assert 0 < await cache_redis.ttl("batch:2") <= 60
+        assert await cache_redis.zrange(f"{cache.TAG_KEY_PREFIX}batch", 0, -1) == [
+            b"batch:1"
+        ]
+
+        await cache.delete_many(["batch:1", "batch:2"])
+        assert await cache.get_many(["batch:1", "batch:2"]) == {}
+
+    @pytest.mark.asyncio
+    async def test_loader_receives_only_missing_ids(self, cache_redis, monkeypatch):
+        """Загрузчик получает только недостающие id, запись в Redis - одна"""
+        from sqlalchemy.orm import Session
+
+        calls = []
+
+        @cache.cache_many(ttl=60, key_prefix="item", id_param="item_id")
+        async def load_items(item_ids, db: Session = None):
+            calls.append(sorted(item_ids))
+            return {item_id: {"id": item_id} for item_id in item_ids if item_id < 10}
+
+        assert await load_items([1, 2]) == {1: {"id": 1}, 2: {"id": 2}}
+
+        writes = []
+        original_set_many = cache.set_many
+
+        async def counting_set_many(items, *args, **kwargs):
+            writes.append(sorted(items))
+            return await original_set_many(items, *args, **kwargs)
+
+        monkeypatch.setattr(cache, "set_many", counting_set_many)
+        local_cache.local_cache.clear()
+
+        result = await load_items([3, 1, 42, 2, 3], db=object())
+
+        assert list(result) == [3, 1, 2]
+        assert calls == [[1, 2], [3, 42]]
+        assert writes == [[cache.generate_cache_key("item", item_id=3)]]
+
+    @pytest.mark.asyncio
+    async def test_shares_entries_with_single_key_decorator(self, cache_redis):
+        """Пакетный загрузчик и @cache используют одни и те же ключи"""
+        single_calls = []
+
+        @cache.cache(ttl=60, key_prefix="item", tags=["item:{item_id}"])
+        async def load_item(item_id: int):
+            single_calls.append(item_id)
+            return {"id": item_id}
+
+        @cache.cache_many(
+            ttl=60, key_prefix="item", id_param="item_id", tags=["item:{item_id}"]
+        )
+        async def load_items(item_ids):
+            return {item_id: {"id": item_id} for item_id in item_ids}
+
+        await load_items([1, 2])
+        assert await load_item(item_id=2) == {"id": 2}
+        assert single_calls == []
+
+        await cache.invalidate_tags("item:2")
+        assert await load_item(item_id=2) == {"id": 2}
+        assert single_calls == [2]
+
+
+class TestRedisCircuitBreaker:
+    """Тесты общего пула Redis и выключателя"""
+
+    def test_opens_after_consecutive_failures_and_probes_once(self):
+        """Цепь размыкается после серии ошибок, после cool-down - одна проба"""
+        now = [0.0]
+        breaker = redis_pool.CircuitBreaker(
+            failure_threshold=3, cooldown=10, clock=lambda: now[0]
+        )
+
+        breaker.record_failure()
+        breaker.record_success()
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        assert breaker.is_open
+
+        with pytest.raises(redis_pool.CircuitOpenError):
+            breaker.before_call()
+
+        now[0] = 11
+        breaker.before_call()
+        assert breaker.state == redis_pool.CircuitState.HALF_OPEN
+        with pytest.raises(redis_pool.CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_failure()
+        assert breaker.is_open
+
+        now[0] = 22
+        breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == redis_pool.CircuitState.CLOSED
+        assert breaker.opened == 2
+        assert breaker.rejected == 2
+
+    @pytest.mark.asyncio
+    async def test_client_fails_fast_when_redis_is_down(self):
+        """Клиент перестает ходить в недоступный Redis после серии ошибок"""
+        import redis.asyncio as redis
+
+        breaker = redis_pool.CircuitBreaker(failure_threshold=2, cooldown=60)
+        pool = redis.BlockingConnectionPool.from_url(
+            "redis://127.0.0.1:1/0", socket_connect_timeout=0.5
+        )
+        client = redis_pool.BreakerRedis(connection_pool=pool, breaker=breaker)
+
+        for _ in range(2):
+            with pytest.raises(redis.ConnectionError):
+                await client.get("key")
+        assert breaker.is_open
+
+        with pytest.raises(redis_pool.CircuitOpenError):
+            await client.get("key")
+        pipe = client.pipeline(transaction=False)
+        pipe.get("key")
+        with pytest.raises(redis_pool.CircuitOpenError):
+            await pipe.execute()
+        await pool.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_pool_exhaustion_does_not_trip_breaker(self):
+        """Нехватка соединений своего пула не считается отказом Redis"""
+        breaker = redis_pool.CircuitBreaker(failure_threshold=1, cooldown=60)
+        pool = redis_pool.BoundedConnectionPool.from_url(
+            "redis://127.0.0.1:1/0", max_connections=1, timeout=0.01
+        )
+        client = redis_pool.BreakerRedis(connection_pool=pool, breaker=breaker)
+
+        # Единственное соединение пула занято другим запросом
+        pool.pool.get_nowait()
+        for _ in range(3):
+            with pytest.raises(redis_pool.PoolExhaustedError):
+                await client.get("key")
+        pipe = client.pipeline(transaction=False)
+        pipe.get("key")
+        with pytest.raises(redis_pool.PoolExhaustedError):
+            await pipe.execute()
+
+        assert breaker.state == redis_pool.CircuitState.CLOSED
+        assert breaker.failures == 0
+        await pool.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_cache_bypasses_redis_while_circuit_is_open(
+        self, cache_redis, monkeypatch
+    ):
+        """При разомкнутой цепи кэш не обращается к Redis и не пишет ошибки"""
+
+        async def unreachable(*args, **kwargs):
+            raise AssertionError("Redis must be bypassed")
+
+        monkeypatch.setattr(cache_redis, "get", unreachable)
+        monkeypatch.setattr(cache_redis, "mget", unreachable)
+        breaker = redis_pool.CircuitBreaker(failure_threshold=1, cooldown=60)
+        monkeypatch.setattr(cache, "redis_breaker", breaker)
+        breaker.trip()
+
+        assert await cache.get_cache("products:1") is None
+        assert await cache.get_many(["products:1"]) == {}
+        assert cache_metrics.cache_metrics.snapshot() == {}
+
+    @pytest.mark.asyncio
+    async def test_rate_limiter_fails_open(self, monkeypatch):
+        """Лимитер пропускает запрос, если Redis обходится"""
+        from app.core.limiter import GCRARateLimiter, RateLimit
+
+        class OpenCircuitRedis:
+            def register_script(self, script):
+                async def run(keys, args):
+                    raise redis_pool.CircuitOpenError("Redis circuit is open")
+
+                run.registered_client = self
+                return run
+
+        limiter = GCRARateLimiter(OpenCircuitRedis())
+        result = await limiter.hit("127.0.0.1", RateLimit(times=1, seconds=60))
+
+        assert result.allowed
+        assert result.remaining == 1
+
+
+async def _asgi_get(app, path, query=b"", headers=()):
+    """GET-запрос к ASGI-приложению: (статус, заголовки, тело)"""
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [(name.lower(), value) for name, value in headers],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, *bodies = messages
+    return (
+        start["status"],
+        dict(start["headers"]),
+        b"".join(message.get("body", b"") for message in bodies),
+    )
+
+
+class TestResponseCache:
+    """Тесты кэша готовых HTTP-ответов"""
+
+    @pytest.fixture
+    def counting_app(self, cache_redis, monkeypatch):
+        """Приложение, считающее вызовы, за middleware с публичным и приватным правилом"""
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+        monkeypatch.setattr(
+            response_cache, "response_cache_stats", response_cache.ResponseCacheStats()
+        )
+        calls = []
+        response_headers = {"value": [(b"content-type", b"application/json")]}
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+            body = f'{{"call":{len(calls)}}}'.encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": response_headers["value"],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+
+        middleware = response_cache.ResponseCacheMiddleware(
+            app,
+            rules=[
+                response_cache.ResponseCacheRule(
+                    "/items/{item_id}", 60, tags=["item:{item_id}"]
+                ),
+                response_cache.ResponseCacheRule(
+                    "/me", 60, private=True, tags=["user:{subject}"]
+                ),
+            ],
+        )
+        return middleware, calls, response_headers
+
+    @pytest.mark.asyncio
+    async def test_hit_replays_stored_bytes(self, counting_app):
+        """Попадание отдает сохраненные байты без вызова приложения"""
+        app, calls, _ = counting_app
+
+        status, headers, body = await _asgi_get(app, "/items/1", b"b=2&a=1")
+        assert headers[b"x-cache"] == b"MISS"
+
+        status, headers, cached = await _asgi_get(app, "/items/1", b"a=1&b=2&c=")
+        assert (status, cached) == (200, body)
+        assert headers[b"x-cache"] == b"HIT"
+        assert headers[b"content-type"] == b"application/json"
+        assert calls == ["/items/1"]
+
+        await _asgi_get(app, "/other")
+        await _asgi_get(app, "/other")
+        assert calls == ["/items/1", "/other", "/other"]
+
+    @pytest.mark.asyncio
+    async def test_request_cache_control_and_tags(self, counting_app):
+        """no-cache читает мимо кэша, no-store не трогает кэш, теги инвалидируют"""
+        app, calls, _ = counting_app
+
+        await _asgi_get(app, "/items/1")
+        _, headers, _ = await _asgi_get(
+            app, "/items/1", headers=[(b"cache-control", b"no-store")]
+        )
+        assert b"x-cache" not in headers
+        _, headers, _ = await _asgi_get(
+            app, "/items/1", headers=[(b"cache-control", b"no-cache")]
+        )
+        assert headers[b"x-cache"] == b"MISS"
+        assert len(calls) == 3
+
+        await cache.invalidate_tags("item:1")
+        _, headers, _ = await _asgi_get(app, "/items/1")
+        assert headers[b"x-cache"] == b"MISS"
+
+    @pytest.mark.asyncio
+    async def test_private_route_keyed_by_token_subject(self, counting_app):
+        """Приватный маршрут кэшируется отдельно для каждого пользователя"""
+        app, calls, _ = counting_app
+        alice = create_access_token({"sub": "alice@example.com"})
+        bob = create_access_token({"sub": "bob@example.com"})
+
+        await _asgi_get(app, "/me")
+        await _asgi_get(app, "/me", headers=[(b"authorization", b"Bearer broken")])
+        assert len(calls) == 2
+
+        for token in (alice, bob, alice, bob):
+            auth = [(b"authorization", f"Bearer {token}".encode())]
+            await _asgi_get(app, "/me", headers=auth)
+        assert len(calls) == 4
+
+        await cache.invalidate_tags("user:alice@example.com")
+        _, headers, _ = await _asgi_get(
+            app, "/me", headers=[(b"authorization", f"Bearer {alice}".encode())]
+        )
+        assert headers[b"x-cache"] == b"MISS"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "extra_headers",
+        [
+            [(b"cache-control", b"no-store")],
+            [(b"cache-control", b"private, max-age=60")],
+            [(b"set-cookie", b"session=1")],
+            [(b"vary", b"Accept-Language")],
+            [(b"vary", b"*")],
+        ],
+    )
+    async def test_uncacheable_responses_are_not_stored(
+        self, counting_app, extra_headers
+    ):
+        """Ответы с запретом кэширования или неучтенным Vary не сохраняются"""
+        app, calls, response_headers = counting_app
+        response_headers["value"] = [
+            (b"content-type", b"application/json"),
+            *extra_headers,
+        ]
+
+        await _asgi_get(app, "/items/1")
+        await _asgi_get(app, "/items/1")
+
+        assert len(calls) == 2
+        assert response_cache.response_cache_stats.uncacheable == 2
+
+    def test_catalog_responses_cached_and_invalidated(
+        self, client, test_product, admin_headers, monkeypatch
+    ):
+        """Каталог отдается из кэша ответов до изменения продукта"""
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+        url = f"/api/v1/products/{test_product.id}"
+
+        first = client.get(url)
+        second = client.get(url)
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT"
+        assert second.content == first.content
+
+        response = client.put(url, json={"name": "Новое имя"}, headers=admin_headers)
+        assert response.status_code == 200
+
+        response = client.get(url)
+        assert response.headers["x-cache"] == "MISS"
+        assert response.json()["name"] == "Новое имя"
+
+
+class TestReferenceData:
+    """Тесты снимка справочников в памяти"""
+
+    @pytest.fixture
+    def statements(self, db_session):
+        """Счетчик SQL-запросов к тестовой БД"""
+        from sqlalchemy import event
+
+        test_engine = db_session.get_bind()
+        executed = []
+
+        def count(conn, cursor, statement, *args):
+            executed.append(statement)
+
+        event.listen(test_engine, "before_cursor_execute", count)
+        yield executed
+        event.remove(test_engine, "before_cursor_execute", count)
+
+    def test_lookups_are_served_from_memory(self, db_session, test_plan, statements):
+        """После загрузки снимка планы не требуют запросов"""
+        from app.models.plan import Plan
+
+        registry = reference_data.ReferenceDataRegistry(check_interval=60)
+        inactive = Plan(name="Старый", price=1, duration_days=1, is_active=False)
+        db_session.add(inactive)
+        db_session.commit()
+        price = test_plan.price
+
+        registry.snapshot(db_session)
+        statements.clear()
+
+        for _ in range(3):
+            assert registry.plan(db_session, test_plan.id).price == price
+        assert statements == []
+
+        # Неактивный план: запрос по первичному ключу (дальше - из identity
+        # map сессии) без перечитывания справочников
+        for _ in range(3):
+            assert registry.plan(db_session, inactive.id) is None
+        assert len(statements) == 1
+        assert registry.stats.misses == 3
+        assert registry.stats.loads == 1
+
+        with pytest.raises(Exception):
+            registry.snapshot(db_session).plans[test_plan.id] = None
+
+    def test_unknown_plan_reloads_snapshot(self, db_session, test_plan):
+        """План, созданный в обход API, находится и перечитывает снимок"""
+        from app.models.plan import Plan
+
+        registry = reference_data.ReferenceDataRegistry(check_interval=60)
+        registry.snapshot(db_session)
+
+        plan = Plan(name="Новый", price=5, duration_days=7, is_active=True)
+        db_session.add(plan)
+        db_session.commit()
+
+        assert registry.plan(db_session, plan.id).name == "Новый"
+        registry.snapshot(db_session)
+        assert registry.stats.loads == 2
+        assert registry.plan(db_session, plan.id).name == "Новый"
+        assert registry.stats.misses == 1
+
+    def test_snapshot_expires_after_max_age(self, db_session, test_plan):
+        """Изменения планов в БД подхватываются по возрасту снимка"""
+        import dataclasses
+
+        registry = reference_data.ReferenceDataRegistry(check_interval=60, max_age=60)
+        old_price = registry.plan(db_session, test_plan.id).price
+
+        test_plan.price = old_price + 10
+        db_session.commit()
+        assert registry.plan(db_session, test_plan.id).price == old_price
+
+        registry._snapshot = dataclasses.replace(
+            registry._snapshot, loaded_at=registry._snapshot.loaded_at - 61
+        )
+        assert registry.plan(db_session, test_plan.id).price == old_price + 10
+        assert registry.stats.expired == 1
+
+    @pytest.mark.asyncio
+    async def test_version_bump_invalidates_other_workers(
+        self, cache_redis, db_session, test_admin, monkeypatch
+    ):
+        """Изменение справочника в одном воркере сбрасывает снимок в другом"""
+        other = reference_data.ReferenceDataRegistry(check_interval=60)
+        monkeypatch.setattr(
+            reference_data,
+            "reference_data",
+            reference_data.ReferenceDataRegistry(check_interval=60),
+        )
+
+        await other.check_version()
+        other.snapshot(db_session)
+        await other.check_version()
+        assert other.stats.loads == 1
+
+        await reference_data.invalidate_reference_data()
+        local_cache.local_cache.clear()
+        await other.check_version()
+        other.snapshot(db_session)
+
+        assert other.stats.remote_changes == 1
+        assert other.stats.loads == 2
+
+
+class TestPrincipalCache:
+    """Тесты кэша субъекта запроса"""
+
+    @pytest.fixture
+    def statements(self, db_session):
+        """Счетчик SQL-запросов к таблице users"""
+        from sqlalchemy import event
+
+        test_engine = db_session.get_bind()
+        executed = []
+
+        def count(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                executed.append(statement)
+
+        event.listen(test_engine, "before_cursor_execute", count)
+        yield executed
+        event.remove(test_engine, "before_cursor_execute", count)
+
+    def test_repeated_requests_skip_user_query(self, client, auth_headers, statements):
+        """Повторный запрос берет пользователя из кэша, а не из БД"""
+        url = f"{settings.API_V1_STR}/auth/me/roles"
+        assert client.get(url, headers=auth_headers).status_code == 200
+        statements.clear()
+
+        for _ in range(3):
+            response = client.get(url, headers=auth_headers)
+            assert response.status_code == 200
+        assert statements == []
+
+    def test_role_changes_invalidate_principal(
+        self, client, admin_headers, test_user, db_session
+    ):
+        """Назначение и отзыв роли сразу меняют права по закэшированному снимку"""
+        from app.models.role import Role
+
+        # Токен без ролей: права проверяются по снимку пользователя
+        token = create_access_token({"sub": test_user.email, "uid": test_user.id})
+        auth_headers = {"Authorization": f"bearer {token}"}
+        admin_role = db_session.query(Role).filter(Role.name == "admin").one()
+        url = f"{settings.API_V1_STR}/admin/protected-route"
+        assignment = {"user_id": test_user.id, "role_id": admin_role.id}
+
+        assert client.get(url, headers=auth_headers).status_code == 403
+
+        response = client.post(
+            f"{settings.API_V1_STR}/roles/roles/assign",
+            json=assignment,
+            headers=admin_headers,
+        )
+        assert response.status_code == 201
+        assert client.get(url, headers=auth_headers).status_code == 200
+
+        response = client.request(
+            "DELETE",
+            f"{settings.API_V1_STR}/roles/roles/revoke",
+            json=assignment,
+            headers=admin_headers,
+        )
+        assert response.status_code == 204
+        assert client.get(url, headers=auth_headers).status_code == 403
+
+    def test_deactivation_refreshes_principal(
+        self, client, admin_headers, auth_headers, test_user
+    ):
+        """Деактивация сбрасывает закэшированный снимок пользователя"""
+        url = f"{settings.API_V1_STR}/auth/me"
+        assert client.get(url, headers=auth_headers).json()["is_active"] is True
+
+        response = client.put(
+            f"{settings.API_V1_STR}/admin/users/{test_user.id}/deactivate",
+            headers=admin_headers,
+        )
+        assert response.status_code == 200
+        assert client.get(url, headers=auth_headers).json()["is_active"] is False
@@ -0,0 +1,354 @@
+"""
+Тесты rate limiting Neuro Store
+"""
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.core import limiter
+from app.core.config import settings
+from app.core.limiter import (
+    ApproximateRateLimiter,
+    GCRARateLimiter,
+    RateLimit,
+    RateLimitMiddleware,
+    RateLimitResult,
+    RateLimitRule,
+    rate_limit_identity,
+)
+from app.core.security import create_access_token
+
+
+@pytest_asyncio.fixture(scope="function")
+async def gcra(fake_redis, monkeypatch):
+    """Лимитер процесса поверх чистого fake Redis"""
+    await fake_redis.flushall()
+    instance = GCRARateLimiter(fake_redis)
+    monkeypatch.setattr(limiter, "rate_limiter", instance)
+    return instance
+
+
+class TestGCRARateLimiter:
+    """Тесты GCRA-лимитера"""
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_quota_is_spent_and_then_rejected(self, gcra):
+        """Лимит пропускает times запросов и возвращает остаток"""
+        policy = RateLimit(times=3, seconds=60)
+
+        results = [await gcra.hit("login:1.2.3.4", policy) for _ in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results] == [2, 1, 0, 0]
+        # Следующий запрос станет возможен через интервал 60 / 3 секунд
+        assert 19 < results[-1].retry_after <= 20
+        assert 59 < results[-1].reset_after <= 60
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_keys_are_independent(self, gcra):
+        """Квоты разных ключей не пересекаются"""
+        policy = RateLimit(times=1, seconds=60)
+
+        assert (await gcra.hit("a", policy)).allowed
+        assert (await gcra.hit("b", policy)).allowed
+        assert not (await gcra.hit("a", policy)).allowed
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_single_key_with_expiry(self, gcra, fake_redis):
+        """На ключ хранится одно значение с TTL не больше периода"""
+        await gcra.hit("a", RateLimit(times=10, seconds=60))
+
+        assert await fake_redis.keys("ratelimit:*") == [b"ratelimit:a"]
+        assert 0 < await fake_redis.pttl("ratelimit:a") <= 6000
+
+    @pytest.mark.rate_limiting
+    def test_headers(self):
+        """Заголовки X-RateLimit-* и Retry-After"""
+        allowed = RateLimitResult(True, limit=5, remaining=4, reset_after=11.2)
+        rejected = RateLimitResult(
+            False, limit=5, remaining=0, reset_after=60, retry_after=0.2
+        )
+
+        assert allowed.headers() == {
+            "X-RateLimit-Limit": "5",
+            "X-RateLimit-Remaining": "4",
+            "X-RateLimit-Reset": "12",
+        }
+        assert rejected.headers()["Retry-After"] == "1"
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.parametrize(
+        "value, expected",
+        [("5/minute", RateLimit(5, 60)), ("100/hour", RateLimit(100, 3600))],
+    )
+    def test_parse(self, value, expected):
+        assert RateLimit.parse(value) == expected
+
+
+class CountingRedis:
+    """Прокси fake Redis, считающий обращения"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = 0
+
+    def register_script(self, script):
+        inner = self.redis.register_script(script)
+        proxy = self
+
+        class Script:
+            registered_client = proxy
+            sha = inner.sha
+
+            async def __call__(self, keys, args):
+                proxy.calls += 1
+                return await inner(keys=keys, args=args)
+
+        Script.script = inner.script
+        return Script()
+
+    def pipeline(self, transaction=True):
+        self.calls += 1
+        return self.redis.pipeline(transaction=transaction)
+
+
+class TestApproximateRateLimiter:
+    """Тесты приблизительного режима: локальные корзины и сверка"""
+
+    @pytest.fixture
+    def clock(self):
+        class Clock:
+            now = 1000.0
+
+            def __call__(self):
+                return self.now
+
+        return Clock()
+
+    @pytest.fixture
+    def redis_calls(self, gcra, fake_redis):
+        counting = CountingRedis(fake_redis)
+        gcra.redis = counting
+        return counting
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_spends_locally_after_first_request(self, gcra, redis_calls, clock):
+        """В Redis уходит только первый запрос ключа"""
+        approximate = ApproximateRateLimiter(gcra, clock=clock)
+        policy = RateLimit(times=3, seconds=60)
+
+        results = [await approximate.hit("catalog:1.2.3.4", policy) for _ in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results] == [2, 1, 0, 0]
+        assert redis_calls.calls == 1
+        assert results[-1].retry_after == pytest.approx(20)
+
+        # Локальная корзина пополняется со скоростью лимита
+        clock.now += 20
+        assert (await approximate.hit("catalog:1.2.3.4", policy)).allowed
+        assert redis_calls.calls == 1
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_sync_shares_consumption_between_workers(self, gcra, redis_calls):
+        """Сверка одним pipeline переносит расход между воркерами"""
+        policy = RateLimit(times=10, seconds=60)
+        first = ApproximateRateLimiter(gcra)
+        second = ApproximateRateLimiter(gcra)
+
+        for _ in range(6):
+            await first.hit("catalog:a", policy)
+            await first.hit("catalog:b", policy)
+        await second.hit("catalog:a", policy)
+        await second.hit("catalog:a", policy)
+        calls = redis_calls.calls
+
+        await first.sync()
+        await second.sync()
+
+        # Одна сверка - один pipeline на все ключи воркера
+        assert redis_calls.calls == calls + 2
+        assert first.syncs == second.syncs == 1
+        # 6 запросов первого воркера и 2 второго из 10
+        results = [await second.hit("catalog:a", policy) for _ in range(3)]
+        assert [r.allowed for r in results] == [True, True, False]
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_sync_failure_keeps_pending(self, gcra, monkeypatch):
+        """Ошибка Redis при сверке не теряет расход"""
+        from redis.exceptions import ConnectionError
+
+        approximate = ApproximateRateLimiter(gcra)
+        policy = RateLimit(times=10, seconds=60)
+        for _ in range(3):
+            await approximate.hit("catalog:a", policy)
+
+        async def unavailable(spent):
+            raise ConnectionError("Redis is down")
+
+        monkeypatch.setattr(gcra, "reconcile", unavailable)
+        await approximate.sync()
+        monkeypatch.undo()
+
+        await approximate.sync()
+        assert (await gcra.hit("catalog:a", policy)).remaining == 6
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_reconcile_caps_overspend(self, gcra):
+        """Перерасход при сверке ограничен одним периодом"""
+        policy = RateLimit(times=2, seconds=60)
+
+        assert await gcra.reconcile([("a", policy, 5)]) == [0]
+        result = await gcra.hit("a", policy)
+        assert not result.allowed
+        assert result.retry_after <= 30
+
+
+class TestRateLimitMiddleware:
+    """Тесты middleware с таблицей маршрутов"""
+
+    @pytest.fixture
+    def limited_app(self, gcra, monkeypatch):
+        monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+        monkeypatch.setattr(settings, "RATE_LIMIT_LOGIN", "2/minute")
+        monkeypatch.setattr(settings, "RATE_LIMIT_DEFAULT", "1/minute")
+        app = FastAPI()
+
+        @app.post("/auth/login")
+        async def login():
+            return {"ok": True}
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        app.add_middleware(
+            RateLimitMiddleware,
+            rules=[
+                RateLimitRule("/auth/login", "login", methods=("POST",)),
+                RateLimitRule("/items", "default", prefix=True),
+            ],
+        )
+        return app
+
+    @pytest.mark.rate_limiting
+    def test_table_compiled_from_settings(self, monkeypatch):
+        """Лимиты и режим политик берутся из настроек при сборке таблицы"""
+        monkeypatch.setattr(settings, "RATE_LIMIT_PRODUCTS", "300/minute")
+        monkeypatch.setattr(settings, "RATE_LIMIT_APPROXIMATE", "products, search")
+        middleware = RateLimitMiddleware(
+            None,
+            rules=[
+                RateLimitRule("/api/v1/auth/login", "login", methods=("POST",)),
+                RateLimitRule("/api/v1/products", "products", prefix=True),
+                RateLimitRule("/api/v1", "unknown", prefix=True),
+            ],
+        )
+
+        login = middleware.resolve("POST", "/api/v1/auth/login")
+        products = middleware.resolve("GET", "/api/v1/products/7/plans")
+        fallback = middleware.resolve("GET", "/api/v1/auth/login")
+
+        assert login.limit == RateLimit.parse(settings.RATE_LIMIT_LOGIN)
+        assert not login.approximate
+        assert products.limit == RateLimit(300, 60)
+        assert products.approximate
+        assert fallback.limit == RateLimit.parse(settings.RATE_LIMIT_DEFAULT)
+        assert middleware.resolve("GET", "/health") is None
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_headers_and_rejection(self, limited_app):
+        """Ответы несут X-RateLimit-*, сверх лимита - 429 без вызова эндпоинта"""
+        async with AsyncClient(app=limited_app, base_url="http://test") as client:
+            responses = [await client.post("/auth/login") for _ in range(3)]
+
+        assert [r.status_code for r in responses] == [200, 200, 429]
+        assert responses[0].headers["x-ratelimit-limit"] == "2"
+        assert responses[0].headers["x-ratelimit-remaining"] == "1"
+        assert responses[1].headers["x-ratelimit-remaining"] == "0"
+        assert int(responses[2].headers["retry-after"]) == 30
+
+    @pytest.mark.rate_limiting
+    @pytest.mark.asyncio
+    async def test_authenticated_users_have_own_quota(self, limited_app):
+        """Пользователь с токеном лимитируется отдельно от своего IP"""
+        token = create_access_token({"sub": "user@example.com", "uid": 7})
+        auth = {"Authorization": f"Bearer {token}"}
+
+        async with AsyncClient(app=limited_app, base_url="http://test") as client:
+            anonymous = [await client.get("/items/1") for _ in range(2)]
+            user = [await client.get("/items/1", headers=auth) for _ in range(2)]
+            unrouted = await client.get("/docs")
+
+        assert [r.status_code for r in anonymous] == [200, 429]
+        assert [r.status_code for r in user] == [200, 429]
+        assert "x-ratelimit-limit" not in unrouted.headers
+
+    @pytest.mark.rate_limiting
+    def test_identity(self):
+        """Ключ лимита: uid из токена или IP клиента"""
+        from starlette.requests import Request
+
+        def request(headers):
+            return Request(
+                {
+                    "type": "http",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+                    "client": ("10.0.0.1", 5000),
+                }
+            )
+
+        token = create_access_token({"sub": "user@example.com", "uid": 7})
+
+        assert rate_limit_identity(request([])) == "ip:10.0.0.1"
+        assert rate_limit_identity(request([("Authorization", "Bearer bad")])) == (
+            "ip:10.0.0.1"
+        )
+        assert (
+            rate_limit_identity(request([("Authorization", f"Bearer {token}")]))
+            == "user:7"
+        )
+
+    @pytest.mark.rate_limiting
+    def test_forwarding_headers_only_from_trusted_proxies(self, monkeypatch):
+        """X-Forwarded-For от клиента не меняет его ключ лимита"""
+        from starlette.requests import Request
+
+        def request(peer, forwarded_for):
+            return Request(
+                {
+                    "type": "http",
+                    "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+                    "client": (peer, 5000),
+                }
+            )
+
+        monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", "")
+        assert limiter.get_client_ip(request("203.0.113.5", "1.2.3.4")) == (
+            "203.0.113.5"
+        )
+
+        monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", "10.0.0.0/8")
+        # Клиент за прокси подделал начало цепочки: берется адрес, который
+        # добавил доверенный прокси
+        assert (
+            limiter.get_client_ip(request("10.0.0.2", "1.2.3.4, 198.51.100.7"))
+            == "198.51.100.7"
+        )
+        assert (
+            limiter.get_client_ip(request("10.0.0.2", "198.51.100.7, 10.0.0.3"))
+            == "198.51.100.7"
+        )
+        assert limiter.get_client_ip(request("203.0.113.5", "1.2.3.4")) == (
+            "203.0.113.5"
+        )
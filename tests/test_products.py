@@ -224,6 +224,95 @@ class TestProductsCaching:
         # Данные должны быть одинаковыми
         assert response1.json() == response2.json()
 
+    @pytest.mark.products
+    @pytest.mark.integration
+    def test_identical_request_is_cache_hit(
+        self, client: TestClient, test_product: Product
+    ):
+        """Тест попадания в кэш при повторном запросе с теми же параметрами"""
+        from app.services import cache
+
+        stats = cache.cache_stats
+        hits, misses = stats.hits, stats.misses
+
+        response1 = client.get("/api/v1/products/")
+        assert stats.misses == misses + 1
+
+        # Явно переданные умолчания дают тот же ключ
+        response2 = client.get("/api/v1/products/?skip=0&limit=100")
+        assert stats.hits == hits + 1
+        assert stats.misses == misses + 1
+        assert response1.json() == response2.json()
+        assert response2.json()[0]["id"] == test_product.id
+
+    @pytest.mark.products
+    @pytest.mark.integration
+    def test_product_by_id_cached_and_invalidated_on_update(
+        self, client: TestClient, test_product: Product, admin_headers: dict
+    ):
+        """Тест кэширования продукта по ID и инвалидации при обновлении"""
+        from app.services import cache
+
+        stats = cache.cache_stats
+        hits = stats.hits
+
+        client.get(f"/api/v1/products/{test_product.id}")
+        client.get(f"/api/v1/products/{test_product.id}")
+        assert stats.hits == hits + 1
+
+        response = client.put(
+            f"/api/v1/products/{test_product.id}",
+            json={"name": "Обновленное имя"},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200
+
+        response = client.get(f"/api/v1/products/{test_product.id}")
+        assert response.json()["name"] == "Обновленное имя"
+
+    @pytest.mark.products
+    @pytest.mark.integration
+    def test_missing_product_answered_from_cache(self, client: TestClient):
+        """Тест кэширования ответа 404 для несуществующего продукта"""
+        from app.services import cache
+
+        stats = cache.cache_stats
+        misses, negative_hits = stats.misses, stats.negative_hits
+
+        response1 = client.get("/api/v1/products/99999")
+        response2 = client.get("/api/v1/products/99999")
+
+        assert response1.status_code == response2.status_code == 404
+        assert response1.json() == response2.json()
+        assert stats.misses == misses + 1
+        assert stats.negative_hits == negative_hits + 1
+
+    @pytest.mark.products
+    @pytest.mark.integration
+    def test_batch_plans_share_cache_with_single_product(
+        self, client: TestClient, test_product_plan: ProductPlan
+    ):
+        """Тест пакетного получения планов и общих с /{id}/plans записей кэша"""
+        from app.services import cache
+
+        product_id = test_product_plan.product_id
+        stats = cache.cache_stats
+
+        response = client.get(
+            "/api/v1/products/plans",
+            params={"product_ids": [product_id, 99999]},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert list(data) == [str(product_id)]
+        assert data[str(product_id)][0]["id"] == test_product_plan.plan_id
+
+        hits = stats.hits
+        response = client.get(f"/api/v1/products/{product_id}/plans")
+        assert response.status_code == 200
+        assert response.json() == data[str(product_id)]
+        assert stats.hits == hits + 1
+
 
 class TestProductsRateLimiting:
     """Тесты rate limiting для продуктов"""
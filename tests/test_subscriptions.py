@@ -291,6 +291,78 @@ class TestSubscriptions:
         assert data["requests_used"] == 25
 
 
+class TestUserDataCaching:
+    """Тесты кэша ответов личного кабинета"""
+
+    @pytest.fixture(autouse=True)
+    def response_cache_enabled(self, client: TestClient, monkeypatch):
+        # После test_app, который выключает кэш ответов
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+
+    @pytest.mark.subscriptions
+    @pytest.mark.integration
+    def test_subscriptions_and_balance_invalidated_on_create(
+        self,
+        client: TestClient,
+        auth_headers: dict,
+        test_product_plan: ProductPlan,
+    ):
+        """Подписки и баланс кэшируются до создания подписки"""
+        client.get("/api/v1/subscriptions/", headers=auth_headers)
+        response = client.get("/api/v1/subscriptions/", headers=auth_headers)
+        assert response.headers["x-cache"] == "HIT"
+        assert response.json() == []
+
+        client.get("/api/v1/balance", headers=auth_headers)
+        balance = client.get("/api/v1/balance", headers=auth_headers)
+        assert balance.headers["x-cache"] == "HIT"
+
+        response = client.post(
+            "/api/v1/subscriptions/",
+            json=create_test_subscription_data(
+                test_product_plan.product_id, test_product_plan.plan_id
+            ),
+            headers=auth_headers,
+        )
+        assert response.status_code == 201
+
+        response = client.get("/api/v1/subscriptions/", headers=auth_headers)
+        assert response.headers["x-cache"] == "MISS"
+        assert len(response.json()) == 1
+
+        response = client.get("/api/v1/balance", headers=auth_headers)
+        assert response.headers["x-cache"] == "MISS"
+        assert float(response.json()["balance"]) < float(balance.json()["balance"])
+
+    @pytest.mark.subscriptions
+    @pytest.mark.integration
+    def test_profile_is_per_user_and_invalidated_on_deactivate(
+        self,
+        client: TestClient,
+        auth_headers: dict,
+        admin_headers: dict,
+        test_user: User,
+    ):
+        """Профиль кэшируется для каждого пользователя отдельно"""
+        client.get("/api/v1/auth/me", headers=auth_headers)
+        mine = client.get("/api/v1/auth/me", headers=auth_headers)
+        admin = client.get("/api/v1/auth/me", headers=admin_headers)
+        assert mine.headers["x-cache"] == "HIT"
+        assert admin.headers["x-cache"] == "MISS"
+        assert mine.json()["email"] != admin.json()["email"]
+
+        response = client.put(
+            f"/api/v1/admin/users/{test_user.id}/deactivate", headers=admin_headers
+        )
+        assert response.status_code == 200
+
+        response = client.get("/api/v1/auth/me", headers=auth_headers)
+        assert response.headers["x-cache"] == "MISS"
+        assert response.json()["is_active"] is False
+
+
 class TestSubscriptionsRateLimiting:
     """Тесты rate limiting для подписок"""
 